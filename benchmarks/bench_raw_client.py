@@ -0,0 +1,103 @@
+"""
+Micro-benchmark of the load generator CPU spent per request by the Looker SDK
+compared with RawLookerClient. No requests leave the process: both clients share
+a session that answers every call with a canned response, so the difference is
+only request building and response deserialization.
+
+    uv run python -m benchmarks.bench_raw_client --iterations 2000
+"""
+
+import json
+import time
+from typing import Annotated, Callable, Dict, List
+
+import typer
+from looker_sdk import models40
+
+from benchmarks.canned_looker import RENDER_TASK, canned_clients, query_task_body
+
+
+def _rows(count: int) -> List[Dict]:
+    return [
+        {
+            "orders.created_date": {"value": f"2024-01-{i % 28 + 1:02d}"},
+            "orders.status": {"value": "complete"},
+            "orders.count": {"value": i},
+            "order_items.total_sale_price": {"value": i * 12.5},
+        }
+        for i in range(count)
+    ]
+
+
+def _json_bi(rows: int) -> Dict:
+    return {"metadata": {"fields": {"dimensions": [], "measures": []}}, "rows": _rows(rows)}
+
+
+def _cpu_per_call(call: Callable[[], object], iterations: int) -> float:
+    """Process CPU time of one call in microseconds."""
+    call()
+    start = time.process_time()
+    for _ in range(iterations):
+        call()
+    return (time.process_time() - start) / iterations * 1_000_000
+
+
+def main(
+    iterations: Annotated[
+        int, typer.Option(help="Calls per endpoint and client", min=1)
+    ] = 2000,
+    rows: Annotated[
+        int, typer.Option(help="Rows in the canned query results", min=1)
+    ] = 500,
+):
+    task_ids = [f"task{i}" for i in range(5)]
+    bodies = {
+        "/queries/": json.dumps(_json_bi(rows)).encode(),
+        "/query_tasks/multi_results": json.dumps(
+            {
+                task_id: {"status": "complete", "data": _json_bi(rows // 5)}
+                for task_id in task_ids
+            }
+        ).encode(),
+        "/query_tasks": json.dumps(query_task_body("task0")).encode(),
+        "/render_tasks": json.dumps(RENDER_TASK).encode(),
+    }
+    sdk, raw = canned_clients(bodies)
+    write_task = models40.WriteCreateQueryTask(
+        query_id="1", result_format=models40.ResultFormat.json_bi
+    )
+
+    cases = [
+        (
+            "run_query (json_bi)",
+            lambda: len(str(sdk.run_query("1", result_format="json_bi"))),
+            lambda: len(raw.run_query("1", "json_bi")),
+        ),
+        (
+            "create_query_task",
+            lambda: sdk.create_query_task(write_task).id,
+            lambda: raw.create_query_task("1", "json_bi"),
+        ),
+        (
+            "query_task_multi_results",
+            lambda: sdk.query_task_multi_results(models40.DelimSequence(task_ids)),
+            lambda: raw.query_task_multi_results(task_ids),
+        ),
+        (
+            "render_task",
+            lambda: sdk.render_task("1a2b3c").status,
+            lambda: raw.render_task("1a2b3c")["status"],
+        ),
+    ]
+
+    typer.echo(f"CPU per request over {iterations} calls, {rows} result rows\n")
+    typer.echo(f"{'endpoint':<28}{'sdk (us)':>12}{'raw (us)':>12}{'saved':>9}")
+    for name, sdk_call, raw_call in cases:
+        sdk_us = _cpu_per_call(sdk_call, iterations)
+        raw_us = _cpu_per_call(raw_call, iterations)
+        saved = (1 - raw_us / sdk_us) * 100 if sdk_us else 0.0
+        typer.echo(f"{name:<28}{sdk_us:>12.1f}{raw_us:>12.1f}{saved:>8.0f}%")
+
+
+if __name__ == "__main__":
+    typer.run(main)
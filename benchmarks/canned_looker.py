@@ -0,0 +1,100 @@
+"""
+A Looker SDK and RawLookerClient that never leave the process: every request is
+answered from canned response bodies by path, for benchmarks and tests. Kept out
+of the lkr package so it never ships with it.
+"""
+
+from typing import Dict, Tuple
+
+import looker_sdk
+import requests
+from looker_sdk.rtl import api_settings
+
+from lkr.load_test.raw_client import RawLookerClient
+
+__all__ = [
+    "BASE_URL",
+    "RENDER_TASK",
+    "CannedSession",
+    "CannedSettings",
+    "canned_clients",
+    "query_task_body",
+]
+
+BASE_URL = "https://looker.example.com"
+
+
+class CannedSettings(api_settings.ApiSettings):
+    def read_config(self) -> api_settings.SettingsConfig:
+        return {"base_url": BASE_URL, "client_id": "canned", "client_secret": "canned"}
+
+
+def query_task_body(task_id: str) -> Dict:
+    return {
+        "id": task_id,
+        "query_id": "1",
+        "generate_links": True,
+        "force_production": True,
+        "path_prefix": None,
+        "cache": True,
+        "server_table_calcs": False,
+        "cache_only": False,
+        "cache_key": "5b0a3b0f1c6e4b6f",
+        "status": "added",
+        "source": "api",
+        "runtime": None,
+        "rebuild_pdts": False,
+        "result_source": None,
+        "look_id": None,
+        "dashboard_id": None,
+        "result_format": "json_bi",
+        "can": {"cancel": True},
+    }
+
+
+RENDER_TASK = {
+    "id": "1a2b3c",
+    "created_at": "2024-01-01T00:00:00.000+00:00",
+    "dashboard_filters": "",
+    "dashboard_id": "1",
+    "dashboard_style": "tiled",
+    "finalized_at": None,
+    "height": 1080,
+    "look_id": None,
+    "lookml_dashboard_id": None,
+    "query_id": None,
+    "query_runtime": 1.2,
+    "render_runtime": 3.4,
+    "result_format": "pdf",
+    "runtime": 4.6,
+    "status": "rendering",
+    "status_detail": None,
+    "user_id": "1",
+    "width": 1920,
+    "can": {},
+}
+
+
+class CannedSession(requests.Session):
+    """Answers every request with the canned body for its path."""
+
+    def __init__(self, bodies: Dict[str, bytes]):
+        super().__init__()
+        self.bodies = bodies
+
+    def request(self, method, url, *args, **kwargs):
+        response = requests.Response()
+        response.status_code = 200
+        response.headers["Content-Type"] = "application/json"
+        path = url.split("/api/4.0", 1)[1]
+        response._content = next(
+            body for prefix, body in self.bodies.items() if path.startswith(prefix)
+        )
+        return response
+
+
+def canned_clients(bodies: Dict[str, bytes]) -> Tuple[looker_sdk.methods40.Looker40SDK, RawLookerClient]:
+    sdk = looker_sdk.init40(config_settings=CannedSettings())
+    sdk.auth.authenticate = lambda transport_options: {"Authorization": "Bearer canned"}  # type: ignore[method-assign]
+    sdk.transport.session = CannedSession(bodies)  # type: ignore[attr-defined]
+    return sdk, RawLookerClient(sdk)
@@ -0,0 +1,128 @@
+import random
+import re
+import time
+from enum import Enum
+from typing import Dict
+
+import gevent
+import typer
+from locust import events
+from locust.runners import WorkerRunner
+from structlog import get_logger
+
+logger = get_logger(__name__)
+
+__all__ = ["ArrivalDistribution", "ArrivalSchedule", "parse_rate"]
+
+
+class ArrivalDistribution(str, Enum):
+    poisson = "poisson"
+    fixed = "fixed"
+
+
+def parse_rate(value: str) -> float:
+    """Arrivals per second from a rate like 5, 5/s, 300/m or 1000/h."""
+    match = re.match(r"^(\d+(?:\.\d+)?)(?:/([smh]))?$", value.strip())
+    if not match or float(match.group(1)) <= 0:
+        raise typer.BadParameter(f"Invalid rate: {value}, expected e.g. 5/s or 300/m")
+    per = {None: 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+    return float(match.group(1)) / per
+
+
+class ArrivalSchedule:
+    """
+    Process-wide open-loop clock. Every user claims the next arrival time from the
+    same schedule, so the offered rate stays constant no matter how slow Looker
+    gets. When every user is busy, arrivals pile up in the past and are started
+    late, and that lag is tracked so it can be reported.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        distribution: ArrivalDistribution = ArrivalDistribution.poisson,
+        seed: int | None = None,
+    ):
+        self.rate = rate
+        self.distribution = distribution
+        self._random = random.Random(seed)
+        self._next: float | None = None
+        self.arrivals = 0
+        self.lag_total = 0.0
+        self.lag_max = 0.0
+        self._reported: Dict[str, Dict[str, float]] = {}
+
+    def _interval(self) -> float:
+        if self.distribution == ArrivalDistribution.poisson:
+            return self._random.expovariate(self.rate)
+        return 1 / self.rate
+
+    def claim(self) -> float:
+        """Intended start time of the next unclaimed arrival."""
+        if self._next is None:
+            self._next = time.time()
+        intended = self._next
+        self._next += self._interval()
+        return intended
+
+    def wait(self) -> float:
+        """
+        Claim the next arrival, sleep until it is due and return its intended start
+        time. Latency should be measured from the returned time, not from when the
+        user actually woke up.
+        """
+        intended = self.claim()
+        delay = intended - time.time()
+        if delay > 0:
+            gevent.sleep(delay)
+        lag = max(time.time() - intended, 0.0)
+        self.arrivals += 1
+        self.lag_total += lag
+        self.lag_max = max(self.lag_max, lag)
+        return intended
+
+    @property
+    def backlog(self) -> float:
+        """Seconds the schedule is behind, i.e. how overdue the next arrival is."""
+        if self._next is None:
+            return 0.0
+        return max(time.time() - self._next, 0.0)
+
+    def summary(self) -> Dict[str, float]:
+        reports = [self._local_report(), *self._reported.values()]
+        arrivals = sum(r["arrivals"] for r in reports)
+        lag_total = sum(r["lag_total"] for r in reports)
+        return {
+            "arrivals": arrivals,
+            # Each worker runs an equal share of the rate
+            "target_rate": self.rate * (len(self._reported) or 1),
+            "mean_lag_ms": round(lag_total / arrivals * 1000, 1) if arrivals else 0.0,
+            "max_lag_ms": round(max(r["lag_max"] for r in reports) * 1000, 1),
+            "backlog_s": round(max(r["backlog"] for r in reports), 2),
+        }
+
+    def _local_report(self) -> Dict[str, float]:
+        return {
+            "arrivals": self.arrivals,
+            "lag_total": self.lag_total,
+            "lag_max": self.lag_max,
+            "backlog": self.backlog,
+        }
+
+    def register_events(self):
+        """Ship worker lag totals to the master and log the summary when the test stops."""
+
+        @events.report_to_master.add_listener
+        def on_report_to_master(client_id: str, data: dict):
+            data["arrival_schedule"] = self._local_report()
+
+        @events.worker_report.add_listener
+        def on_worker_report(client_id: str, data: dict):
+            if "arrival_schedule" in data:
+                self._reported[client_id] = data["arrival_schedule"]
+
+        @events.test_stop.add_listener
+        def on_test_stop(environment, **kwargs):
+            if isinstance(environment.runner, WorkerRunner):
+                return
+            logger.info("arrival_schedule_summary", **self.summary())
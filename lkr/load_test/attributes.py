@@ -0,0 +1,284 @@
+import csv
+import mmap
+import os
+import random
+import re
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass
+from itertools import accumulate, islice, repeat
+from operator import add
+from typing import Callable, Dict, List, Tuple
+
+import typer
+
+__all__ = [
+    "AttributeFile",
+    "CompiledAttributes",
+    "Constant",
+    "Sequential",
+    "UniformInt",
+    "Weighted",
+    "Zipf",
+    "compile_attributes",
+    "parse_attribute",
+    "parse_generator",
+]
+
+AttributeGenerator = Callable[[random.Random], str]
+
+INDEX_CHUNK_SIZE = 1024 * 1024
+
+_FUNCTION = re.compile(r"^([a-z_.]+)\((.*)\)$")
+
+_forks = 0
+
+
+def _count_fork():
+    global _forks
+    _forks += 1
+
+
+# Forked worker processes inherit the parent's fork count, so the Nth worker
+# always sees N and can derive its own seed from it.
+os.register_at_fork(before=_count_fork)
+
+
+@dataclass
+class Constant:
+    value: str
+
+    def __call__(self, rng: random.Random) -> str:
+        return self.value
+
+
+@dataclass
+class UniformInt:
+    low: int
+    high: int
+
+    def __call__(self, rng: random.Random) -> str:
+        return str(rng.randint(self.low, self.high))
+
+
+class Zipf:
+    """Ranks 1 to n, rank k drawn with weight 1 / k**s, so a few low ranks are hot."""
+
+    def __init__(self, n: int, s: float = 1.0):
+        self.n = n
+        self.s = s
+        self._cumulative = list(accumulate(1 / k**s for k in range(1, n + 1)))
+
+    def __call__(self, rng: random.Random) -> str:
+        target = rng.random() * self._cumulative[-1]
+        return str(min(bisect_left(self._cumulative, target), self.n - 1) + 1)
+
+
+class Weighted:
+    def __init__(self, values: List[str], weights: List[float]):
+        self.values = values
+        self._cumulative = list(accumulate(weights))
+
+    def __call__(self, rng: random.Random) -> str:
+        return rng.choices(self.values, cum_weights=self._cumulative)[0]
+
+
+class Sequential:
+    """low, low + 1, ... high and around again, counted per process."""
+
+    def __init__(self, low: int, high: int):
+        self.low = low
+        self.high = high
+        self._next = low
+
+    def __call__(self, rng: random.Random) -> str:
+        value = self._next
+        self._next = self.low if value >= self.high else value + 1
+        return str(value)
+
+
+def _ints(name: str, args: List[str], count: int) -> List[int]:
+    if len(args) != count or not all(re.match(r"^-?\d+$", a) for a in args):
+        raise ValueError(f"{name} takes {count} integers")
+    return [int(a) for a in args]
+
+
+def _generator(value: str) -> AttributeGenerator:
+    match = _FUNCTION.match(value)
+    if not match:
+        return Constant(value)
+    name = match.group(1)
+    args = [a.strip() for a in match.group(2).split(",")] if match.group(2).strip() else []
+    if name in ("uniform", "random.randint"):
+        low, high = _ints(name, args, 2)
+        if low > high:
+            raise ValueError(f"{name} low is greater than high")
+        return UniformInt(low, high)
+    if name == "sequence":
+        low, high = _ints(name, args, 2)
+        if low > high:
+            raise ValueError(f"{name} low is greater than high")
+        return Sequential(low, high)
+    if name == "zipf":
+        if len(args) not in (1, 2):
+            raise ValueError("zipf takes n and an optional exponent")
+        (n,) = _ints(name, args[:1], 1)
+        s = float(args[1]) if len(args) == 2 else 1.0
+        if n < 1 or s <= 0:
+            raise ValueError("zipf needs n >= 1 and an exponent > 0")
+        return Zipf(n, s)
+    if name == "weighted":
+        pairs = [a.rpartition("=") for a in args]
+        if not pairs or any(not v or not sep for v, sep, _ in pairs):
+            raise ValueError("weighted takes value=weight pairs")
+        weights = [float(w) for _, _, w in pairs]
+        if any(w < 0 for w in weights) or not sum(weights):
+            raise ValueError("weighted needs non-negative weights that add up to more than 0")
+        return Weighted([v for v, _, _ in pairs], weights)
+    raise ValueError(f"unknown generator {name}")
+
+
+def parse_generator(spec: str, kind: str = "attribute") -> Tuple[str, AttributeGenerator]:
+    """Parse a name:value spec where value is a constant or a generator, see parse_attribute."""
+    name, _, value = spec.partition(":")
+    name, value = name.strip(), value.strip()
+    if not name or not value:
+        raise typer.BadParameter(f"Invalid {kind}: {spec}, expected name:value")
+    try:
+        return name, _generator(value)
+    except ValueError as e:
+        raise typer.BadParameter(f"Invalid {kind}: {spec}, {e}")
+
+
+def parse_attribute(spec: str) -> Tuple[str, AttributeGenerator]:
+    """
+    Parse an --attribute spec of the form name:value, where value is one of
+
+    - a constant, e.g. region:west
+    - uniform(1,100) or random.randint(1,100): a uniform integer between the bounds
+    - zipf(1000) or zipf(1000,1.2): integers 1 to 1000 with a power-law skew
+      towards 1, exponent 1 by default
+    - weighted(acme=70,globex=20,initech=10): one of the values, by weight
+    - sequence(1,500): 1, 2, ... 500 and around again
+    """
+    return parse_generator(spec)
+
+
+class AttributeFile:
+    """
+    A CSV or TSV of attribute tuples with a header row of attribute names, sampled
+    one row at a time. The file is memory mapped and only the byte offset of each
+    row is kept, in a flat array, so a file with millions of rows costs a few bytes
+    per row and is shared by forked worker processes. Rows are split when sampled.
+    """
+
+    def __init__(self, path: str):
+        try:
+            with open(path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            raise typer.BadParameter(f"Could not read attribute file {path}: {e}")
+        header_end = self._find_line_end(0)
+        header = self._map[:header_end].decode("utf-8-sig").strip()
+        self.delimiter = "\t" if path.endswith(".tsv") or "\t" in header else ","
+        self.columns = [c.strip() for c in next(csv.reader([header], delimiter=self.delimiter))]
+        if not all(self.columns):
+            raise typer.BadParameter(f"Attribute file {path} needs a header of attribute names")
+        self._offsets = array("I" if len(self._map) < 2**32 else "Q")
+        self._index(header_end + 1)
+        if not self._offsets:
+            raise typer.BadParameter(f"Attribute file {path} has no rows")
+
+    def _index(self, start: int):
+        # Split a chunk of whole lines at a time rather than finding every newline
+        # from Python, which is an order of magnitude slower on millions of rows
+        size = len(self._map)
+        while start < size:
+            end = size
+            if start + INDEX_CHUNK_SIZE < size:
+                end = self._map.rfind(b"\n", start, start + INDEX_CHUNK_SIZE)
+                if end == -1:
+                    end = self._find_line_end(start + INDEX_CHUNK_SIZE)
+            lines = self._map[start:end].split(b"\n")
+            starts = islice(
+                accumulate(map(add, map(len, lines), repeat(1)), initial=start),
+                len(lines),
+            )
+            if b"" in lines or b"\r" in lines:
+                self._offsets.extend(
+                    offset for offset, line in zip(starts, lines) if line.strip()
+                )
+            else:
+                self._offsets.extend(starts)
+            start = end + 1
+
+    def _find_line_end(self, start: int) -> int:
+        end = self._map.find(b"\n", start)
+        return len(self._map) if end == -1 else end
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def row(self, index: int) -> Dict[str, str]:
+        start = self._offsets[index]
+        line = self._map[start : self._find_line_end(start)].decode().rstrip("\r")
+        if '"' in line:
+            values = next(csv.reader([line], delimiter=self.delimiter))
+        else:
+            values = line.split(self.delimiter)
+        return {
+            column: value.strip()
+            for column, value in zip(self.columns, values)
+            if value.strip()
+        }
+
+    def sample(self, rng: random.Random) -> Dict[str, str]:
+        return self.row(rng.randrange(len(self._offsets)))
+
+
+class CompiledAttributes:
+    """
+    User attribute generators, parsed once at startup, and optionally a file of
+    attribute rows to draw a whole row from. --attribute values override the
+    file's columns of the same name. Without a seed values come from the global
+    random module. With one, every process draws from its own generator seeded
+    from the seed and its worker number, so reruns with the same seed and workers
+    see the same values.
+    """
+
+    def __init__(
+        self,
+        generators: Dict[str, AttributeGenerator],
+        seed: int | None = None,
+        attribute_file: AttributeFile | None = None,
+    ):
+        self.generators = generators
+        self.seed = seed
+        self.attribute_file = attribute_file
+        self._rng: random.Random | None = None
+        self._rng_forks = -1
+
+    def _process_rng(self) -> random.Random:
+        if self.seed is None:
+            return random  # type: ignore[return-value]
+        if self._rng is None or self._rng_forks != _forks:
+            self._rng = random.Random(f"{self.seed}-{_forks}")
+            self._rng_forks = _forks
+        return self._rng
+
+    def generate(self, rng: random.Random | None = None) -> Dict[str, str]:
+        rng = rng or self._process_rng()
+        attributes = self.attribute_file.sample(rng) if self.attribute_file else {}
+        for name, generator in self.generators.items():
+            attributes[name] = generator(rng)
+        return attributes
+
+
+def compile_attributes(
+    specs: List[str], seed: int | None = None, attribute_file: str | None = None
+) -> CompiledAttributes:
+    return CompiledAttributes(
+        dict(parse_attribute(spec) for spec in specs),
+        seed,
+        AttributeFile(attribute_file) if attribute_file else None,
+    )
@@ -0,0 +1,77 @@
+from typing import Dict
+
+from gevent.lock import RLock
+from looker_sdk.rtl import auth_session, auth_token, serialize, transport
+from looker_sdk.sdk.api40.methods import Looker40SDK
+
+__all__ = ["SharedAuthSession", "TokenCache", "configure", "use_shared_login"]
+
+
+class TokenCache:
+    """
+    Process-wide API credentials token, plus the sudo token of every embed user
+    logged in through it. Tokens are kept until they are about to expire (the SDK
+    treats them as expired 10 seconds early) and then renewed on next use.
+    """
+
+    def __init__(self):
+        self.admin = auth_token.AuthToken()
+        self.sudo: Dict[int, auth_token.AuthToken] = {}
+        self.admin_logins = 0
+        self.sudo_logins = 0
+        self.sudo_hits = 0
+        self.lock = RLock()
+
+
+TOKENS = TokenCache()
+
+
+class SharedAuthSession(auth_session.AuthSession):
+    """
+    AuthSession that logs in with the API credentials once per process instead of
+    once per SDK, and mints each user's sudo token from that shared login only when
+    the user has no active sudo token cached.
+    """
+
+    tokens = TOKENS
+
+    def _get_token(
+        self, transport_options: transport.TransportOptions
+    ) -> auth_token.AuthToken:
+        # Users that all need the token at once wait for a single login
+        with self.tokens.lock:
+            if not self.tokens.admin.is_active:
+                self._login(transport_options)
+                self.tokens.admin = self.token
+                self.tokens.admin_logins += 1
+        self.token = self.tokens.admin
+        return self.token
+
+    def _login_sudo(self, transport_options: transport.TransportOptions) -> None:
+        assert self._sudo_id is not None
+        cached = self.tokens.sudo.get(self._sudo_id)
+        if cached and cached.is_active:
+            self.sudo_token = cached
+            self.tokens.sudo_hits += 1
+            return
+        super()._login_sudo(transport_options)
+        self.tokens.sudo[self._sudo_id] = self.sudo_token
+        self.tokens.sudo_logins += 1
+
+
+_ENABLED = False
+
+
+def configure(enabled: bool = True):
+    """Share one API credentials login per process between all users."""
+    global _ENABLED
+    _ENABLED = enabled
+
+
+def use_shared_login(sdk: Looker40SDK) -> Looker40SDK:
+    """Swap the SDK's auth session for one backed by the process-wide token cache."""
+    if _ENABLED:
+        sdk.auth = SharedAuthSession(
+            sdk.auth.settings, sdk.transport, serialize.deserialize40, "4.0"
+        )
+    return sdk
@@ -0,0 +1,193 @@
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from gevent.lock import Semaphore
+from gevent.pool import Pool
+from looker_sdk.sdk.api40.methods import Looker40SDK
+from structlog import get_logger
+
+__all__ = [
+    "DashboardMetadataCache",
+    "DashboardTile",
+    "DASHBOARD_FIELDS",
+    "MergeSource",
+    "element_query_ids",
+]
+
+logger = get_logger(__name__)
+
+# Only what is needed to find and name each element's query, not the whole dashboard
+DASHBOARD_FIELDS = (
+    "title,dashboard_elements(id,title,query_id,merge_result_id,"
+    "result_maker(query_id,merge_result_id,query(id)),look(title,query_id,query(id)))"
+)
+MERGE_QUERY_FIELDS = "source_queries(query_id,merge_fields)"
+
+
+def _merge_result_id(element) -> str | None:
+    """Merge query ID of a merged results element, set on the element or its result maker."""
+    result_maker = getattr(element, "result_maker", None)
+    return getattr(element, "merge_result_id", None) or (
+        getattr(result_maker, "merge_result_id", None) if result_maker else None
+    )
+
+
+def element_query_ids(sdk: Looker40SDK, element) -> List[str]:
+    """Query IDs a dashboard element runs, looking up the sources of merged results."""
+    merge_result_id = _merge_result_id(element)
+    if merge_result_id and not getattr(element, "query_id", None):
+        return [source.query_id for source in _merge_sources(sdk, merge_result_id)]
+    if getattr(element, "query_id", None):
+        return [str(element.query_id)]
+    result_maker = getattr(element, "result_maker", None)
+    if result_maker:
+        if result_maker.query_id:
+            return [str(result_maker.query_id)]
+        if result_maker.query and result_maker.query.id:
+            return [str(result_maker.query.id)]
+        return []
+    look = getattr(element, "look", None)
+    if look:
+        if look.query_id:
+            return [str(look.query_id)]
+        if look.query and look.query.id:
+            return [str(look.query.id)]
+    return []
+
+
+@dataclass
+class MergeSource:
+    query_id: str
+    # (field of the first source query, field of this one) pairs to join rows on
+    merge_fields: List[Tuple[str, str]] = field(default_factory=list)
+
+
+@dataclass
+class DashboardTile:
+    dashboard_id: str
+    dashboard: str
+    title: str
+    # The merge query ID for merged results tiles
+    query_id: str
+    merge_sources: List[MergeSource] = field(default_factory=list)
+
+    @property
+    def name(self) -> str:
+        """Locust request name of the tile's query."""
+        return f"{self.dashboard}: {self.title}"
+
+    @property
+    def query_ids(self) -> List[str]:
+        """Queries the tile runs."""
+        if self.merge_sources:
+            return [source.query_id for source in self.merge_sources]
+        return [self.query_id]
+
+
+def _merge_sources(sdk: Looker40SDK, merge_result_id: str) -> List[MergeSource]:
+    merge_query = sdk.merge_query(merge_result_id, fields=MERGE_QUERY_FIELDS)
+    return [
+        MergeSource(
+            query_id=str(q.query_id),
+            merge_fields=[
+                (f.field_name, f.source_field_name)
+                for f in q.merge_fields or []
+                if f.field_name and f.source_field_name
+            ],
+        )
+        for q in merge_query.source_queries or []
+        if q and q.query_id
+    ]
+
+
+def _tiles(sdk: Looker40SDK, dashboard_id: str, dashboard) -> List[DashboardTile]:
+    """One tile per distinct query on the dashboard, as Looker runs each only once."""
+    tiles: Dict[str, DashboardTile] = {}
+    for element in dashboard.dashboard_elements or []:
+        look = getattr(element, "look", None)
+        title = element.title or (look.title if look else None)
+        tile = DashboardTile(
+            dashboard_id=dashboard_id,
+            dashboard=dashboard.title or dashboard_id,
+            title=title or f"element {element.id}",
+            query_id="",
+        )
+        merge_result_id = _merge_result_id(element)
+        if merge_result_id and not element.query_id:
+            tile.query_id = str(merge_result_id)
+            tile.merge_sources = _merge_sources(sdk, merge_result_id)
+            if tile.merge_sources:
+                tiles.setdefault(f"merge:{tile.query_id}", tile)
+            continue
+        for query_id in element_query_ids(sdk, element):
+            tile.query_id = query_id
+            if not title:
+                tile.title = f"element {element.id or query_id}"
+            tiles.setdefault(query_id, tile)
+    return list(tiles.values())
+
+
+class DashboardMetadataCache:
+    """
+    Query tiles of the dashboards' elements, shared by every user in the process and
+    fetched again once they are older than ttl seconds. Only one user refreshes at
+    a time, fetching up to `concurrency` dashboards in parallel, while the others
+    keep using the previous tiles. A dashboard that fails to load keeps its previous
+    tiles.
+    """
+
+    def __init__(self, dashboard_ids: List[str], ttl: float = 300, concurrency: int = 10):
+        self.dashboard_ids = dashboard_ids
+        self.ttl = ttl
+        self.concurrency = max(1, concurrency)
+        self._by_dashboard: Dict[str, List[DashboardTile]] = {}
+        self._tiles: List[DashboardTile] | None = None
+        self._fetched_at = 0.0
+        self._lock = Semaphore()
+        self.refreshes = 0
+
+    def _expired(self) -> bool:
+        return self._tiles is None or time.time() >= self._fetched_at + self.ttl
+
+    def _fetch(self, sdk: Looker40SDK, dashboard_id: str):
+        try:
+            dashboard = sdk.dashboard(dashboard_id, fields=DASHBOARD_FIELDS)
+            self._by_dashboard[dashboard_id] = _tiles(sdk, dashboard_id, dashboard)
+        except Exception as e:
+            logger.error("Failed to get dashboard metadata", dashboard_id=dashboard_id, error=str(e))
+
+    def refresh(self, sdk: Looker40SDK):
+        start = time.time()
+        pool = Pool(min(self.concurrency, len(self.dashboard_ids) or 1))
+        for dashboard_id in self.dashboard_ids:
+            pool.spawn(self._fetch, sdk, dashboard_id)
+        pool.join()
+        self._tiles = [
+            tile
+            for dashboard_id in self.dashboard_ids
+            for tile in self._by_dashboard.get(dashboard_id, [])
+        ]
+        self._fetched_at = time.time()
+        self.refreshes += 1
+        logger.info(
+            "dashboard_metadata_refreshed",
+            dashboards=len(self.dashboard_ids),
+            tiles=len(self._tiles),
+            duration_ms=round((self._fetched_at - start) * 1000, 1),
+        )
+
+    def tiles(self, sdk: Looker40SDK) -> List[DashboardTile]:
+        if self._expired():
+            if self._tiles is not None and self._lock.locked():
+                # Another user is already refreshing, the previous tiles will do until then
+                return self._tiles
+            with self._lock:
+                if self._expired():
+                    self.refresh(sdk)
+        return self._tiles or []
+
+    def query_ids(self, sdk: Looker40SDK) -> List[str]:
+        return list(
+            dict.fromkeys(query_id for tile in self.tiles(sdk) for query_id in tile.query_ids)
+        )
@@ -0,0 +1,202 @@
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, List, Tuple, Type
+
+import gevent
+from gevent.pool import Pool
+from locust import User
+from locust.env import Environment
+from looker_sdk.sdk.api40.methods import Looker40SDK
+from structlog import get_logger
+
+from lkr.load_test.attributes import CompiledAttributes
+
+logger = get_logger(__name__)
+
+__all__ = [
+    "EmbedIdentity",
+    "EmbedSession",
+    "EmbedSessionPool",
+    "IdentityPool",
+    "assign_identity",
+    "new_sdk",
+    "release_identity",
+]
+
+
+@dataclass
+class EmbedIdentity:
+    external_user_id: str
+    attributes: Dict[str, str]
+
+
+class IdentityPool:
+    """
+    A fixed set of embed users for the test to run as, so the number of Looker users
+    created is the pool size rather than one per session. Identities and their user
+    attributes are derived from their index alone, so every worker process and
+    every rerun of the test logs in as the same users with the same attributes.
+
+    Sessions check an identity out and return it when they are done. When there
+    are more sessions than identities, the least used identity is shared rather
+    than making sessions wait.
+    """
+
+    def __init__(self, size: int, attributes: CompiledAttributes, prefix: str = "embed-pool"):
+        self.identities = [
+            EmbedIdentity(
+                external_user_id=f"{prefix}-{i}",
+                attributes=attributes.generate(random.Random(f"{prefix}-{i}")),
+            )
+            for i in range(size)
+        ]
+        self._index = {identity.external_user_id: i for i, identity in enumerate(self.identities)}
+        self._free: Deque[int] = deque(range(size))
+        self._in_use = [0] * size
+
+    def checkout(self) -> EmbedIdentity:
+        if self._free:
+            index = self._free.popleft()
+        else:
+            index = min(range(len(self._in_use)), key=self._in_use.__getitem__)
+        self._in_use[index] += 1
+        return self.identities[index]
+
+    def release(self, identity: EmbedIdentity):
+        index = self._index[identity.external_user_id]
+        self._in_use[index] -= 1
+        if self._in_use[index] == 0:
+            self._free.append(index)
+
+
+def assign_identity(user: User):
+    """Swap the user's identity for the next one from its identity pool, if it has one."""
+    pool: IdentityPool | None = getattr(user, "identity_pool", None)
+    if not pool:
+        return
+    release_identity(user)
+    user.identity = pool.checkout()  # type: ignore[attr-defined]
+    user.user_id = user.identity.external_user_id  # type: ignore[attr-defined]
+
+
+def release_identity(user: User):
+    pool: IdentityPool | None = getattr(user, "identity_pool", None)
+    identity: EmbedIdentity | None = getattr(user, "identity", None)
+    if pool and identity:
+        pool.release(identity)
+        user.identity = None  # type: ignore[attr-defined]
+
+
+@dataclass
+class EmbedSession:
+    user_id: str
+    sdk: Looker40SDK
+    identity: EmbedIdentity | None = None
+
+
+class EmbedSessionPool:
+    """
+    Embed sessions acquired before the test starts, so ramp-up is not held back by
+    the acquire session and sudo login round trips of every new user. Users take a
+    ready session while there are any left and acquire their own afterwards.
+    """
+
+    def __init__(self, size: int, concurrency: int = 10, timeout: float = 300):
+        self.size = size
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self._sessions: Deque[EmbedSession] = deque()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def take(self) -> EmbedSession | None:
+        return self._sessions.popleft() if self._sessions else None
+
+    def warm(self, env: Environment, user_class: Type[User]):
+        """
+        Acquire `size` sessions, at most `concurrency` at a time, as user_class would.
+        Gives up on whatever is still being acquired after `timeout` seconds.
+        """
+        # Seconds each acquisition took, and its error if it failed
+        samples: List[Tuple[float, Exception | None]] = []
+
+        def acquire():
+            user = user_class(env)
+            assign_identity(user)
+            start = time.time()
+            try:
+                sdk = user._init_sdk()
+            except Exception as e:
+                samples.append((time.time() - start, e))
+                release_identity(user)
+                logger.warning("embed_session_warm_up_failed", error=str(e))
+                return
+            samples.append((time.time() - start, None))
+            self._sessions.append(
+                EmbedSession(user.user_id, sdk, getattr(user, "identity", None))
+            )
+
+        start = time.time()
+        pool = Pool(self.concurrency)
+        try:
+            with gevent.Timeout(self.timeout):
+                for _ in range(self.size):
+                    pool.spawn(acquire)
+                pool.join()
+        except gevent.Timeout:
+            pool.kill(block=False)
+            logger.warning("embed_session_warm_up_timeout", timeout=self.timeout)
+        elapsed = time.time() - start
+        sessions = sum(1 for _, error in samples if error is None)
+        logger.info(
+            "embed_session_warm_up",
+            sessions=sessions,
+            failures=len(samples) - sessions,
+            duration_s=round(elapsed, 2),
+            sessions_per_s=round(sessions / elapsed, 2) if elapsed else 0.0,
+        )
+
+        reported = False
+
+        def report(**kwargs):
+            # Locust clears its stats when the test starts, so the warm-up is reported
+            # as embed_session warm_up requests only then
+            nonlocal reported
+            if reported:
+                return
+            reported = True
+            for duration, error in samples:
+                env.events.request.fire(request_type="embed_session", name="warm_up", response_time=duration * 1000, response_length=0, exception=error)
+
+        env.events.test_start.add_listener(report)
+
+    def warm_up(self, user_class: Type[User]) -> Callable[[Environment], None]:
+        return lambda env: self.warm(env, user_class)
+
+
+def new_sdk(user: User) -> Looker40SDK:
+    """
+    A logged in SDK for the user: a warmed session from its session pool when one
+    is left, otherwise a freshly acquired one as the next identity from its
+    identity pool, if it has one. Acquisitions during the test are
+    reported as their own embed_session request so they stay out of query latency.
+    """
+    pool: EmbedSessionPool | None = getattr(user, "session_pool", None)
+    session = pool.take() if pool else None
+    if session:
+        release_identity(user)
+        user.user_id = session.user_id  # type: ignore[attr-defined]
+        user.identity = session.identity  # type: ignore[attr-defined]
+        return session.sdk
+    assign_identity(user)
+    start = time.time()
+    try:
+        sdk = user._init_sdk()  # type: ignore[attr-defined]
+    except Exception as e:
+        user.environment.events.request.fire(request_type="embed_session", name="acquire", response_time=(time.time() - start) * 1000, response_length=0, exception=e)
+        raise
+    user.environment.events.request.fire(request_type="embed_session", name="acquire", response_time=(time.time() - start) * 1000, response_length=0)
+    return sdk
@@ -0,0 +1,96 @@
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import attr
+from gevent.lock import Semaphore
+from locust import events
+from looker_sdk import models40
+from looker_sdk.sdk.api40.methods import Looker40SDK
+from structlog import get_logger
+
+from lkr.load_test.attributes import AttributeGenerator, parse_generator
+
+logger = get_logger(__name__)
+
+__all__ = ["FilterVariants", "compile_filter_variants"]
+
+WRITE_QUERY_FIELDS = [a.name for a in attr.fields(models40.WriteQuery)]
+
+
+class FilterVariants:
+    """
+    Copies of the load test's queries with other filter values, so that repeated
+    runs of the same query only hit Looker's cache as often as a real workload
+    would. Every query has `cardinality` variants, each picked equally often. The
+    fewer variants, the higher the cache hit rate.
+
+    Variant k sets every varied filter to the k-th value drawn from its generator,
+    for every query, so all worker processes (and reruns with the same seed) create
+    the same variant queries. Only filters a query already has are changed, and a
+    query with none of them runs as it is. Each variant query is created with
+    create_query the first time it is picked and reused after that.
+    """
+
+    def __init__(
+        self,
+        generators: Dict[str, AttributeGenerator],
+        cardinality: int,
+        seed: int | None = None,
+    ):
+        self.cardinality = max(1, cardinality)
+        self.values: List[Dict[str, str]] = []
+        for k in range(self.cardinality):
+            rng = random.Random(f"{seed}-{k}")
+            self.values.append({field: generator(rng) for field, generator in generators.items()})
+        self._queries: Dict[str, models40.Query] = {}
+        self._variants: Dict[Tuple[str, int], str] = {}
+        self._locks: Dict[str, Semaphore] = defaultdict(Semaphore)
+
+    def _create(self, sdk: Looker40SDK, query_id: str, k: int) -> str:
+        if query_id not in self._queries:
+            self._queries[query_id] = sdk.query(query_id)
+        query = self._queries[query_id]
+        filters = dict(query.filters or {})
+        changed = {f: v for f, v in self.values[k].items() if f in filters}
+        if not changed:
+            return query_id
+        body = models40.WriteQuery(
+            **{name: getattr(query, name, None) for name in WRITE_QUERY_FIELDS}
+        )
+        body.filters = {**filters, **changed}
+        # filter_config is the Explore UI's copy of the filters and would win over them
+        body.filter_config = None
+        body.client_id = None
+        start = time.time()
+        try:
+            variant = sdk.create_query(body, fields="id")
+        except Exception as e:
+            events.request.fire(request_type="create_query", name="filter_variant", response_time=(time.time() - start) * 1000, response_length=0, exception=e)
+            raise
+        events.request.fire(request_type="create_query", name="filter_variant", response_time=(time.time() - start) * 1000, response_length=0)
+        return str(variant.id)
+
+    def variant(self, sdk: Looker40SDK, query_id: str) -> str:
+        """ID of a random variant of the query, the query itself if it cannot be varied."""
+        key = (query_id, random.randrange(self.cardinality))
+        if key not in self._variants:
+            with self._locks[query_id]:
+                if key not in self._variants:
+                    try:
+                        self._variants[key] = self._create(sdk, query_id, key[1])
+                    except Exception as e:
+                        logger.warning("filter_variant_failed", query_id=query_id, error=str(e))
+                        return query_id
+        return self._variants[key]
+
+
+def compile_filter_variants(
+    specs: List[str], cardinality: int, seed: int | None = None
+) -> FilterVariants | None:
+    if not specs:
+        return None
+    return FilterVariants(
+        dict(parse_generator(spec, "filter variant") for spec in specs), cardinality, seed
+    )
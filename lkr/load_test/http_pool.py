@@ -0,0 +1,192 @@
+import math
+import time
+from typing import Dict
+
+import looker_sdk
+import requests
+from locust import events
+from locust.runners import WorkerRunner
+from looker_sdk.sdk.api40.methods import Looker40SDK
+from requests.adapters import HTTPAdapter
+from structlog import get_logger
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from lkr.load_test import auth
+
+logger = get_logger(__name__)
+
+__all__ = [
+    "ConnectionStats",
+    "SharedConnectionPool",
+    "configure",
+    "init40",
+    "pool_size",
+]
+
+
+class ConnectionStats:
+    """Requests sent and connections opened by this process, to report connection reuse."""
+
+    def __init__(self):
+        self.requests = 0
+        self.connections = 0
+        self.handshake_total = 0.0
+        self.handshake_max = 0.0
+        self._reported: Dict[str, Dict[str, float]] = {}
+
+    def record_connection(self, handshake: float):
+        self.connections += 1
+        self.handshake_total += handshake
+        self.handshake_max = max(self.handshake_max, handshake)
+
+    def _local_report(self) -> Dict[str, float]:
+        return {
+            "requests": self.requests,
+            "connections": self.connections,
+            "handshake_total": self.handshake_total,
+            "handshake_max": self.handshake_max,
+        }
+
+    def summary(self) -> Dict[str, float]:
+        reports = [self._local_report(), *self._reported.values()]
+        requests_sent = sum(r["requests"] for r in reports)
+        connections = sum(r["connections"] for r in reports)
+        handshake_total = sum(r["handshake_total"] for r in reports)
+        return {
+            "requests": requests_sent,
+            "connections": connections,
+            "reuse_ratio": (
+                round(1 - connections / requests_sent, 3) if requests_sent else 0.0
+            ),
+            "mean_handshake_ms": (
+                round(handshake_total / connections * 1000, 1) if connections else 0.0
+            ),
+            "max_handshake_ms": round(max(r["handshake_max"] for r in reports) * 1000, 1),
+        }
+
+    def register_events(self):
+        """Ship worker counters to the master and log the summary when the test stops."""
+
+        @events.report_to_master.add_listener
+        def on_report_to_master(client_id: str, data: dict):
+            data["http_connections"] = self._local_report()
+
+        @events.worker_report.add_listener
+        def on_worker_report(client_id: str, data: dict):
+            if "http_connections" in data:
+                self._reported[client_id] = data["http_connections"]
+
+        @events.test_stop.add_listener
+        def on_test_stop(environment, **kwargs):
+            if isinstance(environment.runner, WorkerRunner):
+                return
+            logger.info("http_connection_summary", **self.summary())
+
+
+STATS = ConnectionStats()
+
+
+class _TimedConnectionMixin:
+    def connect(self):
+        start = time.time()
+        super().connect()  # type: ignore[misc]
+        handshake = time.time() - start
+        STATS.record_connection(handshake)
+        # TCP (and TLS) handshake time shows up as its own row in the Locust stats
+        events.request.fire(
+            request_type="connect",
+            name="handshake",
+            response_time=handshake * 1000,
+            response_length=0,
+        )
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _HTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _HTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _CountingAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _HTTPConnectionPool,
+            "https": _HTTPSConnectionPool,
+        }
+
+    def send(self, *args, **kwargs):
+        STATS.requests += 1
+        return super().send(*args, **kwargs)
+
+
+class SharedConnectionPool:
+    """
+    One keep-alive connection pool per process, shared by the SDK of every user.
+    Auth headers are added per request by each SDK's auth session, never stored on
+    the shared session, so users stay logged in as themselves.
+
+    The session is created on first use so that every worker process builds its
+    own after it has been forked.
+    """
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self._session: requests.Session | None = None
+
+    def session(self, template: requests.Session) -> requests.Session:
+        if self._session is None:
+            session = requests.Session()
+            # Agent tag and SSL verification from the settings the SDK was built with
+            session.headers.update(template.headers)
+            session.verify = template.verify
+            adapter = _CountingAdapter(pool_maxsize=self.size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._session = session
+        return self._session
+
+
+_POOL: SharedConnectionPool | None = None
+
+
+def pool_size(
+    users: int, workers: int, per_user: int = 1, max_in_flight: int | None = None
+) -> int:
+    """
+    Connections a worker process needs at its peak: its share of the users, times
+    the requests each user runs at once, capped by a per-process limit if any.
+    Requests beyond the pool size open connections that are thrown away after use.
+    """
+    size = math.ceil(users / max(1, workers)) * max(1, per_user)
+    return min(size, max_in_flight) if max_in_flight else size
+
+
+def configure(size: int):
+    """Share one connection pool of `size` connections per process between all users."""
+    global _POOL
+    _POOL = SharedConnectionPool(size)
+    STATS.register_events()
+
+
+def init40() -> Looker40SDK:
+    """
+    looker_sdk.init40 for the load test users, on the shared connection pool and
+    with the shared login when they are configured.
+    """
+    sdk = looker_sdk.init40()
+    if _POOL is not None:
+        transport = sdk.transport
+        transport.session = _POOL.session(transport.session)  # type: ignore[attr-defined]
+    return auth.use_shared_login(sdk)
@@ -0,0 +1,52 @@
+from enum import Enum
+
+from gevent.lock import BoundedSemaphore
+
+__all__ = ["InFlightLimiter", "InFlightScope"]
+
+
+class InFlightScope(str, Enum):
+    global_ = "global"
+    user = "user"
+
+
+class InFlightLimiter:
+    """
+    Slots for outstanding async query tasks. A user takes a slot before creating a
+    query task and gives it back once the task finishes, so exactly `limit` tasks
+    are in flight whenever there are enough users to keep them busy.
+
+    A global limit is shared by every user in the process. When it is split across
+    worker processes, each worker binds to its share once it knows its index.
+    """
+
+    def __init__(self, limit: int, workers: int = 1):
+        self.limit = limit
+        self.workers = max(1, workers)
+        self.size = 0
+        self._semaphore: BoundedSemaphore | None = None
+
+    def share(self, worker_index: int) -> int:
+        base, remainder = divmod(self.limit, self.workers)
+        return base + (1 if max(worker_index, 0) < remainder else 0)
+
+    def bind(self, worker_index: int = 0):
+        if self._semaphore is None:
+            self.size = self.share(worker_index)
+            self._semaphore = BoundedSemaphore(self.size)
+
+    def acquire(self) -> bool:
+        """Take a slot without blocking, returns False when all slots are in use."""
+        self.bind()
+        assert self._semaphore is not None
+        return self._semaphore.acquire(blocking=False)
+
+    def release(self):
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    @property
+    def in_flight(self) -> int:
+        if self._semaphore is None:
+            return 0
+        return self.size - self._semaphore.counter
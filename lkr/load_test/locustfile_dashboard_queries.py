@@ -1,21 +1,33 @@
 import os
-import concurrent.futures
+import random
 import time
-from typing import List
+from typing import Any, Dict, List, Tuple
 from uuid import uuid4
 
-import looker_sdk
 from locust import User, between, task
 from looker_sdk import models40
 from looker_sdk.sdk.api40.methods import Looker40SDK
 import structlog
 
+from lkr.load_test import http_pool
 from lkr.load_test.embed_dashboard_observability.events import EventLogger
+from lkr.load_test.attributes import CompiledAttributes
+from lkr.load_test.dashboard_metadata import DashboardMetadataCache, DashboardTile
+from lkr.load_test.embed_sessions import (
+    EmbedIdentity,
+    EmbedSessionPool,
+    IdentityPool,
+    new_sdk,
+    release_identity,
+)
+from lkr.load_test.filter_variants import FilterVariants
+from lkr.load_test.merged_results import merge_results, result_rows
+from lkr.load_test.query_tasks import TaskPoller, poll_query_tasks
+from lkr.load_test.tile_pool import TilePool
 from lkr.load_test.utils import (
     MAX_SESSION_LENGTH,
     PERMISSIONS,
     extract_looker_user_id_from_token,
-    format_attributes,
     get_user_id,
     now,
     ms_diff,
@@ -45,17 +57,32 @@ class DashboardQueriesUser(User):
         self.queries: List[str] = []
         self.result_format: str = "json_bi"
         self.query_async: bool = False
-        self.attributes: List[str] = []
+        self.attributes = CompiledAttributes({})
         self.async_bail_out: int = 120
+        self.task_poller: TaskPoller | None = None
         self.sticky_sessions: bool = False
         self.group_ids: List[str] = []
         self.external_group_id: str | None = None
         self.log_event_prefix: str = "looker-dashboard-queries"
         self.first_name: str = "Embed"
+        self.session_pool: EmbedSessionPool | None = None
+        self.dashboard_metadata: DashboardMetadataCache | None = None
+        self.tile_concurrency: int = 20
+        self.tile_pool: TilePool | None = None
+        self.filter_variants: FilterVariants | None = None
+        self.cache_percent: float = 0.0
+        # Per dashboard ID, when its last tile finished and how many tiles failed
+        self._dashboards_finished: Dict[str, Tuple[float, int]] = {}
+        # Per merged results tile, source results so far and their errors
+        self._merges: Dict[int, Tuple[Dict[int, Tuple[Any, float]], List[Exception]]] = {}
+        self.identity_pool: IdentityPool | None = None
+        self.identity: EmbedIdentity | None = None
 
     def _init_sdk(self):
-        sdk = looker_sdk.init40()
-        attributes = format_attributes(self.attributes)
+        sdk = http_pool.init40()
+        attributes = (
+            self.identity.attributes if self.identity else self.attributes.generate()
+        )
         embed_session = sdk.acquire_embed_cookieless_session(
             models40.EmbedCookielessSessionAcquire(
                 first_name=self.first_name,
@@ -78,38 +105,95 @@ class DashboardQueriesUser(User):
         sdk.auth.login_user(looker_user_id)
         return sdk
 
-    def _get_queries_from_dashboards(self, sdk: Looker40SDK):
-        queries = set()
-        for db_id in self.dashboard_ids:
-            try:
-                dashboard = sdk.dashboard(db_id)             
-                if dashboard.dashboard_elements:
-                    for element in dashboard.dashboard_elements:
-                        if hasattr(element, "query_id") and element.query_id:
-                            queries.add(str(element.query_id))
-                        elif hasattr(element, "result_maker") and element.result_maker:
-                            if hasattr(element.result_maker, "query_id") and element.result_maker.query_id:
-                                queries.add(str(element.result_maker.query_id))
-                            elif hasattr(element.result_maker, "query") and element.result_maker.query and element.result_maker.query.id:
-                                queries.add(str(element.result_maker.query.id))
-                        elif hasattr(element, "look") and element.look:
-                            if hasattr(element.look, "query_id") and element.look.query_id:
-                                queries.add(str(element.look.query_id))
-                            elif hasattr(element.look, "query") and element.look.query and element.look.query.id:
-                                queries.add(str(element.look.query.id))
-                        elif hasattr(element, "merge_result_id") and element.merge_result_id:
-                            merge_query = sdk.merge_query(element.merge_result_id)
-                            if merge_query.source_queries:
-                                for q in merge_query.source_queries:
-                                    if q and hasattr(q, "query_id") and q.query_id:
-                                        queries.add(str(q.query_id))
-            except Exception as e:
-                logger.error("Failed to get dashboard metadata", dashboard_id=db_id, error=str(e))
-        return list(queries)
+    def _get_tiles_from_dashboards(self, sdk: Looker40SDK) -> List[DashboardTile]:
+        if self.dashboard_metadata is None:
+            self.dashboard_metadata = DashboardMetadataCache(self.dashboard_ids, ttl=0)
+        return self.dashboard_metadata.tiles(sdk)
+
+    def _should_use_cache(self) -> bool:
+        prob = self.cache_percent / 100.0
+        return random.random() < prob if prob > 0 else False
+
+    def _variant(self, sdk: Looker40SDK, query_id: str) -> str:
+        if self.filter_variants:
+            return self.filter_variants.variant(sdk, query_id)
+        return query_id
+
+    def _record_tile(
+        self,
+        tile: DashboardTile,
+        start_time: float,
+        finished_at: float,
+        response_length: int = 0,
+        exception: Exception | None = None,
+    ):
+        """Fire the Locust request event for one tile's query."""
+        self.environment.events.request.fire(request_type="dashboard_query", name=tile.name, response_time=(finished_at - start_time) * 1000, response_length=response_length, exception=exception)
+        last, failures = self._dashboards_finished.get(tile.dashboard_id, (start_time, 0))
+        self._dashboards_finished[tile.dashboard_id] = (
+            max(last, finished_at),
+            failures + (exception is not None),
+        )
+
+    def _finish_source(
+        self,
+        tile: DashboardTile,
+        index: int,
+        start_time: float,
+        finished_at: float,
+        data: Any = None,
+        exception: Exception | None = None,
+    ):
+        """
+        Record one source query of a merged results tile. Once all of them are in,
+        merge their results like the dashboard does and record the merge step and
+        the tile.
+        """
+        self.environment.events.request.fire(request_type="merge_source", name=f"{tile.name} #{index + 1}", response_time=(finished_at - start_time) * 1000, response_length=len(data) if isinstance(data, (str, bytes)) else len(str(data or "")), exception=exception)
+        results, errors = self._merges.setdefault(id(tile), ({}, []))
+        results[index] = (data, finished_at)
+        if exception:
+            errors.append(exception)
+        if len(results) < len(tile.merge_sources):
+            return
+        del self._merges[id(tile)]
+        last = max(at for _, at in results.values())
+        if errors:
+            self._record_tile(tile, start_time, last, exception=Exception(f"{len(errors)} of {len(results)} merge sources failed: {errors[0]}"))
+            return
+        merge_start = time.time()
+        try:
+            merged = merge_results(
+                [
+                    (result_rows(results[i][0]), source.merge_fields)
+                    for i, source in enumerate(tile.merge_sources)
+                ]
+            )
+        except Exception as e:
+            self.environment.events.request.fire(request_type="merge", name=tile.name, response_time=(time.time() - merge_start) * 1000, response_length=0, exception=e)
+            self._record_tile(tile, start_time, time.time(), exception=e)
+            return
+        merge_end = time.time()
+        self.environment.events.request.fire(request_type="merge", name=tile.name, response_time=(merge_end - merge_start) * 1000, response_length=len(merged))
+        # The merge starts once the last source is in, however late this user saw it
+        self._record_tile(tile, start_time, last + (merge_end - merge_start), len(merged))
+
+    def _record_dashboards(self, tiles: List[DashboardTile], start_time: float):
+        """Fire a request per dashboard for the time until its last tile finished."""
+        # Keyed by ID, as two dashboards can share a title, which only names the request
+        names = {tile.dashboard_id: tile.dashboard for tile in reversed(tiles)}
+        for dashboard_id in dict.fromkeys(tile.dashboard_id for tile in tiles):
+            count = sum(tile.dashboard_id == dashboard_id for tile in tiles)
+            last, failures = self._dashboards_finished.get(dashboard_id, (time.time(), count))
+            self.environment.events.request.fire(request_type="dashboard_complete", name=names[dashboard_id], response_time=(last - start_time) * 1000, response_length=count, exception=Exception(f"{failures} of {count} tiles failed") if failures else None)
+        self._dashboards_finished.clear()
 
     def on_start(self):
         if self.sticky_sessions:
-            self.sdk = self._init_sdk()
+            self.sdk = new_sdk(self)
+
+    def on_stop(self):
+        release_identity(self)
 
     @task
     def run_dashboard_queries(self):
@@ -127,7 +211,7 @@ class DashboardQueriesUser(User):
         
         if not self.sdk:
             try:
-                sdk = self._init_sdk()
+                sdk = new_sdk(self)
                 event_logger.log_event("sdk_initialized")
             except Exception as e:
                 event_logger.log_event("sdk_init_error", error=str(e))
@@ -135,7 +219,8 @@ class DashboardQueriesUser(User):
         else:
             sdk = self.sdk
 
-        queries = self._get_queries_from_dashboards(sdk)
+        tiles = self._get_tiles_from_dashboards(sdk)
+        queries = [query_id for tile in tiles for query_id in tile.query_ids]
         event_logger.log_event("metadata_fetched", query_count=len(queries))
             
         if not queries:
@@ -145,77 +230,103 @@ class DashboardQueriesUser(User):
         event_logger.log_event("queries_selected", query_ids=queries)
         
         start_time = now()
+        tiles_start = time.time()
 
-        query_tasks = []
+        # Task ID to its tile and, for merged results, its source index
+        task_tiles: Dict[str, Tuple[DashboardTile, int]] = {}
         
         try:
             if self.query_async:
                 event_logger.log_event("run_query_async_start", query_count=len(queries))
-                for query in queries:
+                for tile, index, query in [
+                    (tile, index, query)
+                    for tile in tiles
+                    for index, query in enumerate(tile.query_ids)
+                ]:
                     try:
                         res_fmt = models40.ResultFormat(self.result_format)
                         query_task = sdk.create_query_task(
                             models40.WriteCreateQueryTask(
-                                query_id=query,
+                                query_id=self._variant(sdk, query),
                                 result_format=res_fmt,
                             ),
-                            cache=False,
+                            cache=self._should_use_cache(),
                         )
                         if not query_task or not getattr(query_task, "id", None):
                             raise ValueError(f"Failed to create query task: {query}")
                         
-                        query_tasks.append(query_task)
+                        task_tiles[str(query_task.id)] = (tile, index)
                         event_logger.log_event("query_task_created", task_id=str(query_task.id))
                             
                     except Exception as e:
                         event_logger.log_event("query_task_failed", query_id=query, error=str(e))
+                        if tile.merge_sources:
+                            self._finish_source(tile, index, tiles_start, time.time(), exception=e)
+                        else:
+                            self._record_tile(tile, tiles_start, time.time(), exception=e)
                 
-                remaining_tasks = list(query_tasks)
-                for _ in range(self.async_bail_out):
-                    if not remaining_tasks:
-                        break
-                    
-                    completed_tasks = []
-                    for qt in remaining_tasks:
-                        qt_id = str(qt.id) if getattr(qt, "id", None) else ""
-                        status = sdk.query_task_results(qt_id)
-                        event_logger.log_event("query_task_checked", task_id=qt.id, status=str(status))
-                        
-                        if isinstance(status, dict):
-                            if "rows" in status:
-                                completed_tasks.append(qt)
-                                event_logger.log_event("run_query_async_complete", task_id=qt.id)
-                            errors = status.get("errors")
-                            if errors is not None:
-                                event_logger.log_event("query_task_run_error", task_id=qt.id, errors=errors)
-                                completed_tasks.append(qt)
-                        elif hasattr(status, "status") and status.status == "complete":
-                            completed_tasks.append(qt)
-                            
-                    for qt in completed_tasks:
-                        remaining_tasks.remove(qt)
-                        
-                    if remaining_tasks:
-                        time.sleep(1)
+                task_ids = list(task_tiles)
+                if self.task_poller:
+                    results = self.task_poller.wait(sdk, task_ids, self.async_bail_out)
+                else:
+                    results = poll_query_tasks(sdk, task_ids, self.async_bail_out)
+                for result in results:
+                    tile, index = task_tiles[result.task_id]
+                    exception = None
+                    if result.status == "timeout":
+                        event_logger.log_event("query_task_timeout", task_id=result.task_id, polls=result.polls)
+                        exception = Exception(f"Timeout waiting for async task {result.task_id} after {self.async_bail_out}s")
+                    elif result.ok:
+                        event_logger.log_event("run_query_async_complete", task_id=result.task_id, polls=result.polls)
+                    else:
+                        event_logger.log_event("query_task_run_error", task_id=result.task_id, errors=result.errors, polls=result.polls)
+                        exception = Exception(f"Error in query task {result.task_id}: {result.errors or result.status}")
+                    if tile.merge_sources:
+                        self._finish_source(tile, index, tiles_start, result.finished_at, None if exception else result.data, exception)
+                    elif exception:
+                        self._record_tile(tile, tiles_start, result.finished_at, exception=exception)
+                    else:
+                        self._record_tile(tile, tiles_start, result.finished_at, len(str(result.data)))
                 
             else:
                 event_logger.log_event("run_queries_start", query_count=len(queries))
                 
-                def _run_single_query(q):
+                def _run_source_query(tile: DashboardTile, index: int, q: str):
+                    try:
+                        event_logger.log_event("run_query_start", query_id=q)
+                        res = sdk.run_query(self._variant(sdk, q), result_format=self.result_format, cache=self._should_use_cache())
+                        event_logger.log_event("run_query_complete", query_id=q)
+                    except Exception as e:
+                        event_logger.log_event("run_query_error", query_id=q, error=str(e))
+                        self._finish_source(tile, index, tiles_start, time.time(), exception=e)
+                    else:
+                        self._finish_source(tile, index, tiles_start, time.time(), res)
+
+                def _run_single_query(tile: DashboardTile, index: int):
+                    if tile.merge_sources:
+                        # Source queries take tile pool slots of their own, the last
+                        # one to finish runs the merge
+                        _run_source_query(tile, index, tile.query_ids[index])
+                        return
+                    q = tile.query_id
                     try:
                         event_logger.log_event("run_query_start", query_id=q)
-                        sdk.run_query(q, result_format=self.result_format, cache=False)
+                        res = sdk.run_query(self._variant(sdk, q), result_format=self.result_format, cache=self._should_use_cache())
                         event_logger.log_event("run_query_complete", query_id=q)
+                        self._record_tile(tile, tiles_start, time.time(), len(res))
                     except Exception as e:
                         event_logger.log_event("run_query_error", query_id=q, error=str(e))
+                        self._record_tile(tile, tiles_start, time.time(), exception=e)
 
-                max_workers = min(20, len(queries))
-                with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-                    executor.map(_run_single_query, queries)
+                if self.tile_pool is None:
+                    self.tile_pool = TilePool()
+                self.tile_pool.run(tiles, _run_single_query, self.tile_concurrency)
                     
                 event_logger.log_event("run_query_parallel_complete")
                 
         except Exception as e:
             event_logger.log_event("query_error", error=str(e))
-            
+
+        self._merges.clear()
+        self._record_dashboards(tiles, tiles_start)
         event_logger.log_event("task_complete", duration_ms=ms_diff(start_time))
@@ -5,17 +5,41 @@ import time
 from dataclasses import dataclass
 from typing import Dict, List
 
-import looker_sdk
+from gevent.pool import Group, Pool
 from locust import User, between, task  # noqa
 from looker_sdk import models40
 from looker_sdk.sdk.api40.methods import Looker40SDK
 from structlog import get_logger
 
+from lkr.load_test import http_pool
+from lkr.load_test.arrival import ArrivalSchedule
+from lkr.load_test.attributes import CompiledAttributes
+from lkr.load_test.embed_sessions import (
+    EmbedIdentity,
+    EmbedSessionPool,
+    IdentityPool,
+    new_sdk,
+    release_identity,
+)
+from lkr.load_test.filter_variants import FilterVariants
+from lkr.load_test.in_flight import InFlightLimiter
+from lkr.load_test.query_tasks import (
+    PollBackoff,
+    QueryTaskResult,
+    TaskClient,
+    TaskPoller,
+    check_query_tasks,
+    finished_task,
+    poll_query_tasks,
+    query_task_runtime,
+)
+from lkr.load_test.raw_client import RawLookerClient
+from lkr.load_test.streaming import stream_query_results
+from lkr.load_test.workload import Workload
 from lkr.load_test.utils import (
     MAX_SESSION_LENGTH,
     PERMISSIONS,
     extract_looker_user_id_from_token,
-    format_attributes,
     get_user_id,
 )
 
@@ -92,7 +116,7 @@ class QueryUser(User):
         self.queries: Dict[str, models40.Query] = {}
         self.result_format: str = "json_bi"
         self.query_async: bool = False
-        self.attributes: List[str] = []
+        self.attributes = CompiledAttributes({})
         self.async_bail_out: int = 120
         self.sticky_sessions: bool = False
         self.max_queries_per_task: int = 1
@@ -100,14 +124,61 @@ class QueryUser(User):
         self.external_group_id: str | None = None
         self.first_name: str = "Embed"
         self.cache_percent: float = 0.0
+        self.arrival_schedule: ArrivalSchedule | None = None
+        self.in_flight_limiter: InFlightLimiter | None = None
+        self.task_poller: TaskPoller | None = None
+        self.query_concurrency: int | None = None
+        self.stream_results: bool = False
+        self.raw_client: bool = False
+        self.session_pool: EmbedSessionPool | None = None
+        self.filter_variants: FilterVariants | None = None
+        self.query_timings: bool = False
+        # --query-timings lookups still running, killed when the user stops
+        self._timing_greenlets = Group()
+        self.workload: Workload | None = None
+        self.per_query_stats: bool = False
+        # Query slug of every outstanding query task
+        self._task_queries: Dict[str, str] = {}
+        self.identity_pool: IdentityPool | None = None
+        self.identity: EmbedIdentity | None = None
+        self._in_flight: Dict[str, float] = {}
+        self._in_flight_polls: Dict[str, int] = {}
+        self._in_flight_backoff = PollBackoff()
+
+    def _workload_query(self, query: str | None):
+        return self.workload.get(query) if query and self.workload else None
 
-    def _should_use_cache(self) -> bool:
-        prob = self.cache_percent / 100.0
+    def _should_use_cache(self, query: str | None = None) -> bool:
+        workload_query = self._workload_query(query)
+        cache_percent = self.cache_percent
+        if workload_query and workload_query.cache_percent is not None:
+            cache_percent = workload_query.cache_percent
+        prob = cache_percent / 100.0
         return random.random() < prob if prob > 0 else False
 
+    def _result_format(self, query: str | None = None) -> str:
+        workload_query = self._workload_query(query)
+        if workload_query and workload_query.result_format:
+            return workload_query.result_format
+        return self.result_format
+
+    def _stat_name(self, name: str, query: str | None) -> str:
+        """Locust request name, per query slug with --per-query-stats."""
+        return f"{name}: {query}" if self.per_query_stats and query else name
+
+    def _pick_query(self) -> str:
+        return self.workload.pick() if self.workload else random.choice(self.qid)
+
+    def _select_queries(self, count: int) -> List[str]:
+        if self.workload:
+            return self.workload.sample(count)
+        return random.sample(self.qid, count)
+
     def _init_sdk(self):
-        sdk = looker_sdk.init40()
-        attributes = format_attributes(self.attributes)
+        sdk = http_pool.init40()
+        attributes = (
+            self.identity.attributes if self.identity else self.attributes.generate()
+        )
         embed_session = sdk.acquire_embed_cookieless_session(
             models40.EmbedCookielessSessionAcquire(
                 first_name=self.first_name,
@@ -135,7 +206,20 @@ class QueryUser(User):
     def on_start(self):
         # Initialize the SDK - make sure to set your environment variables
         if self.sticky_sessions:
-            self.sdk = self._init_sdk()
+            self.sdk = new_sdk(self)
+        if self.in_flight_limiter:
+            self.in_flight_limiter.bind(getattr(self.environment.runner, "worker_index", 0))
+
+    def on_stop(self):
+        # Hand back the in-flight slots of this user's outstanding tasks
+        if self.in_flight_limiter:
+            for _ in self._in_flight:
+                self.in_flight_limiter.release()
+            self._in_flight.clear()
+            self._in_flight_polls.clear()
+        self._task_queries.clear()
+        self._timing_greenlets.kill(block=False)
+        release_identity(self)
 
     # TODO: Causing greenlet issues
     # def on_stop(self):
@@ -144,122 +228,270 @@ class QueryUser(User):
     #         if user and user.id:
     #             self.sdk.delete_user(user.id)
 
+    def _task_client(self, sdk: Looker40SDK) -> TaskClient:
+        return RawLookerClient(sdk) if self.raw_client else sdk
+
+    def _variant(self, sdk: Looker40SDK, query_id: str) -> str:
+        if self.filter_variants:
+            return self.filter_variants.variant(sdk, query_id)
+        return query_id
+
+    def _create_query_task(
+        self, sdk: Looker40SDK, query: str, start_time: float, ts: TimingStats
+    ) -> str | None:
+        """Look up the query and start an async query task for it, returns the task id."""
+        if query not in self.queries:
+            if query in self.query_slug_to_id:
+                self.queries[query] = models40.Query(id=self.query_slug_to_id[query], slug=query, model="", view="")
+            else:
+                try:
+                    x = sdk.query_for_slug(query)
+                    self.queries[query] = x
+                    if not ts.lookup_query:
+                        ts.lookup_query = datetime.datetime.now()
+                except Exception as e:
+                    self.environment.events.request.fire(request_type="query_for_slug", name="run_query_async", response_time=(time.time() - start_time) * 1000, response_length=0, exception=e)
+                    return None
+
+        query_obj = self.queries.get(query)
+        if not query_obj or not query_obj.id:
+            self.environment.events.request.fire(request_type="lookup_query", name="run_query_async", response_time=(time.time() - start_time) * 1000, response_length=0, exception=Exception(f"Query object or its id is None for {query}"))
+            return None
+        # Use the correct ResultFormat enum if available, else raise
+        if hasattr(models40, "ResultFormat"):
+            try:
+                result_format = models40.ResultFormat(self._result_format(query))
+            except Exception as e:
+                self.environment.events.request.fire(request_type="result_format", name="run_query_async", response_time=(time.time() - start_time) * 1000, response_length=0, exception=e)
+                return None
+        else:
+            self.environment.events.request.fire(request_type="result_format", name="run_query_async", response_time=(time.time() - start_time) * 1000, response_length=0, exception=Exception("models40.ResultFormat not available"))
+            return None
+
+        try:
+            query_id = self._variant(sdk, query_obj.id)
+            if self.raw_client:
+                task_id = RawLookerClient(sdk).create_query_task(
+                    query_id, result_format.value, cache=self._should_use_cache(query)
+                )
+                if not ts.task:
+                    ts.task = datetime.datetime.now()
+                self._task_queries[task_id] = query
+                return task_id
+            task = sdk.create_query_task(
+                models40.WriteCreateQueryTask(
+                    query_id=query_id,
+                    result_format=result_format,
+                ),
+                cache=self._should_use_cache(query),
+            )
+            if not ts.task:
+                ts.task = datetime.datetime.now()
+            if (
+                not task
+                or not getattr(task, "id", None)
+                or not isinstance(task.id, str)
+            ):
+                self.environment.events.request.fire(request_type="create_query_task", name=self._stat_name("run_query_async", query), response_time=(time.time() - start_time) * 1000, response_length=0, exception=Exception(f"Query task or its id is None or not a string for {query}"))
+                return None
+            self._task_queries[task.id] = query
+            return task.id
+        except Exception as e:
+            self.environment.events.request.fire(request_type="create_query_task", name=self._stat_name("run_query_async", query), response_time=(time.time() - start_time) * 1000, response_length=0, exception=e)
+            return None
+
+    def _record_query_timing(
+        self, client: TaskClient, query: str, task_id: str, observed: float
+    ):
+        """
+        Split a finished task's time into Looker's own runtime for the query and the
+        overhead, which is everything else the client saw: time queued in Looker,
+        the create_query_task request, poll intervals and the results download.
+        Reported as separate stats per query slug and result source (cache or query).
+        """
+        try:
+            runtime, result_source = query_task_runtime(client, task_id)
+        except Exception as e:
+            logger.warning("query_timing_failed", task_id=task_id, error=str(e))
+            return
+        if runtime is None:
+            return
+        name = f"{query} [{result_source or 'unknown'}]"
+        # Breakdowns of a task already counted, so not requests of their own
+        self.environment.events.request.fire(request_type="query_timing", name=f"looker_runtime: {name}", response_time=runtime * 1000, response_length=0)
+        self.environment.events.request.fire(request_type="query_timing", name=f"overhead: {name}", response_time=max(observed - runtime, 0) * 1000, response_length=0)
+        self.environment.events.request.fire(request_type="query_timing", name=f"client_observed: {name}", response_time=observed * 1000, response_length=0)
+
+    def _record_query_task(
+        self, result: QueryTaskResult, start_time: float, sdk: Looker40SDK | None = None
+    ):
+        """
+        Fire the Locust request event for a finished (or abandoned) async query task,
+        plus its Looker timing breakdown with --query-timings.
+        """
+        query = self._task_queries.pop(result.task_id, None)
+        if self.query_timings and sdk and query and result.ok:
+            self._timing_greenlets.spawn(
+                self._record_query_timing,
+                self._task_client(sdk),
+                query,
+                result.task_id,
+                result.finished_at - start_time,
+            )
+        response_time = (result.finished_at - start_time) * 1000
+        context = {"polls": result.polls}
+        if result.status == "timeout":
+            self.environment.events.request.fire(request_type="query_task_results", name=self._stat_name("run_query_async", query), response_time=response_time, response_length=0, exception=Exception(f"Timeout waiting for async task {result.task_id} after {self.async_bail_out}s"), context=context)
+        elif result.ok:
+            self.environment.events.request.fire(request_type="query_task_results", name=self._stat_name("run_query_async", query), response_time=response_time, response_length=len(str(result.data)), context=context)
+        else:
+            self.environment.events.request.fire(request_type="query_task_results", name=self._stat_name("run_query_async", query), response_time=response_time, response_length=0, exception=Exception(f"Error in query task {result.task_id}: {result.errors or result.status}"), context=context)
+
+    def _run_sync_query(
+        self, sdk: Looker40SDK, q: str, start_time: float | None = None
+    ) -> bool:
+        """Run a single query with run_query, returns whether it succeeded."""
+        start_time = start_time or time.time()
+        try:
+            if q not in self.queries:
+                if q in self.query_slug_to_id:
+                    self.queries[q] = models40.Query(id=self.query_slug_to_id[q], slug=q, model="", view="")
+                else:
+                    self.queries[q] = sdk.query_for_slug(q)
+            query_obj = self.queries.get(q)
+            qid = self._variant(sdk, str(query_obj.id) if query_obj and query_obj.id else q)
+            if self.stream_results:
+                sent = time.time()
+                streamed = stream_query_results(
+                    sdk, qid, self._result_format(q), cache=self._should_use_cache(q)
+                )
+                self.environment.events.request.fire(request_type="run_query", name=self._stat_name("run_query_sync_ttfb", q), response_time=(sent + streamed.ttfb - start_time) * 1000, response_length=0)
+                self.environment.events.request.fire(request_type="run_query", name=self._stat_name("run_query_sync", q), response_time=(time.time() - start_time) * 1000, response_length=streamed.bytes, context={"rows": streamed.rows})
+                return True
+            if self.raw_client:
+                res = RawLookerClient(sdk).run_query(
+                    qid, self._result_format(q), cache=self._should_use_cache(q)
+                )
+            else:
+                res = sdk.run_query(
+                    qid, result_format=self._result_format(q), cache=self._should_use_cache(q)
+                )
+            self.environment.events.request.fire(request_type="run_query", name=self._stat_name("run_query_sync", q), response_time=(time.time() - start_time) * 1000, response_length=len(res))
+            return True
+        except Exception as e:
+            self.environment.events.request.fire(request_type="run_query", name=self._stat_name("run_query_sync", q), response_time=(time.time() - start_time) * 1000, response_length=0, exception=e)
+            return False
+
+    def _run_in_flight(self, sdk: Looker40SDK):
+        """
+        Poll all of this user's outstanding query tasks in one request, then replace every finished
+        task straight away so the in-flight limit stays full.
+        """
+        assert self.in_flight_limiter is not None
+        ts: TimingStats = TimingStats(start=datetime.datetime.now())
+        completed = 0
+        if self._in_flight:
+            try:
+                results = check_query_tasks(self._task_client(sdk), list(self._in_flight))
+            except Exception as e:
+                results = {
+                    task_id: {"status": "error", "errors": str(e)}
+                    for task_id in self._in_flight
+                }
+            for task_id, start_time in list(self._in_flight.items()):
+                polls = self._in_flight_polls.get(task_id, 0) + 1
+                self._in_flight_polls[task_id] = polls
+                result = finished_task(task_id, results.get(task_id), polls)
+                if not result and time.time() - start_time > self.async_bail_out:
+                    result = QueryTaskResult(task_id, "timeout", polls)
+                if not result:
+                    continue
+                self._record_query_task(result, start_time, sdk)
+                del self._in_flight[task_id]
+                del self._in_flight_polls[task_id]
+                self.in_flight_limiter.release()
+                completed += 1
+
+        while self.in_flight_limiter.acquire():
+            start_time = time.time()
+            task_id = self._create_query_task(sdk, self._pick_query(), start_time, ts)
+            if not task_id:
+                self.in_flight_limiter.release()
+                break
+            self._in_flight[task_id] = start_time
+            self._in_flight_backoff.reset()
+
+        if completed:
+            logger.info(
+                "run_query_in_flight",
+                completed=completed,
+                user_in_flight=len(self._in_flight),
+                in_flight=self.in_flight_limiter.in_flight,
+            )
+        time.sleep(self._in_flight_backoff.next())
+
     @task
     def run_query(self):
+        # In open-loop mode, latency is measured from when the arrival was due, so time
+        # spent waiting for a free user counts against Looker instead of hiding it
+        arrival_due = self.arrival_schedule.wait() if self.arrival_schedule else None
+        arrival_start = arrival_due
         ts: TimingStats = TimingStats()
         ts.start = datetime.datetime.now()
         if not self.sdk:
-            sdk = self._init_sdk()
+            sdk = new_sdk(self)
             ts.init_sdk = datetime.datetime.now()
+            if arrival_start is not None:
+                # Session acquisition and login are reported as embed_session, so they
+                # are left out of query latency rather than counted twice
+                arrival_start += (ts.init_sdk - ts.start).total_seconds()
         else:
             sdk = self.sdk
+        if self.in_flight_limiter:
+            # Outstanding tasks can only be polled by the user that created them
+            self.sdk = sdk
+            self._run_in_flight(sdk)
+            return
         num_queries = min(len(self.qid), self.max_queries_per_task)
-        selected_queries = random.sample(self.qid, num_queries)
+        selected_queries = self._select_queries(num_queries)
+        # Polls each async query task needed before its result was seen
+        polls: Dict[str, int] = {}
 
         if self.query_async:
-            query_tasks = []
+            start_times: Dict[str, float] = {}
             for query in selected_queries:
-                start_time = time.time()
-                if query not in self.queries:
-                    if query in self.query_slug_to_id:
-                        self.queries[query] = models40.Query(id=self.query_slug_to_id[query], slug=query, model="", view="")
-                    else:
-                        try:
-                            x = sdk.query_for_slug(query)
-                            self.queries[query] = x
-                            if not ts.lookup_query:
-                                ts.lookup_query = datetime.datetime.now()
-                        except Exception as e:
-                            self.environment.events.request.fire(request_type="query_for_slug", name="run_query_async", response_time=(time.time() - start_time) * 1000, response_length=0, exception=e)
-                            continue
-
-                query_obj = self.queries.get(query)
-                if not query_obj or not query_obj.id:
-                    self.environment.events.request.fire(request_type="lookup_query", name="run_query_async", response_time=(time.time() - start_time) * 1000, response_length=0, exception=Exception(f"Query object or its id is None for {query}"))
-                    continue
-                # Use the correct ResultFormat enum if available, else raise
-                if hasattr(models40, "ResultFormat"):
-                    try:
-                        result_format = models40.ResultFormat(self.result_format)
-                    except Exception as e:
-                        self.environment.events.request.fire(request_type="result_format", name="run_query_async", response_time=(time.time() - start_time) * 1000, response_length=0, exception=e)
-                        continue
-                else:
-                    self.environment.events.request.fire(request_type="result_format", name="run_query_async", response_time=(time.time() - start_time) * 1000, response_length=0, exception=Exception("models40.ResultFormat not available"))
-                    continue
+                start_time = arrival_start or time.time()
+                task_id = self._create_query_task(sdk, query, start_time, ts)
+                if task_id:
+                    start_times[task_id] = start_time
 
-                try:
-                    task = sdk.create_query_task(
-                        models40.WriteCreateQueryTask(
-                            query_id=query_obj.id,
-                            result_format=result_format,
-                        ),
-                        cache=self._should_use_cache(),
-                    )
-                    if not ts.task:
-                        ts.task = datetime.datetime.now()
-                    if (
-                        not task
-                        or not getattr(task, "id", None)
-                        or not isinstance(task.id, str)
-                    ):
-                        self.environment.events.request.fire(request_type="create_query_task", name="run_query_async", response_time=(time.time() - start_time) * 1000, response_length=0, exception=Exception(f"Query task or its id is None or not a string for {query}"))
-                        continue
-                    query_tasks.append((task.id, start_time))
-                except Exception as e:
-                    self.environment.events.request.fire(request_type="create_query_task", name="run_query_async", response_time=(time.time() - start_time) * 1000, response_length=0, exception=e)
-
-            remaining_tasks = list(query_tasks)
-            for _i in range(self.async_bail_out):
-                if not remaining_tasks:
-                    break
-                completed_tasks = []
-                for task_info in remaining_tasks:
-                    task_id, start_time = task_info
-                    try:
-                        finish_task = sdk.query_task_results(task_id)
-                        if isinstance(finish_task, dict):
-                            if "rows" in finish_task:
-                                completed_tasks.append(task_info)
-                                self.environment.events.request.fire(request_type="query_task_results", name="run_query_async", response_time=(time.time() - start_time) * 1000, response_length=len(str(finish_task)))
-                            else:
-                                errors = finish_task.get("errors")
-                                if errors is not None:
-                                    completed_tasks.append(task_info)
-                                    self.environment.events.request.fire(request_type="query_task_results", name="run_query_async", response_time=(time.time() - start_time) * 1000, response_length=0, exception=Exception(f"Error in query task {task_id}: {errors}"))
-                        elif hasattr(finish_task, "status") and finish_task.status == "complete":
-                            completed_tasks.append(task_info)
-                            self.environment.events.request.fire(request_type="query_task_results", name="run_query_async", response_time=(time.time() - start_time) * 1000, response_length=len(str(finish_task)))
-                    except Exception as e:
-                        completed_tasks.append(task_info)
-                        self.environment.events.request.fire(request_type="query_task_results", name="run_query_async", response_time=(time.time() - start_time) * 1000, response_length=0, exception=e)
-                for task_info in completed_tasks:
-                    remaining_tasks.remove(task_info)
-                if remaining_tasks:
-                    time.sleep(1)
-
-            for task_info in remaining_tasks:
-                task_id, start_time = task_info
-                self.environment.events.request.fire(request_type="query_task_results", name="run_query_async", response_time=(time.time() - start_time) * 1000, response_length=0, exception=Exception(f"Timeout waiting for async task {task_id} after {self.async_bail_out}s"))
+            if self.task_poller:
+                results = self.task_poller.wait(
+                    self._task_client(sdk), list(start_times), self.async_bail_out
+                )
+            else:
+                results = poll_query_tasks(
+                    self._task_client(sdk), list(start_times), self.async_bail_out
+                )
+            for result in results:
+                self._record_query_task(result, start_times[result.task_id], sdk)
+                polls[result.task_id] = result.polls
 
             ts.finish_task = datetime.datetime.now()
         else:
-            for q in selected_queries:
-                start_time = time.time()
-                try:
-                    if q not in self.queries:
-                        if q in self.query_slug_to_id:
-                            self.queries[q] = models40.Query(id=self.query_slug_to_id[q], slug=q, model="", view="")
-                        else:
-                            self.queries[q] = sdk.query_for_slug(q)
-                    query_obj = self.queries.get(q)
-                    qid = str(query_obj.id) if query_obj and query_obj.id else q
-                    res = sdk.run_query(
-                        qid, result_format=self.result_format, cache=self._should_use_cache()
-                    )
-                    self.environment.events.request.fire(request_type="run_query", name="run_query_sync", response_time=(time.time() - start_time) * 1000, response_length=len(str(res)))
-                except Exception as e:
-                    self.environment.events.request.fire(request_type="run_query", name="run_query_sync", response_time=(time.time() - start_time) * 1000, response_length=0, exception=e)
+            # Selected queries run side by side like the tiles of a dashboard. Queries in
+            # the first wave start at the arrival, later ones when a slot frees up
+            group_start = arrival_start or time.time()
+            concurrency = self.query_concurrency or len(selected_queries)
+            pool = Pool(concurrency)
+            runs = [
+                pool.spawn(self._run_sync_query, sdk, q, group_start if i < concurrency else None)
+                for i, q in enumerate(selected_queries)
+            ]
+            pool.join()
+            if len(selected_queries) > 1:
+                failed = sum(1 for run in runs if not run.value)
+                self.environment.events.request.fire(request_type="run_query", name="time_to_last_tile", response_time=(time.time() - group_start) * 1000, response_length=len(selected_queries), exception=Exception(f"{failed} of {len(selected_queries)} queries failed") if failed else None)
             ts.run_query = datetime.datetime.now()
         ts.end = datetime.datetime.now()
         logger.info(
@@ -268,4 +500,8 @@ class QueryUser(User):
             selected_count=len(selected_queries),
             time_taken=(ts.end - ts.start).total_seconds(),
             steps=ts.log_steps(),
+            polls=polls or None,
+            arrival_lag=(
+                ts.start.timestamp() - arrival_due if arrival_due else None
+            ),
         )
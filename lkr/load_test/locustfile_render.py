@@ -1,19 +1,29 @@
-import datetime
 import os
+import random
 import time
-from typing import List
+from typing import Any, Dict, List
 
-import looker_sdk
 from locust import User, between, task  # noqa
 from looker_sdk import models40
 from looker_sdk.sdk.api40.methods import Looker40SDK
 from structlog import get_logger
 
+from lkr.load_test import http_pool
+from lkr.load_test.attributes import CompiledAttributes
+from lkr.load_test.embed_sessions import (
+    EmbedIdentity,
+    EmbedSessionPool,
+    IdentityPool,
+    new_sdk,
+    release_identity,
+)
+from lkr.load_test.raw_client import RawLookerClient
+from lkr.load_test.render_matrix import RenderCase
+from lkr.load_test.streaming import stream_render_results
 from lkr.load_test.utils import (
     MAX_SESSION_LENGTH,
     PERMISSIONS,
     extract_looker_user_id_from_token,
-    format_attributes,
     get_user_id,
 )
 
@@ -33,7 +43,7 @@ class RenderUser(User):
         super().__init__(*args, **kwargs)
         self.sdk: Looker40SDK | None = None
         self.user_id = get_user_id()
-        self.attributes: List[str] = []
+        self.attributes = CompiledAttributes({})
         self.dashboard: str = ""
         self.models: List[str] = []
         self.result_format: str = "pdf"
@@ -42,10 +52,18 @@ class RenderUser(User):
         self.group_ids: List[str] = []
         self.external_group_id: str | None = None
         self.first_name: str = "Embed"
+        self.raw_client: bool = False
+        self.session_pool: EmbedSessionPool | None = None
+        self.identity_pool: IdentityPool | None = None
+        self.identity: EmbedIdentity | None = None
+        self.render_cases: List[RenderCase] = []
+        self.download_results: bool = False
 
     def _init_sdk(self):
-        sdk = looker_sdk.init40()
-        attributes = format_attributes(self.attributes)
+        sdk = http_pool.init40()
+        attributes = (
+            self.identity.attributes if self.identity else self.attributes.generate()
+        )
         embed_session = sdk.acquire_embed_cookieless_session(
             models40.EmbedCookielessSessionAcquire(
                 first_name=self.first_name,
@@ -72,7 +90,10 @@ class RenderUser(User):
         return sdk
 
     def on_start(self):
-        self.sdk = self._init_sdk()
+        self.sdk = new_sdk(self)
+
+    def on_stop(self):
+        release_identity(self)
 
     # TODO: Causing greenlet issues
     # def on_stop(self):
@@ -81,62 +102,135 @@ class RenderUser(User):
     #         if user and user.id:
     #             self.sdk.delete_user(user.id)
 
+    def _render_task(self, render_task_id: str) -> Dict[str, Any]:
+        """Status and timings of a render task, without models40 in raw client mode."""
+        assert self.sdk is not None
+        if self.raw_client:
+            return RawLookerClient(self.sdk).render_task(render_task_id)
+        render_task = self.sdk.render_task(render_task_id)
+        return {
+            "status": render_task.status,
+            "status_detail": render_task.status_detail,
+            "runtime": render_task.runtime,
+            "render_runtime": render_task.render_runtime,
+            "query_runtime": render_task.query_runtime,
+        }
+
+    def _create_render_task(self, case: RenderCase) -> str | None:
+        assert self.sdk is not None
+        if self.raw_client:
+            raw = RawLookerClient(self.sdk)
+            if case.kind == "look":
+                return raw.create_look_render_task(case.id, case.result_format, case.width, case.height)
+            if case.kind == "query":
+                return raw.create_query_render_task(case.id, case.result_format, case.width, case.height)
+            return raw.create_dashboard_render_task(
+                dashboard_id=case.id,
+                result_format=case.result_format,
+                width=case.width,
+                height=case.height,
+                body={"dashboard_style": "tiled", "dashboard_filters": case.dashboard_filters},
+                pdf_paper_size=case.paper_size or "a4",
+                pdf_landscape=case.landscape,
+                long_tables=True,
+            )
+        if case.kind == "look":
+            render_task = self.sdk.create_look_render_task(
+                case.id, case.result_format, case.width, case.height
+            )
+        elif case.kind == "query":
+            render_task = self.sdk.create_query_render_task(
+                case.id, case.result_format, case.width, case.height
+            )
+        else:
+            render_task = self.sdk.create_dashboard_render_task(
+                dashboard_id=case.id,
+                result_format=case.result_format,
+                width=case.width,
+                height=case.height,
+                body=models40.CreateDashboardRenderTask(
+                    dashboard_style="tiled", dashboard_filters=case.dashboard_filters
+                ),
+                pdf_paper_size=case.paper_size or "a4",
+                pdf_landscape=case.landscape,
+                long_tables=True,
+            )
+        return render_task.id if render_task else None
+
+    def _download(self, case: RenderCase, render_task_id: str):
+        """Stream the rendered file and report its size and download time."""
+        assert self.sdk is not None
+        start = time.time()
+        try:
+            downloaded = stream_render_results(self.sdk, render_task_id)
+        except Exception as e:
+            self.environment.events.request.fire(request_type="render_download", name=case.name, response_time=(time.time() - start) * 1000, response_length=0, exception=e)
+            return None
+        self.environment.events.request.fire(request_type="render_download", name=case.name, response_time=downloaded.duration * 1000, response_length=downloaded.bytes, context={"ttfb": downloaded.ttfb})
+        return downloaded
+
     @task
-    def render_dashboard(self):
+    def render(self):
         # Check if this user is configured to run its task only once and if it has already been executed.
         if self.run_once:
             if self._task_executed:
                 return
             self._task_executed = True
 
-        start_time = datetime.datetime.now()
+        case = random.choice(self.render_cases) if self.render_cases else RenderCase(
+            "dashboard", self.dashboard, self.result_format, self.width, self.height, "a4"
+        )
+        start_time = time.time()
 
         # Create render task
         if not self.sdk:
-            self.sdk = self._init_sdk()
-
-        render_task = self.sdk.create_dashboard_render_task(
-            dashboard_id=self.dashboard,
-            result_format=self.result_format,
-            width=self.width,
-            height=self.height,
-            body=models40.CreateDashboardRenderTask(
-                dashboard_style="tiled", dashboard_filters=""
-            ),
-            pdf_paper_size="a4",
-            pdf_landscape=False,
-            long_tables=True,
-        )
-        if not render_task or not render_task.id:
-            raise Exception("Failed to create render task")
+            self.sdk = new_sdk(self)
+
+        try:
+            render_task_id = self._create_render_task(case)
+            if not render_task_id:
+                raise Exception("Failed to create render task")
+        except Exception as e:
+            self.environment.events.request.fire(request_type="create_render_task", name=case.name, response_time=(time.time() - start_time) * 1000, response_length=0, exception=e)
+            return
 
         # Poll for completion
+        task_status: Dict[str, Any] = {}
+        error: Exception | None = None
         for _ in range(self.render_bail_out):
-            task_status = self.sdk.render_task(render_task.id)
-            if task_status.status == "success":
+            try:
+                task_status = self._render_task(render_task_id)
+            except Exception as e:
+                error = e
+                break
+            if task_status.get("status") == "success":
                 break
-            elif task_status.status == "failure":
-                raise Exception(
-                    f"Render task failed detail: {task_status.status_detail}"
+            elif task_status.get("status") == "failure":
+                error = Exception(
+                    f"Render task failed detail: {task_status.get('status_detail')}"
                 )
+                break
             time.sleep(1)
+        else:
+            error = Exception(
+                f"Timeout waiting for render task {render_task_id} after {self.render_bail_out} polls"
+            )
+        rendered_at = time.time()
+        self.environment.events.request.fire(request_type="render", name=case.name, response_time=(rendered_at - start_time) * 1000, response_length=0, exception=error)
 
-        complete_render_task = self.sdk.render_task(render_task.id)
-
-        # TODO: optional flag to retrieve/process result
-        # Get the results
-        # results = self.sdk.render_task_results(render_task.id)
-
-        end_time = datetime.datetime.now()
-        duration = (end_time - start_time).total_seconds()
+        downloaded = None
+        if not error and self.download_results:
+            downloaded = self._download(case, render_task_id)
 
         logger.info(
-            "render_dashboard",
-            dashboard_id=self.dashboard,
-            task_id=render_task.id,
-            duration=duration,
-            task_runtime=getattr(complete_render_task, "runtime", None),
-            task_render_runtime=getattr(complete_render_task, "render_runtime", None),
-            task_query_runtime=getattr(complete_render_task, "query_runtime", None),
-            status=task_status.status,
+            "render",
+            render=case.name,
+            task_id=render_task_id,
+            duration=rendered_at - start_time,
+            task_runtime=task_status.get("runtime"),
+            task_render_runtime=task_status.get("render_runtime"),
+            task_query_runtime=task_status.get("query_runtime"),
+            status=task_status.get("status"),
+            download_bytes=downloaded.bytes if downloaded else None,
+            download_duration=downloaded.duration if downloaded else None,
         )
@@ -0,0 +1,45 @@
+import json
+from typing import Any, Dict, List, Sequence, Tuple
+
+__all__ = ["merge_results", "result_rows"]
+
+Row = Dict[str, Any]
+
+
+def result_rows(data: Any) -> List[Row]:
+    """Rows of a json, json_detail or json_bi query result as field name to value."""
+    if isinstance(data, (str, bytes)):
+        data = json.loads(data)
+    if isinstance(data, dict):
+        data = data.get("rows") or data.get("data") or []
+    return [
+        {
+            name: value.get("value") if isinstance(value, dict) else value
+            for name, value in row.items()
+        }
+        for row in data
+        if isinstance(row, dict)
+    ]
+
+
+def merge_results(sources: Sequence[Tuple[List[Row], List[Tuple[str, str]]]]) -> List[Row]:
+    """
+    Merge source query results like a merged results tile: every row of the first
+    source, with the fields of the first matching row of each other source joined
+    on its (first source field, source field) pairs.
+    """
+    if not sources:
+        return []
+    merged = [dict(row) for row in sources[0][0]]
+    for rows, merge_fields in sources[1:]:
+        if not merge_fields:
+            continue
+        index: Dict[tuple, Row] = {}
+        for row in rows:
+            index.setdefault(tuple(row.get(f) for _, f in merge_fields), row)
+        for row in merged:
+            match = index.get(tuple(row.get(f) for f, _ in merge_fields))
+            if match:
+                for name, value in match.items():
+                    row.setdefault(name, value)
+    return merged
@@ -0,0 +1,115 @@
+import json
+import os
+import pathlib
+import tempfile
+from typing import Dict, List, Tuple
+
+import typer
+from gevent.pool import Pool
+from looker_sdk.sdk.api40.methods import Looker40SDK
+from structlog import get_logger
+
+__all__ = [
+    "SlugCache",
+    "default_slug_cache_path",
+    "open_slug_cache",
+    "resolve_slugs",
+]
+
+logger = get_logger(__name__)
+
+
+def default_slug_cache_path() -> pathlib.Path:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or pathlib.Path.home() / ".cache"
+    return pathlib.Path(cache_home) / "lkr" / "query_slugs.json"
+
+
+class SlugCache:
+    """
+    Query slug to (canonical slug, query ID) mappings per Looker base URL, kept in a
+    JSON file between runs. A slug always names the same query, so entries never
+    expire. A missing or unreadable file starts an empty cache.
+    """
+
+    def __init__(self, path: pathlib.Path, base_url: str):
+        self.path = path
+        self.base_url = base_url.rstrip("/")
+        self._data: Dict[str, Dict[str, List[str]]] = {}
+        try:
+            self._data = json.loads(path.read_text())
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning("slug_cache_unreadable", path=str(path), error=str(e))
+
+    def get(self, slug: str) -> Tuple[str, str] | None:
+        entry = self._data.get(self.base_url, {}).get(slug)
+        return (entry[0], entry[1]) if entry else None
+
+    def set(self, slug: str, canonical_slug: str, query_id: str):
+        self._data.setdefault(self.base_url, {})[slug] = [canonical_slug, query_id]
+
+    def save(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file first so concurrent runs never read half a file
+            fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(self._data, f)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning("slug_cache_not_saved", path=str(self.path), error=str(e))
+
+
+def open_slug_cache(
+    sdk: Looker40SDK, enabled: bool = True, path: pathlib.Path | None = None
+) -> SlugCache | None:
+    """The slug cache for the SDK's Looker instance, None with --no-slug-cache."""
+    if not enabled:
+        return None
+    return SlugCache(path or default_slug_cache_path(), sdk.auth.settings.base_url)
+
+
+def _resolve(sdk: Looker40SDK, slug: str) -> Tuple[str, str]:
+    try:
+        q_obj = sdk.query_for_slug(slug, fields="id,slug")
+    except Exception as e:
+        raise typer.BadParameter(f"Failed to resolve query slug '{slug}': {e}")
+    if not q_obj or not q_obj.id:
+        raise typer.BadParameter(f"Query slug '{slug}' could not be resolved to a valid Query ID")
+    return q_obj.slug or str(q_obj.id), str(q_obj.id)
+
+
+def resolve_slugs(
+    sdk: Looker40SDK,
+    slugs: List[str],
+    concurrency: int = 10,
+    cache: SlugCache | None = None,
+) -> Dict[str, Tuple[str, str]]:
+    """
+    (canonical slug, query ID) of every slug, in the order given. Slugs that are
+    not in the cache are looked up `concurrency` at a time and added to it.
+    """
+    resolved: Dict[str, Tuple[str, str]] = {}
+    missing = []
+    for slug in dict.fromkeys(slugs):
+        cached = cache.get(slug) if cache else None
+        if cached:
+            resolved[slug] = cached
+        else:
+            missing.append(slug)
+    if missing:
+        pool = Pool(max(1, concurrency))
+        try:
+            for slug, result in zip(missing, pool.imap(lambda s: _resolve(sdk, s), missing)):
+                resolved[slug] = result
+                if cache:
+                    cache.set(slug, *result)
+        finally:
+            pool.kill()
+            # Keep what did resolve even if a slug failed
+            if cache:
+                cache.save()
+    logger.info("query_slugs_resolved", slugs=len(resolved), cached=len(resolved) - len(missing))
+    return {slug: resolved[slug] for slug in dict.fromkeys(slugs)}
+
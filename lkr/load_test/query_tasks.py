@@ -0,0 +1,263 @@
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import gevent
+from gevent.queue import Empty, Queue
+from looker_sdk import models40
+from looker_sdk.sdk.api40.methods import Looker40SDK
+from structlog import get_logger
+
+from lkr.load_test.raw_client import RawLookerClient
+
+logger = get_logger(__name__)
+
+__all__ = [
+    "PollBackoff",
+    "QueryTaskResult",
+    "TaskClient",
+    "TaskPoller",
+    "check_query_tasks",
+    "finished_task",
+    "poll_query_tasks",
+    "query_task_runtime",
+]
+
+# Anything with a query_task_multi_results method
+TaskClient = Looker40SDK | RawLookerClient
+
+# query_task_multi_results statuses after which a task will not change again
+FINISHED_STATUSES = {"complete", "error", "killed", "expired"}
+
+
+@dataclass
+class QueryTaskResult:
+    task_id: str
+    status: str
+    polls: int
+    data: Any = None
+    errors: Any = None
+    # When the result was seen, which can be earlier than when the user wakes up
+    finished_at: float = field(default_factory=time.time)
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "complete" and not self.errors
+
+
+class PollBackoff:
+    """
+    Exponential polling interval. It starts short so quick (and cached) queries are
+    picked up within tens of milliseconds, then backs off so long running queries
+    do not cost Looker a request per second each.
+    """
+
+    def __init__(self, initial: float = 0.05, factor: float = 2.0, maximum: float = 1.0):
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+        self.interval = initial
+
+    def reset(self):
+        self.interval = self.initial
+
+    def next(self) -> float:
+        interval = self.interval
+        self.interval = min(self.interval * self.factor, self.maximum)
+        return interval
+
+
+def finished_task(
+    task_id: str, result: Dict[str, Any] | None, polls: int
+) -> QueryTaskResult | None:
+    """The task's result from a multi results response, or None while it is still running."""
+    if not result or result.get("status") not in FINISHED_STATUSES:
+        return None
+    data = result.get("data")
+    errors = result.get("errors")
+    if errors is None and isinstance(data, dict):
+        errors = data.get("errors")
+    return QueryTaskResult(
+        task_id=task_id,
+        status=result["status"],
+        polls=polls,
+        data=data,
+        errors=errors,
+    )
+
+
+def check_query_tasks(sdk: TaskClient, task_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Status of every task in a single query_task_multi_results request."""
+    if not task_ids:
+        return {}
+    return dict(sdk.query_task_multi_results(models40.DelimSequence(task_ids)))
+
+
+def query_task_runtime(sdk: TaskClient, task_id: str) -> Tuple[float | None, str | None]:
+    """
+    Seconds Looker spent running the task's query, and where its result came from
+    (cache, query, ...), as Looker reports them for the query task.
+    """
+    fields = "runtime,result_source"
+    if isinstance(sdk, RawLookerClient):
+        task = sdk.query_task(task_id, fields)
+        return task.get("runtime"), task.get("result_source")
+    query_task = sdk.query_task(task_id, fields=fields)
+    return query_task.runtime, query_task.result_source
+
+
+def poll_query_tasks(
+    sdk: TaskClient,
+    task_ids: List[str],
+    bail_out: float,
+    backoff: PollBackoff | None = None,
+) -> Iterator[QueryTaskResult]:
+    """
+    Poll a batch of query tasks with one request per round until every task has
+    finished or `bail_out` seconds have passed, yielding each task as soon as its
+    result is seen. Tasks still running at the bail out are yielded with a
+    "timeout" status, and a failed poll fails every task that is still pending.
+    """
+    backoff = backoff or PollBackoff()
+    pending = {task_id: 0 for task_id in task_ids}
+    deadline = time.time() + bail_out
+    while pending:
+        for task_id in pending:
+            pending[task_id] += 1
+        try:
+            results = check_query_tasks(sdk, list(pending))
+        except Exception as e:
+            for task_id, polls in pending.items():
+                yield QueryTaskResult(task_id, "error", polls, errors=str(e))
+            return
+        for task_id in list(pending):
+            result = finished_task(task_id, results.get(task_id), pending[task_id])
+            if result:
+                del pending[task_id]
+                yield result
+        if not pending:
+            return
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            for task_id, polls in pending.items():
+                yield QueryTaskResult(task_id, "timeout", polls)
+            return
+        time.sleep(min(backoff.next(), remaining))
+
+
+@dataclass
+class _PendingTask:
+    owner: TaskClient
+    results: Queue
+    polls: int = 0
+
+
+class TaskPoller:
+    """
+    Process-wide poller shared by every user. Users register the query tasks they
+    created and block until they finish, while a single greenlet checks every
+    outstanding task across all users in a few bulk requests per round.
+
+    Tasks are polled with the SDK from `sdk_factory` (the API credentials running
+    the load test) when there is one. Any task missing from that response, e.g.
+    because it belongs to an embed user the API user cannot see, is polled with
+    the SDK of the user that created it instead.
+    """
+
+    def __init__(
+        self,
+        sdk_factory: Callable[[], TaskClient] | None = None,
+        interval: float = 0.25,
+        batch_size: int = 100,
+    ):
+        self.sdk_factory = sdk_factory
+        self.interval = interval
+        self.batch_size = batch_size
+        self.requests = 0
+        self._sdk: TaskClient | None = None
+        self._tasks: Dict[str, _PendingTask] = {}
+        self._greenlet: gevent.Greenlet | None = None
+
+    def wait(
+        self, sdk: TaskClient, task_ids: List[str], bail_out: float
+    ) -> Iterator[QueryTaskResult]:
+        """Same contract as poll_query_tasks, but polled by the shared greenlet."""
+        results: Queue = Queue()
+        for task_id in task_ids:
+            self._tasks[task_id] = _PendingTask(owner=sdk, results=results)
+        if self._greenlet is None or self._greenlet.dead:
+            self._greenlet = gevent.spawn(self._run)
+
+        pending = set(task_ids)
+        deadline = time.time() + bail_out
+        try:
+            while pending:
+                try:
+                    result = results.get(timeout=max(deadline - time.time(), 0))
+                except Empty:
+                    break
+                pending.discard(result.task_id)
+                yield result
+            for task_id in pending:
+                task = self._tasks.get(task_id)
+                yield QueryTaskResult(task_id, "timeout", task.polls if task else 0)
+        finally:
+            for task_id in pending:
+                self._tasks.pop(task_id, None)
+
+    def _run(self):
+        while self._tasks:
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error("task_poller_error", error=str(e))
+            gevent.sleep(self.interval)
+
+    def _batches(self, task_ids: List[str]) -> Iterator[List[str]]:
+        for i in range(0, len(task_ids), self.batch_size):
+            yield task_ids[i : i + self.batch_size]
+
+    def _check(self, sdk: TaskClient, task_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        results: Dict[str, Dict[str, Any]] = {}
+        for batch in self._batches(task_ids):
+            self.requests += 1
+            results.update(check_query_tasks(sdk, batch))
+        return results
+
+    def poll(self):
+        """Check every outstanding task once and hand finished ones to their users."""
+        task_ids = list(self._tasks)
+        if not task_ids:
+            return
+        for task_id in task_ids:
+            self._tasks[task_id].polls += 1
+
+        results: Dict[str, Dict[str, Any]] = {}
+        if self.sdk_factory:
+            try:
+                if self._sdk is None:
+                    self._sdk = self.sdk_factory()
+                results = self._check(self._sdk, task_ids)
+            except Exception as e:
+                logger.warning("task_poller_shared_sdk_error", error=str(e))
+
+        by_owner: Dict[int, Tuple[TaskClient, List[str]]] = {}
+        for task_id in task_ids:
+            task = self._tasks.get(task_id)
+            if task and task_id not in results:
+                by_owner.setdefault(id(task.owner), (task.owner, []))[1].append(task_id)
+        for owner, owned in by_owner.values():
+            try:
+                results.update(self._check(owner, owned))
+            except Exception as e:
+                for task_id in owned:
+                    results[task_id] = {"status": "error", "errors": str(e)}
+
+        for task_id in task_ids:
+            task = self._tasks.get(task_id)
+            if task is None:
+                continue
+            result = finished_task(task_id, results.get(task_id), task.polls)
+            if result:
+                del self._tasks[task_id]
+                task.results.put(result)
@@ -0,0 +1,143 @@
+import json
+from typing import Any, Dict, Iterable, MutableMapping
+
+import requests
+from looker_sdk import error
+from looker_sdk.sdk.api40.methods import Looker40SDK
+
+__all__ = ["RawLookerClient"]
+
+
+class RawLookerClient:
+    """
+    Thin client for the endpoints the load test users call on every iteration. It
+    sends requests on the SDK's own session with the SDK's auth token, but returns
+    raw bytes or plain dicts from json.loads instead of deserializing every response
+    into models40 objects, which costs the load generator CPU for fields that are
+    never read.
+    """
+
+    def __init__(self, sdk: Looker40SDK):
+        self.sdk = sdk
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        params: MutableMapping[str, Any] | None = None,
+        body: Dict[str, Any] | None = None,
+        stream: bool = False,
+    ) -> requests.Response:
+        headers = self.sdk.auth.authenticate({})
+        data = None
+        if body is not None:
+            headers["Content-Type"] = "application/json"
+            data = json.dumps(body)
+        response = self.sdk.transport.session.request(  # type: ignore[attr-defined]
+            method,
+            self.sdk._path(path),
+            params=params,
+            data=data,
+            headers=headers,
+            stream=stream,
+            timeout=self.sdk.transport.settings.timeout,  # type: ignore[attr-defined]
+        )
+        if not response.ok:
+            message = response.text
+            response.close()
+            raise error.SDKError(message)
+        return response
+
+    def _bytes(self, method: str, path: str, **kwargs) -> bytes:
+        return self.request(method, path, **kwargs).content
+
+    def _json(self, method: str, path: str, **kwargs) -> Any:
+        return json.loads(self._bytes(method, path, **kwargs))
+
+    def _param(self, value: str) -> str:
+        return self.sdk.encode_path_param(value)
+
+    def run_query(self, query_id: str, result_format: str, cache: bool = True) -> bytes:
+        return self._bytes(
+            "GET",
+            f"/queries/{self._param(query_id)}/run/{result_format}",
+            params={"cache": str(cache).lower()},
+        )
+
+    def create_query_task(
+        self, query_id: str, result_format: str, cache: bool = True
+    ) -> str:
+        """Start an async query task, returns its id."""
+        task = self._json(
+            "POST",
+            "/query_tasks",
+            params={"cache": str(cache).lower()},
+            body={"query_id": query_id, "result_format": result_format},
+        )
+        return task["id"]
+
+    def query_task(self, task_id: str, fields: str | None = None) -> Dict[str, Any]:
+        return self._json(
+            "GET",
+            f"/query_tasks/{self._param(task_id)}",
+            params={"fields": fields} if fields else None,
+        )
+
+    def query_task_results(self, task_id: str) -> bytes:
+        return self._bytes("GET", f"/query_tasks/{self._param(task_id)}/results")
+
+    def query_task_multi_results(self, query_task_ids: Iterable[str]) -> Dict[str, Any]:
+        return self._json(
+            "GET",
+            "/query_tasks/multi_results",
+            params={"query_task_ids": ",".join(query_task_ids)},
+        )
+
+    def create_dashboard_render_task(
+        self,
+        dashboard_id: str,
+        result_format: str,
+        width: int,
+        height: int,
+        body: Dict[str, Any],
+        **params: Any,
+    ) -> str:
+        """Start a dashboard render task, returns its id."""
+        params = {
+            "width": width,
+            "height": height,
+            **{k: str(v).lower() if isinstance(v, bool) else v for k, v in params.items()},
+        }
+        task = self._json(
+            "POST",
+            f"/render_tasks/dashboards/{self._param(dashboard_id)}/{result_format}",
+            params=params,
+            body=body,
+        )
+        return task["id"]
+
+    def create_look_render_task(
+        self, look_id: str, result_format: str, width: int, height: int
+    ) -> str:
+        task = self._json(
+            "POST",
+            f"/render_tasks/looks/{self._param(look_id)}/{result_format}",
+            params={"width": width, "height": height},
+        )
+        return task["id"]
+
+    def create_query_render_task(
+        self, query_id: str, result_format: str, width: int, height: int
+    ) -> str:
+        task = self._json(
+            "POST",
+            f"/render_tasks/queries/{self._param(query_id)}/{result_format}",
+            params={"width": width, "height": height},
+        )
+        return task["id"]
+
+    def render_task(self, render_task_id: str) -> Dict[str, Any]:
+        return self._json("GET", f"/render_tasks/{self._param(render_task_id)}")
+
+    def render_task_results(self, render_task_id: str) -> bytes:
+        return self._bytes("GET", f"/render_tasks/{self._param(render_task_id)}/results")
@@ -0,0 +1,111 @@
+import re
+from dataclasses import dataclass
+from itertools import product
+from typing import List, Tuple
+
+import typer
+
+__all__ = [
+    "PAPER_SIZES",
+    "RenderCase",
+    "parse_paper",
+    "parse_size",
+    "render_matrix",
+]
+
+DASHBOARD_FORMATS = ("pdf", "png", "jpg")
+# Looks and queries render as a single visualization image
+IMAGE_FORMATS = ("png", "jpg")
+PAPER_SIZES = ("letter", "legal", "tabloid", "a0", "a1", "a2", "a3", "a4", "a5")
+
+
+@dataclass(frozen=True)
+class RenderCase:
+    """One render task setup: what to render, and how."""
+
+    kind: str  # dashboard, look or query
+    id: str
+    result_format: str
+    width: int
+    height: int
+    # Only for dashboard PDFs
+    paper_size: str | None = None
+    landscape: bool = False
+    # Only for dashboards, as a URL query string like State=California&Date=7 days
+    dashboard_filters: str = ""
+
+    @property
+    def name(self) -> str:
+        """Locust request name, so each combination gets its own stats."""
+        name = f"{self.kind} {self.id} {self.result_format} {self.width}x{self.height}"
+        if self.paper_size:
+            name += f" {self.paper_size} {'landscape' if self.landscape else 'portrait'}"
+        if self.dashboard_filters:
+            name += f" [{self.dashboard_filters}]"
+        return name
+
+
+def parse_size(spec: str) -> Tuple[int, int]:
+    match = re.match(r"^\s*(\d+)\s*x\s*(\d+)\s*$", spec)
+    if not match or not int(match.group(1)) or not int(match.group(2)):
+        raise typer.BadParameter(f"Invalid size: {spec}, expected widthxheight like 1920x1080")
+    return int(match.group(1)), int(match.group(2))
+
+
+def parse_paper(spec: str) -> Tuple[str, bool]:
+    paper_size, _, orientation = spec.strip().lower().partition(":")
+    orientation = orientation or "portrait"
+    if paper_size not in PAPER_SIZES or orientation not in ("portrait", "landscape"):
+        raise typer.BadParameter(
+            f"Invalid paper: {spec}, expected size:orientation like a4:portrait or letter:landscape, with a size of {', '.join(PAPER_SIZES)}"
+        )
+    return paper_size, orientation == "landscape"
+
+
+def render_matrix(
+    dashboards: List[str],
+    looks: List[str],
+    queries: List[str],
+    formats: List[str],
+    sizes: List[str],
+    papers: List[str],
+    dashboard_filters: List[str],
+) -> List[RenderCase]:
+    """
+    Every combination of source, format, size, paper and filter set that Looker can
+    render. Paper settings only apply to dashboard PDFs and filter sets only to
+    dashboards, so other cases are not repeated for them.
+    """
+    formats = [f.strip().lower() for f in formats]
+    for result_format in formats:
+        if result_format not in DASHBOARD_FORMATS:
+            raise typer.BadParameter(
+                f"Invalid result format: {result_format}, expected one of {', '.join(DASHBOARD_FORMATS)}"
+            )
+    parsed_sizes = [parse_size(s) for s in sizes]
+    parsed_papers = [parse_paper(p) for p in papers] or [("a4", False)]
+    filter_sets = list(dict.fromkeys(dashboard_filters)) or [""]
+
+    cases: List[RenderCase] = []
+    for dashboard_id, result_format, (width, height), filters in product(
+        dashboards, formats, parsed_sizes, filter_sets
+    ):
+        for paper_size, landscape in parsed_papers if result_format == "pdf" else [(None, False)]:
+            cases.append(
+                RenderCase(
+                    "dashboard", dashboard_id, result_format, width, height, paper_size, landscape, filters
+                )
+            )
+    for (kind, source_ids), result_format, (width, height) in product(
+        (("look", looks), ("query", queries)), formats, parsed_sizes
+    ):
+        if result_format not in IMAGE_FORMATS:
+            continue
+        cases.extend(
+            RenderCase(kind, source_id, result_format, width, height) for source_id in source_ids
+        )
+    if not cases:
+        raise typer.BadParameter(
+            "Nothing to render, looks and queries need a png or jpg --result-format"
+        )
+    return list(dict.fromkeys(cases))
@@ -0,0 +1,29 @@
+from locust.stats import RequestStats, StatsEntry
+
+__all__ = ["DERIVED_REQUEST_TYPES", "measured_total"]
+
+# Rows that are not a request the load test is measuring: connection handshakes,
+# embed session setup, filter variant queries, client-side merges, dashboard
+# completion and the --query-timings breakdown of tasks already counted. They keep
+# their own rows, but counting them in the total would count some requests twice
+# and pull the percentiles towards whatever these rows happen to take.
+DERIVED_REQUEST_TYPES = frozenset(
+    {
+        "connect",
+        "embed_session",
+        "create_query",
+        "merge",
+        "merge_source",
+        "dashboard_complete",
+        "query_timing",
+    }
+)
+
+
+def measured_total(stats: RequestStats) -> StatsEntry:
+    """Aggregated stats of every row except the derived ones."""
+    total = StatsEntry(stats, "Aggregated", "", use_response_times_cache=False)
+    for (_, request_type), entry in list(stats.entries.items()):
+        if request_type not in DERIVED_REQUEST_TYPES:
+            total.extend(entry)
+    return total
@@ -0,0 +1,172 @@
+import os
+import signal
+from typing import Callable, List, Type
+
+import gevent
+import typer
+from locust import LoadTestShape, User, events
+from locust.env import Environment
+from locust.runners import MasterRunner
+from locust.stats import get_percentile_stats_summary, get_stats_summary
+from structlog import get_logger
+
+from lkr.load_test.request_stats import measured_total
+from lkr.load_test.shapes import CapacityShape, StagesShape
+from lkr.load_test.utils import get_free_port
+
+logger = get_logger(__name__)
+
+__all__ = ["resolve_workers", "run_load_test"]
+
+WORKER_CONNECT_TIMEOUT = 60
+
+
+def resolve_workers(workers: int | None, users: int) -> int:
+    """
+    Number of worker processes to run. Defaults to the number of CPU cores and
+    never exceeds the number of users, since an idle worker only adds overhead.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    return max(1, min(workers, users))
+
+
+def _run_worker(
+    user_classes: List[Type[User]],
+    master_port: int,
+    stop_timeout: int | None,
+    warm_up: Callable[[Environment], None] | None,
+):
+    exit_code = 0
+    try:
+        env = Environment(
+            user_classes=user_classes, events=events, stop_timeout=stop_timeout
+        )
+        if warm_up:
+            warm_up(env)
+        runner = env.create_worker_runner("127.0.0.1", master_port)
+        runner.greenlet.join()
+    except BaseException as e:
+        logger.error("Load test worker failed", pid=os.getpid(), error=str(e))
+        exit_code = 1
+    finally:
+        os._exit(exit_code)
+
+
+def _print_stats(env: Environment):
+    # The aggregated rows leave out derived rows, like the load shapes do
+    total = measured_total(env.stats)
+    for line in get_stats_summary(env.stats, current=False)[:-1]:
+        typer.echo(line)
+    typer.echo(total.to_string(current=False))
+    typer.echo("")
+    percentiles = get_percentile_stats_summary(env.stats)
+    if env.stats.total.response_times:
+        percentiles = percentiles[:-1]
+    if total.response_times:
+        percentiles.append(total.percentile())
+    for line in percentiles:
+        typer.echo(line)
+    if isinstance(env.shape_class, (StagesShape, CapacityShape)):
+        typer.echo("")
+        for line in env.shape_class.get_segments_summary():
+            typer.echo(line)
+
+
+def run_load_test(
+    user_classes: List[Type[User]],
+    *,
+    users: int,
+    spawn_rate: float,
+    run_time: int,
+    workers: int = 1,
+    stop_timeout: int | None = None,
+    on_start: Callable[[], None] | None = None,
+    shape: LoadTestShape | None = None,
+    warm_up: Callable[[Environment], None] | None = None,
+    warm_up_timeout: float = 0,
+) -> Environment:
+    """
+    Run the user classes for run_time minutes and print the stats summary.
+
+    With a single worker everything runs in this process on a local runner. With
+    more than one, N worker processes are forked and this process becomes a Locust
+    master which splits users and spawn rate across them and merges their stats.
+    on_start is called once, in this process only, right before users are spawned.
+
+    When a shape is given it drives the user count instead of users/spawn_rate and
+    the test ends when the shape does, run_time is not used.
+
+    warm_up is called in every process that runs users, before the test starts.
+    Workers only connect to the master once they are warm, so the master waits up
+    to warm_up_timeout seconds longer for them.
+    """
+    worker_pids: List[int] = []
+    if workers > 1:
+        master_port = get_free_port()
+        # Fork before the master creates any greenlets or sockets so workers start clean
+        for _ in range(workers):
+            pid = os.fork()
+            if pid == 0:
+                _run_worker(user_classes, master_port, stop_timeout, warm_up)
+            worker_pids.append(pid)
+
+    env = Environment(
+        user_classes=user_classes,
+        events=events,
+        stop_timeout=stop_timeout,
+        shape_class=shape,
+    )
+    try:
+        if worker_pids:
+            runner = env.create_master_runner(
+                master_bind_host="127.0.0.1", master_bind_port=master_port
+            )
+            connect_timeout = WORKER_CONNECT_TIMEOUT + warm_up_timeout
+            try:
+                with gevent.Timeout(connect_timeout):
+                    while len(runner.clients.ready) < len(worker_pids):
+                        gevent.sleep(0.1)
+            except gevent.Timeout:
+                typer.echo(
+                    f"Only {len(runner.clients.ready)} of {len(worker_pids)} workers connected after {connect_timeout:.0f}s",
+                    err=True,
+                )
+                runner.quit()
+                for pid in worker_pids:
+                    os.kill(pid, signal.SIGTERM)
+                raise typer.Exit(1)
+            logger.info("Load test workers connected", workers=len(worker_pids))
+        else:
+            runner = env.create_local_runner()
+            if warm_up:
+                warm_up(env)
+
+        if on_start:
+            on_start()
+
+        def quit_runner():
+            if isinstance(runner, MasterRunner):
+                runner.quit()
+                return
+            runner.stop()
+            if runner.greenlet:
+                runner.greenlet.kill(block=False)
+
+        if shape:
+            runner.start_shape()
+            if runner.shape_greenlet:
+                runner.shape_greenlet.link(lambda _: quit_runner())
+        else:
+            runner.start(user_count=users, spawn_rate=spawn_rate)
+            gevent.spawn_later(run_time * 60, quit_runner)
+        runner.greenlet.join()
+    finally:
+        for pid in worker_pids:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+
+    _print_stats(env)
+    return env
@@ -0,0 +1,519 @@
+import csv
+import math
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Tuple
+
+import typer
+from locust import LoadTestShape
+from locust.runners import WORKER_REPORT_INTERVAL, MasterRunner
+from locust.stats import (
+    StatsEntry,
+    calculate_response_time_percentile,
+    diff_response_time_dicts,
+)
+from structlog import get_logger
+
+from lkr.load_test.request_stats import measured_total
+
+logger = get_logger(__name__)
+
+__all__ = [
+    "CapacitySearch",
+    "CapacityShape",
+    "Stage",
+    "StageStats",
+    "StagesShape",
+    "StatsSnapshot",
+    "get_load_shape",
+    "parse_duration",
+]
+
+
+@dataclass
+class Stage:
+    duration: float
+    users: int
+    spawn_rate: float
+
+
+@dataclass
+class StageStats:
+    stage: int
+    users: int
+    duration: float
+    requests: int
+    failures: int
+    rps: float
+    fail_ratio: float
+    p50: int
+    p95: int
+    p99: int
+
+
+class StatsSnapshot:
+    """
+    Point-in-time copy of a stats entry. Diffing the entry against it later gives
+    the requests, failures and response time percentiles for just that window,
+    without resetting the stats of the whole run.
+    """
+
+    def __init__(self, entry: StatsEntry, start: float | None = None):
+        self.time = start or time.time()
+        self.num_requests = entry.num_requests
+        self.num_failures = entry.num_failures
+        self.response_times = dict(entry.response_times)
+
+    def segment(
+        self, entry: StatsEntry, stage: int, users: int, end: float | None = None
+    ) -> StageStats:
+        duration = max((end or time.time()) - self.time, 0.001)
+        requests = entry.num_requests - self.num_requests
+        failures = entry.num_failures - self.num_failures
+        response_times = diff_response_time_dicts(
+            entry.response_times, self.response_times
+        )
+        total = sum(response_times.values())
+
+        def percentile(percent: float) -> int:
+            if not total:
+                return 0
+            return calculate_response_time_percentile(response_times, total, percent)
+
+        return StageStats(
+            stage=stage,
+            users=users,
+            duration=round(duration, 1),
+            requests=requests,
+            failures=failures,
+            rps=round(requests / duration, 2),
+            fail_ratio=round(failures / requests, 4) if requests else 0.0,
+            p50=percentile(0.5),
+            p95=percentile(0.95),
+            p99=percentile(0.99),
+        )
+
+
+def format_segments(name: str, segments: List[StageStats]) -> List[str]:
+    if not segments:
+        return []
+    header = f"{'Stage':>5} {'Users':>7} {'Secs':>8} {'# reqs':>8} {'# fails':>8} {'req/s':>8} {'50%':>7} {'95%':>7} {'99%':>7}"
+    lines = [f"Load shape stages ({name})", header, "-" * len(header)]
+    for s in segments:
+        lines.append(
+            f"{s.stage:>5} {s.users:>7} {s.duration:>8} {s.requests:>8} {s.failures:>8} {s.rps:>8} {s.p50:>7} {s.p95:>7} {s.p99:>7}"
+        )
+    return lines
+
+
+class StagesShape(LoadTestShape):
+    """
+    Runs a list of stages back to back. Every stage is its own stats segment, so the
+    throughput and latency at each load level are reported separately when it ends.
+
+    With worker processes the master only sees a worker's requests at its next
+    stats report, so a segment is closed one report interval after its stage ends,
+    and the last one once the test has stopped and every worker has reported.
+    Segments only count measured requests, see request_stats.
+    """
+
+    def __init__(self, stages: List[Stage], name: str = "stages"):
+        super().__init__()
+        if not stages:
+            raise typer.BadParameter("A load shape needs at least one stage")
+        self.name = name
+        self.stages = stages
+        self.segments: List[StageStats] = []
+        self._current: int | None = None
+        # Stage changes not closed yet, as (time, stage started), and the open segment
+        self._pending: List[Tuple[float, int | None]] = []
+        self._snapshot: Tuple[int, StatsSnapshot] | None = None
+
+    @property
+    def total_duration(self) -> float:
+        return sum(stage.duration for stage in self.stages)
+
+    @property
+    def run_time_minutes(self) -> int:
+        return max(1, math.ceil(self.total_duration / 60))
+
+    @property
+    def max_users(self) -> int:
+        return max(stage.users for stage in self.stages)
+
+    @property
+    def report_lag(self) -> float:
+        """How long until the runner has seen every request made up to now."""
+        return WORKER_REPORT_INTERVAL if isinstance(self.runner, MasterRunner) else 0.0
+
+    def _stage_at(self, run_time: float) -> int | None:
+        end = 0.0
+        for i, stage in enumerate(self.stages):
+            end += stage.duration
+            if run_time < end:
+                return i
+        return None
+
+    def _close_segments(self, until: float):
+        """Close the segments of the stage changes made up to `until`."""
+        if not self.runner:
+            return
+        while self._pending and self._pending[0][0] <= until:
+            at, index = self._pending.pop(0)
+            total = measured_total(self.runner.stats)
+            if self._snapshot:
+                current, snapshot = self._snapshot
+                segment = snapshot.segment(
+                    total, current, self.stages[current].users, end=at
+                )
+                self.segments.append(segment)
+                logger.info("load_shape_stage_complete", shape=self.name, **segment.__dict__)
+            self._snapshot = (index, StatsSnapshot(total, start=at)) if index is not None else None
+
+    def tick(self):
+        index = self._stage_at(self.get_run_time())
+        now = time.time()
+        if index != self._current:
+            self._pending.append((now, index))
+            # Nothing ran before the first stage, so it need not wait for reports
+            if self._current is None and not self.segments and not self._snapshot:
+                self._close_segments(now)
+            self._current = index
+        self._close_segments(now - self.report_lag)
+        if index is None:
+            return None
+        stage = self.stages[index]
+        return stage.users, stage.spawn_rate
+
+    def get_segments_summary(self) -> List[str]:
+        # The test has stopped and every worker has sent its final report
+        self._close_segments(float("inf"))
+        return format_segments(self.name, self.segments)
+
+
+def parse_duration(value: str) -> float:
+    """Seconds from a duration like 90, 90s, 2m or 1h."""
+    match = re.match(r"^(\d+(?:\.\d+)?)([smh]?)$", value.strip())
+    if not match:
+        raise typer.BadParameter(f"Invalid duration: {value}")
+    multiplier = {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+    return float(match.group(1)) * multiplier
+
+
+def _positive_duration(name: str, value: str) -> float:
+    seconds = parse_duration(value)
+    if seconds <= 0:
+        raise typer.BadParameter(f"Load shape {name} must be longer than 0, got {value}")
+    return seconds
+
+
+def _positive_int(name: str, value: str) -> int:
+    number = int(value)
+    if number <= 0:
+        raise typer.BadParameter(f"Load shape {name} must be above 0, got {value}")
+    return number
+
+
+def step_stages(
+    *, spawn_rate: float, users: str, step: str, every: str, start: str | None = None
+) -> List[Stage]:
+    """Add `step` users every `every` from `start` until `users` is reached."""
+    max_users, step_users = int(users), _positive_int("step", step)
+    current = int(start) if start else step_users
+    duration = _positive_duration("every", every)
+    stages = []
+    while current < max_users:
+        stages.append(Stage(duration, current, spawn_rate))
+        current += step_users
+    stages.append(Stage(duration, max_users, spawn_rate))
+    return stages
+
+
+def ramp_stages(
+    *, spawn_rate: float, users: str, duration: str, steps: str = "10", hold: str = "0"
+) -> List[Stage]:
+    """Linear ramp from 0 to `users` over `duration`, reported in `steps` segments."""
+    max_users = int(users)
+    ramp_time = _positive_duration("duration", duration)
+    segments = _positive_int("steps", steps)
+    rate = max_users / ramp_time
+    stages = [
+        Stage(ramp_time / segments, math.ceil(max_users * (i + 1) / segments), rate)
+        for i in range(segments)
+    ]
+    if parse_duration(hold):
+        stages.append(Stage(parse_duration(hold), max_users, spawn_rate))
+    return stages
+
+
+def spike_stages(
+    *,
+    spawn_rate: float,
+    users: str,
+    peak: str,
+    duration: str,
+    before: str = "2m",
+    after: str = "2m",
+) -> List[Stage]:
+    """Hold `users`, spike to `peak` for `duration`, then drop back to `users`."""
+    base_users, peak_users = _positive_int("users", users), _positive_int("peak", peak)
+    return [
+        Stage(parse_duration(before), base_users, spawn_rate),
+        Stage(_positive_duration("duration", duration), peak_users, spawn_rate),
+        Stage(parse_duration(after), base_users, spawn_rate),
+    ]
+
+
+def soak_stages(
+    *, spawn_rate: float, users: str, duration: str, segment: str = "5m"
+) -> List[Stage]:
+    """Hold `users` for `duration`, reported every `segment` to show drift over time."""
+    total = _positive_duration("duration", duration)
+    length = _positive_duration("segment", segment)
+    stages = []
+    while total > 0:
+        stages.append(Stage(min(length, total), int(users), spawn_rate))
+        total -= length
+    return stages
+
+
+def read_stage_table(path: str, spawn_rate: float) -> List[Stage]:
+    """
+    Stages from a CSV or TSV file with a header row of duration, users and an
+    optional spawn_rate column.
+    """
+    stages = []
+    try:
+        with open(path, newline="") as f:
+            dialect = "excel-tab" if path.endswith(".tsv") else "excel"
+            for row in csv.DictReader(f, dialect=dialect):
+                rate = (row.get("spawn_rate") or "").strip()
+                stages.append(
+                    Stage(
+                        parse_duration(row["duration"]),
+                        int(row["users"]),
+                        float(rate) if rate else spawn_rate,
+                    )
+                )
+    except (OSError, KeyError, ValueError) as e:
+        raise typer.BadParameter(f"Invalid stage table {path}: {e}")
+    return stages
+
+
+class CapacitySearch:
+    """
+    Bounded search for the highest user count that meets the SLO. The user count
+    doubles from start until a probe fails or max_users passes, then it bisects
+    between the best passing and the lowest failing count until they are within
+    resolution of each other.
+    """
+
+    def __init__(self, start: int, max_users: int, resolution: int):
+        self.max_users = max_users
+        self.resolution = max(1, resolution)
+        self.passed = 0
+        self.failed: int | None = None
+        self.next_users: int | None = min(max(1, start), max_users)
+
+    def record(self, users: int, passed: bool) -> int | None:
+        if passed:
+            self.passed = max(self.passed, users)
+        else:
+            self.failed = users if self.failed is None else min(self.failed, users)
+
+        if self.failed is None:
+            if users >= self.max_users:
+                self.next_users = None
+            else:
+                self.next_users = min(users * 2, self.max_users)
+        elif self.failed - self.passed <= self.resolution:
+            self.next_users = None
+        else:
+            self.next_users = (self.passed + self.failed) // 2
+        return self.next_users
+
+
+class CapacityShape(LoadTestShape):
+    """
+    Adaptive shape that probes one user count at a time. Each probe ramps up, then
+    measures for hold seconds and checks p95/p99 and the error rate of the measured
+    requests (not the derived rows) against the targets to decide the next user
+    count from a CapacitySearch.
+    """
+
+    def __init__(
+        self,
+        search: CapacitySearch,
+        *,
+        spawn_rate: float,
+        hold: float,
+        p95: int | None = None,
+        p99: int | None = None,
+        error_rate: float = 1.0,
+    ):
+        super().__init__()
+        self.name = "capacity"
+        self.search = search
+        self.spawn_rate = spawn_rate
+        self.hold = hold
+        self.p95 = p95
+        self.p99 = p99
+        self.error_rate = error_rate
+        self.segments: List[StageStats] = []
+        self.best: StageStats | None = None
+        self._target: int | None = None
+        self._probe_start = 0.0
+        self._measure_start: float | None = None
+        self._snapshot: StatsSnapshot | None = None
+
+    @property
+    def max_users(self) -> int:
+        return self.search.max_users
+
+    @property
+    def run_time_minutes(self) -> int:
+        # Upper bound: doubling up to max_users, then bisecting down to the resolution
+        doubling = math.ceil(math.log2(max(self.search.max_users / (self.search.next_users or 1), 1)))
+        bisecting = math.ceil(math.log2(max(self.search.max_users / self.search.resolution, 1)))
+        return max(1, math.ceil((doubling + bisecting + 1) * self._probe_time / 60))
+
+    @property
+    def _probe_time(self) -> float:
+        return self.hold + self.search.max_users / self.spawn_rate
+
+    def meets_slo(self, segment: StageStats) -> bool:
+        if not segment.requests:
+            return False
+        if self.p95 is not None and segment.p95 > self.p95:
+            return False
+        if self.p99 is not None and segment.p99 > self.p99:
+            return False
+        return segment.fail_ratio * 100 <= self.error_rate
+
+    def tick(self):
+        if not self.runner:
+            return None
+        run_time = self.get_run_time()
+        if self._target is None:
+            self._target = self.search.next_users
+            if self._target is None:
+                self._finish()
+                return None
+            self._probe_start = run_time
+            self._measure_start = None
+
+        if self._measure_start is None:
+            ramp_time = self._target / self.spawn_rate
+            if (
+                self.runner.user_count == self._target
+                or run_time - self._probe_start > ramp_time + 60
+            ):
+                self._measure_start = run_time
+                self._snapshot = StatsSnapshot(measured_total(self.runner.stats))
+        elif self._snapshot and run_time - self._measure_start >= self.hold:
+            segment = self._snapshot.segment(
+                measured_total(self.runner.stats), len(self.segments), self._target
+            )
+            passed = self.meets_slo(segment)
+            self.segments.append(segment)
+            if passed and (not self.best or segment.users > self.best.users):
+                self.best = segment
+            logger.info(
+                "capacity_probe_complete", passed=passed, **segment.__dict__
+            )
+            self.search.record(self._target, passed)
+            self._target = None
+            return self.tick()
+        return self._target, self.spawn_rate
+
+    def _finish(self):
+        if self.best:
+            logger.info("capacity_search_complete", **self.best.__dict__)
+        else:
+            logger.info("capacity_search_complete", users=0)
+
+    def get_segments_summary(self) -> List[str]:
+        lines = format_segments(self.name, self.segments)
+        if self.best:
+            lines.append(
+                f"Capacity: {self.best.users} users sustained {self.best.rps} req/s (p95 {self.best.p95}ms, p99 {self.best.p99}ms, {self.best.fail_ratio:.2%} failures)"
+            )
+        elif self.segments:
+            lines.append("Capacity: no probed user count met the SLO")
+        return lines
+
+
+def capacity_shape(
+    *,
+    spawn_rate: float,
+    p95: str | None = None,
+    p99: str | None = None,
+    errors: str = "1",
+    start: str = "10",
+    max: str = "1000",
+    resolution: str | None = None,
+    hold: str = "2m",
+) -> CapacityShape:
+    """Search for the most users that keep p95/p99 (ms) and errors (%) under target."""
+    if p95 is None and p99 is None:
+        raise ValueError("capacity needs a p95= or p99= target in ms")
+    if spawn_rate <= 0:
+        # Every probe ramps up at the spawn rate
+        raise ValueError("capacity needs a spawn rate above 0")
+    max_users = int(max)
+    return CapacityShape(
+        CapacitySearch(
+            int(start),
+            max_users,
+            int(resolution) if resolution else math.ceil(max_users / 100),
+        ),
+        spawn_rate=spawn_rate,
+        hold=parse_duration(hold),
+        p95=int(p95) if p95 is not None else None,
+        p99=int(p99) if p99 is not None else None,
+        error_rate=float(errors),
+    )
+
+
+SHAPES: Dict[str, Callable[..., List[Stage]]] = {
+    "step": step_stages,
+    "ramp": ramp_stages,
+    "spike": spike_stages,
+    "soak": soak_stages,
+}
+
+
+def get_load_shape(
+    spec: str | None, spawn_rate: float
+) -> StagesShape | CapacityShape | None:
+    """
+    Build a load shape from a spec like step:users=500,step=25,every=2m. Every
+    built-in shape also accepts rate= to override the spawn rate. file:PATH reads
+    a stage table instead, and capacity:p95=2000 searches for the highest user
+    count that meets the targets.
+    """
+    if not spec:
+        return None
+    name, _, params = spec.partition(":")
+    if name == "file":
+        return StagesShape(read_stage_table(params, spawn_rate), name=params)
+    if name not in SHAPES and name != "capacity":
+        raise typer.BadParameter(
+            f"Unknown load shape '{name}', expected one of {', '.join([*SHAPES, 'capacity', 'file'])}"
+        )
+    kwargs: Dict[str, str] = {}
+    for param in [p for p in params.split(",") if p.strip()]:
+        key, sep, value = param.partition("=")
+        if not sep:
+            raise typer.BadParameter(f"Invalid load shape parameter: {param}")
+        kwargs[key.strip()] = value.strip()
+    try:
+        if "rate" in kwargs:
+            spawn_rate = float(kwargs.pop("rate"))
+        if name == "capacity":
+            return capacity_shape(spawn_rate=spawn_rate, **kwargs)
+        stages = SHAPES[name](spawn_rate=spawn_rate, **kwargs)
+    except (TypeError, ValueError) as e:
+        raise typer.BadParameter(f"Invalid parameters for load shape '{name}': {e}")
+    return StagesShape(stages, name=name)
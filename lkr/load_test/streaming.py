@@ -0,0 +1,89 @@
+import time
+from dataclasses import dataclass
+from typing import Tuple
+
+from looker_sdk.sdk.api40.methods import Looker40SDK
+
+from lkr.load_test.raw_client import RawLookerClient
+
+__all__ = ["StreamedResult", "stream_query_results", "stream_render_results"]
+
+CHUNK_SIZE = 64 * 1024
+
+# Result formats with one row per line after a single header line
+LINE_FORMATS = {"csv": 1, "txt": 1}
+
+
+@dataclass
+class StreamedResult:
+    ttfb: float
+    duration: float
+    bytes: int
+    rows: int | None
+
+
+def _read(response, start: float, chunk_size: int) -> Tuple[float, int, int, bytes]:
+    """Read a streamed response to the end, returns ttfb, bytes, newlines and the last chunk."""
+    with response:
+        ttfb: float | None = None
+        size = 0
+        lines = 0
+        last = b""
+        for chunk in response.iter_content(chunk_size):
+            if ttfb is None:
+                ttfb = time.time() - start
+            size += len(chunk)
+            lines += chunk.count(b"\n")
+            last = chunk
+    return (time.time() - start if ttfb is None else ttfb), size, lines, last
+
+
+def stream_query_results(
+    sdk: Looker40SDK,
+    query_id: str,
+    result_format: str,
+    cache: bool = True,
+    chunk_size: int = CHUNK_SIZE,
+) -> StreamedResult:
+    """
+    Run a query and read the response body in chunks, counting bytes (and rows for
+    line based formats) as they arrive and throwing the data away. Nothing is
+    decoded or kept in memory, so large results cost the load generator almost
+    nothing. Times are in seconds from when the request was sent.
+    """
+    start = time.time()
+    response = RawLookerClient(sdk).request(
+        "GET",
+        f"/queries/{sdk.encode_path_param(query_id)}/run/{result_format}",
+        params={"cache": str(cache).lower()},
+        stream=True,
+    )
+    ttfb, size, lines, last = _read(response, start, chunk_size)
+    duration = time.time() - start
+
+    rows = None
+    if result_format in LINE_FORMATS:
+        # The last row does not always end with a newline
+        if last and not last.endswith(b"\n"):
+            lines += 1
+        rows = max(lines - LINE_FORMATS[result_format], 0)
+    return StreamedResult(
+        ttfb=ttfb,
+        duration=duration,
+        bytes=size,
+        rows=rows,
+    )
+
+
+def stream_render_results(
+    sdk: Looker40SDK, render_task_id: str, chunk_size: int = CHUNK_SIZE
+) -> StreamedResult:
+    """Download a finished render task's file in chunks, counting bytes like stream_query_results."""
+    start = time.time()
+    response = RawLookerClient(sdk).request(
+        "GET",
+        f"/render_tasks/{sdk.encode_path_param(render_task_id)}/results",
+        stream=True,
+    )
+    ttfb, size, _, _ = _read(response, start, chunk_size)
+    return StreamedResult(ttfb=ttfb, duration=time.time() - start, bytes=size, rows=None)
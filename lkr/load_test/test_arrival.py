@@ -0,0 +1,43 @@
+import lkr.main  # noqa: F401 - ensure monkey patch runs first
+import pytest
+import typer
+
+from lkr.load_test.arrival import ArrivalDistribution, ArrivalSchedule, parse_rate
+
+
+def test_parse_rate():
+    assert parse_rate("5") == 5
+    assert parse_rate("5/s") == 5
+    assert parse_rate("300/m") == 5
+    assert parse_rate("1800/h") == 0.5
+    for value in ["0", "5/d", "fast", "-1/s"]:
+        with pytest.raises(typer.BadParameter):
+            parse_rate(value)
+
+
+def test_fixed_arrivals_are_evenly_spaced(monkeypatch):
+    monkeypatch.setattr("time.time", lambda: 1000.0)
+    schedule = ArrivalSchedule(4, ArrivalDistribution.fixed)
+    assert [schedule.claim() for _ in range(3)] == [1000.0, 1000.25, 1000.5]
+
+
+def test_poisson_arrivals_average_to_rate():
+    schedule = ArrivalSchedule(10, ArrivalDistribution.poisson, seed=1)
+    times = [schedule.claim() for _ in range(5000)]
+    assert (times[-1] - times[0]) / len(times) == pytest.approx(0.1, rel=0.1)
+
+
+def test_late_arrivals_report_lag(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("time.time", lambda: clock[0])
+    schedule = ArrivalSchedule(1, ArrivalDistribution.fixed)
+    assert schedule.wait() == 1000.0
+
+    # The user comes back 3s later, the arrival due at 1001 starts 2s late
+    clock[0] = 1003.0
+    assert schedule.wait() == 1001.0
+    summary = schedule.summary()
+    assert summary["arrivals"] == 2
+    assert summary["max_lag_ms"] == 2000
+    assert summary["mean_lag_ms"] == 1000
+    assert summary["backlog_s"] == 1
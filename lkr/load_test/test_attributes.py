@@ -0,0 +1,81 @@
+import lkr.main  # noqa: F401 - ensure monkey patch runs first
+import random
+from collections import Counter
+
+import pytest
+import typer
+
+from lkr.load_test.attributes import AttributeFile, compile_attributes, parse_attribute
+
+
+def test_parse_attribute_generators():
+    rng = random.Random(1)
+    assert parse_attribute("region:west")[1](rng) == "west"
+    assert 1 <= int(parse_attribute("store:random.randint(1,5)")[1](rng)) <= 5
+    assert 1 <= int(parse_attribute("store: uniform(1, 5)")[1](rng)) <= 5
+    assert parse_attribute("tenant:weighted(acme=1,globex=0)")[1](rng) == "acme"
+
+    name, sequence = parse_attribute("store:sequence(3,4)")
+    assert name == "store"
+    assert [sequence(rng) for _ in range(3)] == ["3", "4", "3"]
+
+
+def test_zipf_is_skewed_towards_low_ranks():
+    _, zipf = parse_attribute("tenant:zipf(100,1.2)")
+    rng = random.Random(7)
+    counts = Counter(int(zipf(rng)) for _ in range(5000))
+    assert set(counts) <= set(range(1, 101))
+    assert counts[1] > counts[2] > counts[10] > counts[100]
+
+
+@pytest.mark.parametrize(
+    "spec",
+    [
+        "store",
+        ":west",
+        "store:uniform(5,1)",
+        "store:uniform(1)",
+        "store:zipf(0)",
+        "store:weighted(acme)",
+        "store:normal(1,2)",
+    ],
+)
+def test_parse_attribute_invalid(spec):
+    with pytest.raises(typer.BadParameter):
+        parse_attribute(spec)
+
+
+def test_seeded_attributes_repeat():
+    specs = ["store:uniform(1,1000000)", "tenant:zipf(1000)"]
+    first = compile_attributes(specs, seed=42)
+    second = compile_attributes(specs, seed=42)
+    assert [first.generate() for _ in range(5)] == [second.generate() for _ in range(5)]
+
+
+def test_attribute_file(tmp_path, monkeypatch):
+    path = tmp_path / "tenants.csv"
+    path.write_bytes(
+        b'store_id,region\r\n1,west\r\n\r\n2,"east, north"\r\n3,south-long-value\n4,\n5,west'
+    )
+    # Indexing in tiny chunks must land on the same rows as one big chunk
+    monkeypatch.setattr("lkr.load_test.attributes.INDEX_CHUNK_SIZE", 7)
+    attribute_file = AttributeFile(str(path))
+    assert [attribute_file.row(i) for i in range(len(attribute_file))] == [
+        {"store_id": "1", "region": "west"},
+        {"store_id": "2", "region": "east, north"},
+        {"store_id": "3", "region": "south-long-value"},
+        {"store_id": "4"},
+        {"store_id": "5", "region": "west"},
+    ]
+
+    attributes = compile_attributes(["region:north"], seed=1, attribute_file=str(path))
+    generated = attributes.generate()
+    assert generated["region"] == "north"
+    assert generated["store_id"] in {"1", "2", "3", "4", "5"}
+
+
+def test_attribute_file_without_rows(tmp_path):
+    path = tmp_path / "tenants.tsv"
+    path.write_text("store_id\tregion\n")
+    with pytest.raises(typer.BadParameter):
+        AttributeFile(str(path))
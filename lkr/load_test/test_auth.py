@@ -0,0 +1,43 @@
+import lkr.main  # noqa: F401 - ensure monkey patch runs first
+import json
+
+from looker_sdk.rtl import serialize, transport
+
+from benchmarks.canned_looker import CannedSettings
+from lkr.load_test.auth import SharedAuthSession, TokenCache
+
+
+class LoginTransport:
+    """Answers the login endpoints with tokens that expire in an hour."""
+
+    def __init__(self):
+        self.logins = []
+
+    def request(self, method, path, authenticator=None, **kwargs):
+        if authenticator:
+            authenticator({})
+        self.logins.append(path.rsplit("/api/4.0", 1)[1])
+        token = {"access_token": f"token-{len(self.logins)}", "token_type": "Bearer", "expires_in": 3600}
+        return transport.Response(True, json.dumps(token).encode(), transport.ResponseMode.STRING)
+
+
+def test_shared_login_and_sudo_cache(monkeypatch):
+    monkeypatch.setattr(SharedAuthSession, "tokens", TokenCache())
+    login_transport = LoginTransport()
+
+    def session():
+        return SharedAuthSession(CannedSettings(), login_transport, serialize.deserialize40, "4.0")
+
+    first, second = session(), session()
+    first.login_user(1)
+    second.login_user(2)
+    first.authenticate({})
+    # One API credentials login for the process, then one sudo login per user
+    assert login_transport.logins == ["/login", "/login/1", "/login/2"]
+
+    # A new session for a user that is already logged in reuses its sudo token
+    again = session()
+    again.login_user(1)
+    assert again.authenticate({}) == first.authenticate({})
+    assert len(login_transport.logins) == 3
+    assert SharedAuthSession.tokens.sudo_hits == 1
@@ -0,0 +1,180 @@
+import lkr.main  # noqa: F401 - ensure monkey patch runs first
+import gevent
+from looker_sdk import models40
+
+from lkr.load_test.dashboard_metadata import DASHBOARD_FIELDS, DashboardMetadataCache
+from lkr.load_test.merged_results import merge_results, result_rows
+
+
+class FakeSDK:
+    def __init__(self):
+        self.calls = []
+
+    def dashboard(self, dashboard_id, fields=None):
+        self.calls.append((dashboard_id, fields))
+        gevent.sleep(0.05)
+        if dashboard_id == "broken":
+            raise Exception("not found")
+        return models40.Dashboard(
+            dashboard_elements=[
+                models40.DashboardElement(id="10", title="Sales", query_id=f"{dashboard_id}-1"),
+                models40.DashboardElement(
+                    id="11",
+                    result_maker=models40.ResultMakerWithIdVisConfigAndDynamicFields(
+                        query=models40.Query(id="shared", model="m", view="v")
+                    )
+                ),
+                models40.DashboardElement(id="12", title="Targets", merge_result_id="m1"),
+                # Merged results as the API returns them, with a result maker
+                models40.DashboardElement(
+                    id="13",
+                    title="Targets again",
+                    merge_result_id="m2",
+                    result_maker=models40.ResultMakerWithIdVisConfigAndDynamicFields(
+                        merge_result_id="m2"
+                    ),
+                ),
+                models40.DashboardElement(title="text tile"),
+            ]
+        )
+
+    def merge_query(self, merge_query_id, fields=None):
+        return models40.MergeQuery(
+            source_queries=[
+                models40.MergeQuerySourceQuery(query_id="orders"),
+                models40.MergeQuerySourceQuery(
+                    query_id="targets",
+                    merge_fields=[
+                        models40.MergeFields(
+                            field_name="orders.region", source_field_name="targets.region"
+                        )
+                    ],
+                ),
+            ]
+        )
+
+
+def test_dashboards_fetched_once_in_parallel_and_shared():
+    sdk = FakeSDK()
+    cache = DashboardMetadataCache(["1", "2", "broken"], ttl=60)
+    results = [gevent.spawn(cache.query_ids, sdk) for _ in range(5)]
+    gevent.joinall(results)
+
+    assert all(r.value == ["1-1", "shared", "orders", "targets", "2-1"] for r in results)
+    assert sorted(sdk.calls) == [
+        ("1", DASHBOARD_FIELDS),
+        ("2", DASHBOARD_FIELDS),
+        ("broken", DASHBOARD_FIELDS),
+    ]
+    assert cache.refreshes == 1
+
+
+def test_expired_ids_are_fetched_again():
+    sdk = FakeSDK()
+    cache = DashboardMetadataCache(["1"], ttl=0)
+    cache.query_ids(sdk)
+    cache.query_ids(sdk)
+    assert cache.refreshes == 2
+
+
+def test_dashboard_queries_report_tiles_and_dashboards():
+    from locust.env import Environment
+
+    from lkr.load_test.locustfile_dashboard_queries import DashboardQueriesUser
+
+    class TileSDK(FakeSDK):
+        def run_query(self, query_id, result_format, cache):
+            if query_id == "2-1":
+                raise Exception("query failed")
+            if query_id == "orders":
+                return '{"rows": [{"orders.region": {"value": "west"}, "orders.count": {"value": 3}}]}'
+            if query_id == "targets":
+                return '[{"targets.region": "west", "targets.goal": 5}]'
+            return "[]"
+
+    env = Environment(user_classes=[DashboardQueriesUser])
+    env.create_local_runner()
+    user = DashboardQueriesUser(env)
+    user.dashboard_ids = ["1", "2"]
+    user.sdk = TileSDK()
+    user.run_dashboard_queries()
+
+    stats = env.stats.entries
+    assert stats[("1: Sales", "dashboard_query")].num_failures == 0
+    assert stats[("1: element 11", "dashboard_query")].num_requests == 1
+    assert stats[("2: Sales", "dashboard_query")].num_failures == 1
+    # Merged results tiles run both sources, then the merge, on every dashboard
+    assert stats[("1: Targets #1", "merge_source")].num_requests == 1
+    assert stats[("1: Targets #2", "merge_source")].num_requests == 1
+    assert stats[("1: Targets", "merge")].num_requests == 1
+    assert stats[("1: Targets", "dashboard_query")].num_failures == 0
+    assert stats[("1: Targets again #2", "merge_source")].num_requests == 1
+    assert stats[("1: Targets again", "dashboard_query")].num_failures == 0
+    assert stats[("1", "dashboard_complete")].num_failures == 0
+    assert stats[("2", "dashboard_complete")].num_failures == 1
+
+
+def test_dashboards_with_the_same_title_complete_separately():
+    from locust.env import Environment
+
+    from lkr.load_test.locustfile_dashboard_queries import DashboardQueriesUser
+
+    class SameTitleSDK(FakeSDK):
+        def dashboard(self, dashboard_id, fields=None):
+            dashboard = super().dashboard(dashboard_id, fields)
+            dashboard.title = "Sales overview"
+            return dashboard
+
+        def run_query(self, query_id, result_format, cache):
+            if query_id == "2-1":
+                raise Exception("query failed")
+            return "[]"
+
+    env = Environment(user_classes=[DashboardQueriesUser])
+    env.create_local_runner()
+    user = DashboardQueriesUser(env)
+    user.dashboard_ids = ["1", "2"]
+    user.sdk = SameTitleSDK()
+    user.run_dashboard_queries()
+
+    complete = env.stats.entries[("Sales overview", "dashboard_complete")]
+    assert (complete.num_requests, complete.num_failures) == (2, 1)
+
+
+def test_tile_queries_use_cache_percent():
+    from locust.env import Environment
+
+    from lkr.load_test.locustfile_dashboard_queries import DashboardQueriesUser
+
+    class CacheSDK(FakeSDK):
+        def __init__(self):
+            super().__init__()
+            self.cache = []
+
+        def run_query(self, query_id, result_format, cache):
+            self.cache.append(cache)
+            return "[]"
+
+    env = Environment(user_classes=[DashboardQueriesUser])
+    env.create_local_runner()
+    user = DashboardQueriesUser(env)
+    user.dashboard_ids = ["1"]
+    for cache_percent, expected in ((0, {False}), (100, {True})):
+        user.sdk = CacheSDK()
+        user.cache_percent = cache_percent
+        user.run_dashboard_queries()
+        assert set(user.sdk.cache) == expected
+
+
+def test_merge_results():
+    orders = result_rows(
+        '{"rows": [{"orders.region": {"value": "west"}, "orders.count": {"value": 3}},'
+        ' {"orders.region": {"value": "east"}, "orders.count": {"value": 4}}]}'
+    )
+    targets = result_rows([{"targets.region": "west", "targets.goal": 5}])
+    assert merge_results(
+        [(orders, []), (targets, [("orders.region", "targets.region")])]
+    ) == [
+        {"orders.region": "west", "orders.count": 3, "targets.region": "west", "targets.goal": 5},
+        {"orders.region": "east", "orders.count": 4},
+    ]
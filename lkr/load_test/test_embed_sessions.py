@@ -0,0 +1,85 @@
+import lkr.main  # noqa: F401 - ensure monkey patch runs first
+import itertools
+import time
+
+from locust import User
+from locust.env import Environment
+
+from lkr.load_test.attributes import compile_attributes
+from lkr.load_test.embed_sessions import EmbedSessionPool, IdentityPool, new_sdk
+
+ids = itertools.count()
+
+
+class SessionUser(User):
+    abstract = True
+    session_pool: EmbedSessionPool | None = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user_id = f"embed-{next(ids)}"
+
+    def _init_sdk(self):
+        time.sleep(0.05)
+        return f"sdk for {self.user_id}"
+
+
+def test_warm_pool_then_acquire():
+    env = Environment(user_classes=[SessionUser])
+    env.create_local_runner()
+    pool = EmbedSessionPool(size=4, concurrency=4)
+    start = time.time()
+    pool.warm_up(SessionUser)(env)
+    # Acquired side by side rather than one after another
+    assert time.time() - start < 0.15
+    assert len(pool) == 4
+    # Reported once the test starts, after Locust has cleared its stats
+    assert ("warm_up", "embed_session") not in env.stats.entries
+    env.events.test_start.fire(environment=env)
+    env.events.test_start.fire(environment=env)
+    assert env.stats.entries[("warm_up", "embed_session")].num_requests == 4
+
+    user = SessionUser(env)
+    user.session_pool = pool
+    sdk = new_sdk(user)
+    assert sdk == f"sdk for {user.user_id}"
+    assert len(pool) == 3
+    assert ("acquire", "embed_session") not in env.stats.entries
+
+    # Once the pool is empty users acquire their own, reported as embed_session
+    for _ in range(3):
+        new_sdk(user)
+    new_sdk(user)
+    assert env.stats.entries[("acquire", "embed_session")].num_requests == 1
+
+
+def test_identity_pool_is_deterministic_and_balanced():
+    attributes = compile_attributes(["tenant:uniform(1,1000000)", "store:zipf(1000)"])
+    pool = IdentityPool(3, attributes)
+    again = IdentityPool(3, attributes)
+    assert [i.external_user_id for i in pool.identities] == [
+        "embed-pool-0",
+        "embed-pool-1",
+        "embed-pool-2",
+    ]
+    assert [i.attributes for i in pool.identities] == [i.attributes for i in again.identities]
+    assert pool.identities[0].attributes != pool.identities[1].attributes
+
+    held = [pool.checkout() for _ in range(4)]
+    # Every identity is used once before one is shared
+    assert len({i.external_user_id for i in held[:3]}) == 3
+    pool.release(held[1])
+    assert pool.checkout() is held[1]
+
+
+def test_new_sdk_checks_out_identities():
+    env = Environment(user_classes=[SessionUser])
+    env.create_local_runner()
+    identities = IdentityPool(1, compile_attributes([]))
+    user = SessionUser(env)
+    user.identity_pool = identities
+    new_sdk(user)
+    assert user.user_id == "embed-pool-0"
+    new_sdk(user)
+    # The previous identity was handed back before taking the next one
+    assert identities.checkout() is user.identity
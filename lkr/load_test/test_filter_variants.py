@@ -0,0 +1,68 @@
+import lkr.main  # noqa: F401 - ensure monkey patch runs first
+import gevent
+import pytest
+import typer
+from looker_sdk import models40
+
+from lkr.load_test.filter_variants import compile_filter_variants
+
+
+class FakeSDK:
+    def __init__(self):
+        self.created = []
+        self.lookups = 0
+
+    def query(self, query_id):
+        self.lookups += 1
+        filters = {"users.state": "Ohio", "orders.status": "complete"} if query_id == "1" else {}
+        return models40.Query(
+            id=query_id,
+            model="thelook",
+            view="orders",
+            fields=["orders.count"],
+            filters=filters,
+            filter_config={"users.state": []},
+            client_id="abc",
+        )
+
+    def create_query(self, body, fields=None):
+        gevent.sleep(0.01)
+        self.created.append(body)
+        return models40.Query(id=f"v{len(self.created)}", model=body.model, view=body.view)
+
+
+def test_variants_created_once_per_value():
+    variants = compile_filter_variants(
+        ["users.state:sequence(1,100)", "products.brand:acme"], cardinality=3
+    )
+    assert variants is not None
+    sdk = FakeSDK()
+    picked = [gevent.spawn(variants.variant, sdk, "1") for _ in range(50)]
+    gevent.joinall(picked)
+
+    assert {g.value for g in picked} == {"v1", "v2", "v3"}
+    assert sdk.lookups == 1
+    # Only filters the query already has are changed
+    assert sorted(body.filters["users.state"] for body in sdk.created) == ["1", "2", "3"]
+    assert all(body.filters["orders.status"] == "complete" for body in sdk.created)
+    assert all("products.brand" not in body.filters for body in sdk.created)
+    assert all(body.filter_config is None and body.client_id is None for body in sdk.created)
+
+    # Queries without any of the filters run as they are
+    assert variants.variant(sdk, "2") == "2"
+
+
+def test_filter_variants_options():
+    assert compile_filter_variants([], cardinality=5) is None
+    with pytest.raises(typer.BadParameter):
+        compile_filter_variants(["users.state:zipf(0)"], cardinality=5)
+
+
+def test_filter_variant_values_follow_the_seed():
+    def values(seed):
+        variants = compile_filter_variants(["users.state:uniform(1,1000000)"], 5, seed)
+        assert variants is not None
+        return variants.values
+
+    assert values(7) == values(7)
+    assert values(7) != values(8)
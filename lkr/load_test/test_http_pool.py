@@ -0,0 +1,51 @@
+import lkr.main  # noqa: F401 - ensure monkey patch runs first
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from lkr.load_test.http_pool import STATS, SharedConnectionPool, pool_size
+
+
+class OkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+def test_shared_pool_reuses_connections():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OkHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        pool = SharedConnectionPool(size=2)
+        template = requests.Session()
+        template.headers["x-looker-appid"] = "lkr"
+        session = pool.session(template)
+        assert pool.session(requests.Session()) is session
+        assert session.headers["x-looker-appid"] == "lkr"
+
+        requests_before, connections_before = STATS.requests, STATS.connections
+        url = f"http://127.0.0.1:{server.server_port}/"
+        for _ in range(5):
+            assert session.get(url).text == "ok"
+        assert STATS.requests - requests_before == 5
+        assert STATS.connections - connections_before == 1
+        session.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_pool_size_covers_peak_concurrency():
+    assert pool_size(100, 4) == 25
+    assert pool_size(10, 4) == 3
+    # Every user runs up to 20 tiles at once, unless the process is capped
+    assert pool_size(100, 4, per_user=20) == 500
+    assert pool_size(100, 4, per_user=20, max_in_flight=200) == 200
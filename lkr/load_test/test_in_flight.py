@@ -0,0 +1,22 @@
+import lkr.main  # noqa: F401 - ensure monkey patch runs first
+
+from lkr.load_test.in_flight import InFlightLimiter
+
+
+def test_in_flight_share():
+    limiter = InFlightLimiter(10, workers=4)
+    assert [limiter.share(i) for i in range(4)] == [3, 3, 2, 2]
+    assert sum(limiter.share(i) for i in range(4)) == 10
+
+
+def test_in_flight_acquire_release():
+    limiter = InFlightLimiter(5, workers=2)
+    limiter.bind(worker_index=1)
+    assert limiter.size == 2
+    assert limiter.acquire()
+    assert limiter.acquire()
+    assert not limiter.acquire()
+    assert limiter.in_flight == 2
+    limiter.release()
+    assert limiter.in_flight == 1
+    assert limiter.acquire()
@@ -0,0 +1,71 @@
+import lkr.main  # noqa: F401 - ensure monkey patch runs first
+
+import gevent
+import pytest
+import typer
+from looker_sdk import models40
+
+from lkr.load_test.query_slugs import SlugCache, resolve_slugs
+
+
+class SlugSDK:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+        self.running = 0
+        self.max_running = 0
+
+    def query_for_slug(self, slug, fields=None):
+        self.calls.append(slug)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        gevent.sleep(self.delay)
+        self.running -= 1
+        if slug == "missing":
+            raise Exception("Not found")
+        return models40.Query(id=f"id-{slug}", slug=slug.upper(), model="m", view="v")
+
+
+def test_resolve_slugs_in_parallel_and_order():
+    sdk = SlugSDK(delay=0.01)
+    slugs = [f"s{i}" for i in range(10)]
+    resolved = resolve_slugs(sdk, slugs + ["s0"], concurrency=4)
+    assert list(resolved) == slugs
+    assert resolved["s3"] == ("S3", "id-s3")
+    assert sdk.max_running == 4
+    assert sorted(sdk.calls) == sorted(slugs)
+
+
+def test_slug_cache_skips_resolved_slugs(tmp_path):
+    path = tmp_path / "lkr" / "query_slugs.json"
+    resolve_slugs(SlugSDK(), ["a", "b"], cache=SlugCache(path, "https://one.looker.com/"))
+
+    sdk = SlugSDK()
+    resolved = resolve_slugs(sdk, ["a", "b", "c"], cache=SlugCache(path, "https://one.looker.com"))
+    assert resolved == {"a": ("A", "id-a"), "b": ("B", "id-b"), "c": ("C", "id-c")}
+    assert sdk.calls == ["c"]
+
+    # Another instance has its own slugs
+    other = SlugSDK()
+    resolve_slugs(other, ["a"], cache=SlugCache(path, "https://two.looker.com"))
+    assert other.calls == ["a"]
+
+
+def test_slug_cache_keeps_resolved_slugs_on_failure(tmp_path):
+    path = tmp_path / "query_slugs.json"
+    with pytest.raises(typer.BadParameter, match="missing"):
+        resolve_slugs(SlugSDK(), ["a", "missing"], cache=SlugCache(path, "https://x"))
+    assert SlugCache(path, "https://x").get("a") == ("A", "id-a")
+
+
+def test_resolve_slugs_keeps_every_input_slug():
+    class AliasSDK(SlugSDK):
+        def query_for_slug(self, slug, fields=None):
+            query = super().query_for_slug(slug, fields)
+            query.slug = "CANONICAL" if slug in ("old", "new") else query.slug
+            return query
+
+    resolved = resolve_slugs(AliasSDK(), ["old", "b", "new"])
+    assert list(resolved) == ["old", "b", "new"]
+    assert resolved["old"] == ("CANONICAL", "id-old")
+    assert resolved["b"] == ("B", "id-b")
@@ -0,0 +1,122 @@
+import lkr.main  # noqa: F401 - ensure monkey patch runs first
+
+import gevent
+
+from lkr.load_test.query_tasks import PollBackoff, TaskPoller, poll_query_tasks
+
+
+class FakeSDK:
+    """Answers query_task_multi_results from a script of statuses per poll."""
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.calls = []
+
+    def query_task_multi_results(self, query_task_ids):
+        self.calls.append(list(query_task_ids))
+        poll = len(self.calls) - 1
+        return {
+            task_id: {"status": self.statuses[task_id][min(poll, len(self.statuses[task_id]) - 1)], "data": {}}
+            for task_id in query_task_ids
+        }
+
+
+def test_poll_backoff():
+    backoff = PollBackoff(initial=0.05, maximum=0.3)
+    assert [backoff.next() for _ in range(5)] == [0.05, 0.1, 0.2, 0.3, 0.3]
+    backoff.reset()
+    assert backoff.next() == 0.05
+
+
+def test_poll_query_tasks_batches():
+    sdk = FakeSDK(
+        {
+            "a": ["complete"],
+            "b": ["running", "running", "error"],
+            "c": ["added", "complete"],
+        }
+    )
+    results = {r.task_id: r for r in poll_query_tasks(sdk, ["a", "b", "c"], bail_out=5)}
+    # One request per round, only for the tasks that are still pending
+    assert sdk.calls == [["a", "b", "c"], ["b", "c"], ["b"]]
+    assert (results["a"].polls, results["a"].ok) == (1, True)
+    assert (results["b"].polls, results["b"].ok) == (3, False)
+    assert (results["c"].polls, results["c"].ok) == (2, True)
+
+
+def test_poll_query_tasks_timeout():
+    sdk = FakeSDK({"a": ["running"]})
+    (result,) = poll_query_tasks(sdk, ["a"], bail_out=0.1, backoff=PollBackoff(initial=0.02))
+    assert result.status == "timeout"
+    assert result.polls > 1
+
+
+def test_task_poller_shares_requests():
+    shared = FakeSDK({"a": ["running", "complete"], "b": ["complete"]})
+    poller = TaskPoller(lambda: shared, interval=0.01)
+    user_a, user_b = FakeSDK({}), FakeSDK({})
+
+    waits = [
+        gevent.spawn(lambda: list(poller.wait(user_a, ["a"], bail_out=5))),
+        gevent.spawn(lambda: list(poller.wait(user_b, ["b"], bail_out=5))),
+    ]
+    gevent.joinall(waits)
+    ((a,), (b,)) = [w.value for w in waits]
+    assert (a.status, a.polls) == ("complete", 2)
+    assert (b.status, b.polls) == ("complete", 1)
+    # Both users' tasks went out in one request, the users never polled
+    assert shared.calls == [["a", "b"], ["a"]]
+    assert user_a.calls == user_b.calls == []
+
+
+def test_task_poller_falls_back_to_owner():
+    class NoAccessSDK:
+        def query_task_multi_results(self, query_task_ids):
+            return {}
+
+    owner = FakeSDK({"a": ["complete"]})
+    poller = TaskPoller(NoAccessSDK, interval=0.01)
+    (result,) = poller.wait(owner, ["a"], bail_out=5)
+    assert result.ok
+    assert owner.calls == [["a"]]
+
+
+def test_query_timings_split_runtime_and_overhead():
+    import time
+
+    from locust.env import Environment
+    from looker_sdk import models40
+
+    from lkr.load_test.locustfile_qid import QueryUser
+    from lkr.load_test.query_tasks import QueryTaskResult
+
+    class RuntimeSDK:
+        def query_task(self, query_task_id, fields=None):
+            return models40.QueryTask(id=query_task_id, runtime=0.5, result_source="query")
+
+    env = Environment(user_classes=[QueryUser])
+    env.create_local_runner()
+    user = QueryUser(env)
+    user.query_timings = True
+    user._task_queries["t1"] = "abc"
+    start = time.time()
+    user._record_query_task(
+        QueryTaskResult("t1", "complete", polls=2, finished_at=start + 2), start, RuntimeSDK()
+    )
+    gevent.sleep(0.01)
+
+    assert "t1" not in user._task_queries
+    stats = env.stats
+    assert stats.get("looker_runtime: abc [query]", "query_timing").avg_response_time == 500
+    assert stats.get("overhead: abc [query]", "query_timing").avg_response_time == 1500
+    assert stats.get("client_observed: abc [query]", "query_timing").avg_response_time == 2000
+
+    # Lookups still running when the user stops are killed
+    user._task_queries["t2"] = "abc"
+    user._record_query_task(
+        QueryTaskResult("t2", "complete", polls=1, finished_at=start + 1), start, RuntimeSDK()
+    )
+    user.on_stop()
+    gevent.sleep(0.01)
+    assert not user._timing_greenlets
+    assert stats.get("client_observed: abc [query]", "query_timing").num_requests == 1
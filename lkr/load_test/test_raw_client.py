@@ -0,0 +1,19 @@
+import lkr.main  # noqa: F401 - ensure monkey patch runs first
+import json
+
+from benchmarks.canned_looker import RENDER_TASK, canned_clients, query_task_body
+
+
+def test_raw_client_matches_sdk():
+    sdk, raw = canned_clients(
+        {
+            "/query_tasks/multi_results": json.dumps({"task0": {"status": "running"}}).encode(),
+            "/query_tasks": json.dumps(query_task_body("task0")).encode(),
+            "/render_tasks": json.dumps(RENDER_TASK).encode(),
+            "/queries/": b'{"rows": []}',
+        }
+    )
+    assert raw.create_query_task("1", "json_bi") == "task0"
+    assert raw.query_task_multi_results(["task0"]) == {"task0": {"status": "running"}}
+    assert raw.render_task("1a2b3c")["status"] == sdk.render_task("1a2b3c").status
+    assert raw.run_query("1", "json_bi") == sdk.run_query("1", "json_bi").encode()
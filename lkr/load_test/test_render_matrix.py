@@ -0,0 +1,80 @@
+import lkr.main  # noqa: F401 - ensure monkey patch runs first
+
+import pytest
+import typer
+
+from lkr.load_test.render_matrix import RenderCase, parse_paper, parse_size, render_matrix
+
+
+def test_render_matrix_only_valid_combinations():
+    cases = render_matrix(
+        dashboards=["1"],
+        looks=["2"],
+        queries=["3"],
+        formats=["pdf", "PNG"],
+        sizes=["1920x1080", "800x600"],
+        papers=["a4", "letter:landscape"],
+        dashboard_filters=["", "State=Ohio"],
+    )
+    # Dashboards: (2 papers for pdf + png) x 2 sizes x 2 filter sets
+    assert sum(1 for c in cases if c.kind == "dashboard") == 12
+    # Looks and queries only render png, without paper or filters
+    assert [c for c in cases if c.kind != "dashboard"] == [
+        RenderCase("look", "2", "png", 1920, 1080),
+        RenderCase("look", "2", "png", 800, 600),
+        RenderCase("query", "3", "png", 1920, 1080),
+        RenderCase("query", "3", "png", 800, 600),
+    ]
+    assert RenderCase("dashboard", "1", "pdf", 800, 600, "letter", True, "State=Ohio") in cases
+    assert RenderCase("dashboard", "1", "png", 800, 600, None, False, "") in cases
+    assert (
+        RenderCase("dashboard", "1", "pdf", 800, 600, "letter", True, "State=Ohio").name
+        == "dashboard 1 pdf 800x600 letter landscape [State=Ohio]"
+    )
+
+
+def test_render_matrix_invalid():
+    with pytest.raises(typer.BadParameter):
+        render_matrix([], ["2"], [], ["pdf"], ["1920x1080"], [], [])
+    with pytest.raises(typer.BadParameter):
+        render_matrix(["1"], [], [], ["gif"], ["1920x1080"], [], [])
+    with pytest.raises(typer.BadParameter):
+        parse_size("1920")
+    with pytest.raises(typer.BadParameter):
+        parse_paper("a4:sideways")
+    assert parse_size("1280 x 720") == (1280, 720)
+    assert parse_paper("Letter:Landscape") == ("letter", True)
+
+
+def test_render_user_reports_render_and_download(monkeypatch):
+    from locust.env import Environment
+    from looker_sdk import models40
+
+    from lkr.load_test import locustfile_render
+    from lkr.load_test.locustfile_render import RenderUser
+    from lkr.load_test.streaming import StreamedResult
+
+    class RenderSDK:
+        def create_look_render_task(self, look_id, result_format, width, height):
+            return models40.RenderTask(id="r1")
+
+        def render_task(self, render_task_id):
+            return models40.RenderTask(id=render_task_id, status="success", runtime=1.5)
+
+    monkeypatch.setattr(
+        locustfile_render,
+        "stream_render_results",
+        lambda sdk, task_id: StreamedResult(ttfb=0.1, duration=0.25, bytes=2048, rows=None),
+    )
+    env = Environment(user_classes=[RenderUser])
+    env.create_local_runner()
+    user = RenderUser(env)
+    user.sdk = RenderSDK()
+    user.render_cases = [RenderCase("look", "2", "png", 800, 600)]
+    user.download_results = True
+    user.render()
+
+    assert env.stats.get("look 2 png 800x600", "render").num_requests == 1
+    download = env.stats.get("look 2 png 800x600", "render_download")
+    assert (download.num_requests, download.total_content_length) == (1, 2048)
+    assert download.avg_response_time == 250
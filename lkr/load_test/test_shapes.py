@@ -0,0 +1,208 @@
+import lkr.main  # noqa: F401 - ensure monkey patch runs first
+import pytest
+import typer
+from locust.stats import RequestStats, StatsEntry
+
+from lkr.load_test.shapes import (
+    CapacitySearch,
+    CapacityShape,
+    Stage,
+    StageStats,
+    StagesShape,
+    StatsSnapshot,
+    get_load_shape,
+    parse_duration,
+)
+from lkr.load_test.request_stats import measured_total
+
+
+def test_parse_duration():
+    assert parse_duration("90") == 90
+    assert parse_duration("90s") == 90
+    assert parse_duration("2m") == 120
+    assert parse_duration("1h") == 3600
+    with pytest.raises(typer.BadParameter):
+        parse_duration("2 minutes")
+
+
+def test_step_shape():
+    shape = get_load_shape("step:users=100,step=25,every=2m", 5)
+    assert shape is not None
+    assert [s.users for s in shape.stages] == [25, 50, 75, 100]
+    assert all(s.duration == 120 and s.spawn_rate == 5 for s in shape.stages)
+    assert shape.max_users == 100
+    assert shape.run_time_minutes == 8
+
+
+def test_spike_and_soak_shapes():
+    shape = get_load_shape("spike:users=100,peak=400,duration=60s,rate=50", 1)
+    assert shape is not None
+    assert [(s.users, s.duration, s.spawn_rate) for s in shape.stages] == [
+        (100, 120, 50),
+        (400, 60, 50),
+        (100, 120, 50),
+    ]
+
+    shape = get_load_shape("soak:users=200,duration=12m,segment=5m", 1)
+    assert shape is not None
+    assert [s.duration for s in shape.stages] == [300, 300, 120]
+
+
+def test_stage_table(tmp_path):
+    table = tmp_path / "stages.csv"
+    table.write_text("duration,users,spawn_rate\n60,10,\n2m,50,10\n")
+    shape = get_load_shape(f"file:{table}", 2)
+    assert shape is not None
+    assert [(s.duration, s.users, s.spawn_rate) for s in shape.stages] == [
+        (60, 10, 2),
+        (120, 50, 10),
+    ]
+
+
+def test_invalid_shapes():
+    assert get_load_shape(None, 1) is None
+    for spec in ["wave:users=1", "step:users=100", "step:users", "file:/does/not/exist"]:
+        with pytest.raises(typer.BadParameter):
+            get_load_shape(spec, 1)
+
+
+@pytest.mark.parametrize(
+    "spec",
+    [
+        "soak:users=10,duration=1m,segment=0",
+        "soak:users=10,duration=0",
+        "ramp:users=10,duration=0",
+        "ramp:users=10,duration=1m,steps=0",
+        "step:users=100,step=10,every=0",
+        "step:users=100,step=0,every=1m",
+        "step:users=100,step=10,every=1m,rate=fast",
+        "spike:users=10,peak=100,duration=0s",
+        "spike:users=10,peak=0,duration=1m",
+        "spike:users=0,peak=100,duration=1m",
+    ],
+)
+def test_zero_length_shapes_rejected(spec):
+    with pytest.raises(typer.BadParameter):
+        get_load_shape(spec, 1)
+
+
+def test_stages_shape_tick(monkeypatch):
+    shape = StagesShape([Stage(10, 5, 1), Stage(10, 10, 2)])
+    assert shape.tick() == (5, 1)
+    monkeypatch.setattr(shape, "get_run_time", lambda: 15)
+    assert shape.tick() == (10, 2)
+    monkeypatch.setattr(shape, "get_run_time", lambda: 25)
+    assert shape.tick() is None
+
+
+def test_stages_shape_segments_wait_for_worker_reports(monkeypatch):
+    import time
+    from types import SimpleNamespace
+
+    monkeypatch.setattr(StagesShape, "report_lag", 0.05)
+    stats = RequestStats()
+    shape = StagesShape([Stage(10, 5, 1), Stage(10, 10, 2)])
+    shape.runner = SimpleNamespace(stats=stats)  # type: ignore[assignment]
+
+    def requests(n):
+        for _ in range(n):
+            stats.log_request("run_query", "run_query_sync", 100, 0)
+            stats.log_request("connect", "handshake", 5, 0)
+
+    shape.tick()
+    requests(5)
+    monkeypatch.setattr(shape, "get_run_time", lambda: 15)
+    shape.tick()
+    # The end of the first stage is still being reported
+    requests(2)
+    assert shape.segments == []
+    time.sleep(0.1)
+    shape.tick()
+    requests(4)
+    monkeypatch.setattr(shape, "get_run_time", lambda: 25)
+    assert shape.tick() is None
+    shape.get_segments_summary()
+    assert [(s.stage, s.users, s.requests) for s in shape.segments] == [(0, 5, 7), (1, 10, 4)]
+
+
+def test_stats_snapshot_segment():
+    entry = StatsEntry(None, "Aggregated", "")
+    for rt in [10, 20]:
+        entry.log(rt, 0)
+    snapshot = StatsSnapshot(entry)
+    for rt in [100] * 19 + [1000]:
+        entry.log(rt, 0)
+    entry.log_error(Exception("boom"))
+
+    segment = snapshot.segment(entry, stage=1, users=5)
+    assert segment.requests == 20
+    assert segment.failures == 1
+    assert segment.p50 == 100
+    assert segment.p99 == 1000
+
+
+def test_capacity_search():
+    # Doubles until a probe fails, then bisects down to the resolution
+    search = CapacitySearch(start=10, max_users=1000, resolution=5)
+    probes = []
+    users = search.next_users
+    while users is not None:
+        probes.append(users)
+        users = search.record(users, passed=users <= 130)
+    assert probes == [10, 20, 40, 80, 160, 120, 140, 130, 135]
+    assert search.passed == 130
+
+    # Never probes past max_users
+    search = CapacitySearch(start=10, max_users=30, resolution=5)
+    assert search.record(10, True) == 20
+    assert search.record(20, True) == 30
+    assert search.record(30, True) is None
+    assert search.passed == 30
+
+
+def test_capacity_shape_spec():
+    shape = get_load_shape("capacity:p95=2000,errors=0.5,max=500,hold=1m", 5)
+    assert isinstance(shape, CapacityShape)
+    assert shape.p95 == 2000
+    assert shape.p99 is None
+    assert shape.error_rate == 0.5
+    assert shape.hold == 60
+    assert shape.max_users == 500
+    assert shape.search.resolution == 5
+
+    with pytest.raises(typer.BadParameter):
+        get_load_shape("capacity:max=500", 5)
+    with pytest.raises(typer.BadParameter):
+        get_load_shape("capacity:p95=2000", 0)
+    with pytest.raises(typer.BadParameter):
+        get_load_shape("capacity:p95=2000,rate=0", 5)
+
+
+def test_capacity_shape_meets_slo():
+    shape = get_load_shape("capacity:p95=2000,p99=5000,errors=1", 5)
+    assert isinstance(shape, CapacityShape)
+    ok = StageStats(0, 10, 60, 1000, 5, 16.7, 0.005, 500, 1900, 4000)
+    assert shape.meets_slo(ok)
+    assert not shape.meets_slo(StageStats(**{**ok.__dict__, "p95": 2100}))
+    assert not shape.meets_slo(StageStats(**{**ok.__dict__, "p99": 5100}))
+    assert not shape.meets_slo(StageStats(**{**ok.__dict__, "fail_ratio": 0.02}))
+    assert not shape.meets_slo(StageStats(**{**ok.__dict__, "requests": 0}))
+
+
+def test_derived_rows_do_not_change_the_verdict():
+    shape = get_load_shape("capacity:p95=2000", 5)
+    assert isinstance(shape, CapacityShape)
+    stats = RequestStats()
+    snapshot = StatsSnapshot(measured_total(stats))
+    for _ in range(20):
+        stats.log_request("run_query", "run_query_sync", 2500, 100)
+    # Fast handshakes and query timing rows would pull p95 under the target
+    for _ in range(250):
+        stats.log_request("connect", "handshake", 5, 0)
+        stats.log_request("query_timing", "overhead: abc [query]", 5, 0)
+
+    segment = snapshot.segment(measured_total(stats), stage=0, users=10)
+    assert segment.requests == 20
+    assert segment.p95 == 2500
+    assert not shape.meets_slo(segment)
+    assert shape.meets_slo(snapshot.segment(stats.total, stage=0, users=10))
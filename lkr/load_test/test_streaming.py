@@ -0,0 +1,66 @@
+import lkr.main  # noqa: F401 - ensure monkey patch runs first
+from types import SimpleNamespace
+
+from lkr.load_test.streaming import stream_query_results
+
+
+class FakeResponse:
+    ok = True
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def iter_content(self, chunk_size):
+        yield from self.chunks
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+def fake_sdk(chunks):
+    requests = []
+
+    def request(method, url, **kwargs):
+        requests.append((url, kwargs))
+        return FakeResponse(chunks)
+
+    sdk = SimpleNamespace(
+        transport=SimpleNamespace(session=SimpleNamespace(request=request), settings=SimpleNamespace(timeout=120)),
+        auth=SimpleNamespace(authenticate=lambda options: {"Authorization": "Bearer t"}),
+        encode_path_param=lambda value: value,
+        _path=lambda path: f"https://looker/api/4.0{path}",
+    )
+    return sdk, requests
+
+
+def test_stream_query_results_counts_csv_rows():
+    sdk, requests = fake_sdk([b"a,b\n1,2\n3,", b"4\n5,6"])
+    result = stream_query_results(sdk, "42", "csv", cache=False)
+    assert result.bytes == 15
+    assert result.rows == 3
+    assert 0 <= result.ttfb <= result.duration
+    url, kwargs = requests[0]
+    assert url == "https://looker/api/4.0/queries/42/run/csv"
+    assert kwargs["stream"] is True
+    assert kwargs["params"] == {"cache": "false"}
+
+
+def test_stream_query_results_json_has_no_row_count():
+    sdk, _ = fake_sdk([b'{"rows": []}'])
+    result = stream_query_results(sdk, "42", "json_bi")
+    assert result.bytes == 12
+    assert result.rows is None
+
+
+def test_stream_render_results_counts_bytes():
+    from lkr.load_test.streaming import stream_render_results
+
+    sdk, requests = fake_sdk([b"%PDF-1.4\n", b"x" * 100])
+    result = stream_render_results(sdk, "r1")
+    assert (result.bytes, result.rows) == (109, None)
+    url, kwargs = requests[0]
+    assert url == "https://looker/api/4.0/render_tasks/r1/results"
+    assert kwargs["stream"] is True
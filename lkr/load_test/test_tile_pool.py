@@ -0,0 +1,54 @@
+import lkr.main  # noqa: F401 - ensure monkey patch runs first
+from collections import Counter
+
+import gevent
+
+from lkr.load_test.dashboard_metadata import DashboardTile, MergeSource
+from lkr.load_test.tile_pool import TilePool
+
+
+def _tiles(dashboard_id: str, count: int):
+    return [DashboardTile(dashboard_id, dashboard_id, f"tile {i}", f"{dashboard_id}-{i}") for i in range(count)]
+
+
+def _run(pool: TilePool, tiles, per_dashboard: int, running=None, peaks=None):
+    running = Counter() if running is None else running
+    peaks = Counter() if peaks is None else peaks
+
+    def run_tile(tile: DashboardTile, index: int):
+        running[tile.dashboard_id] += 1
+        running["all"] += 1
+        peaks[tile.dashboard_id] = max(peaks[tile.dashboard_id], running[tile.dashboard_id])
+        peaks["all"] = max(peaks["all"], running["all"])
+        gevent.sleep(0.01)
+        running[tile.dashboard_id] -= 1
+        running["all"] -= 1
+
+    pool.run(tiles, run_tile, per_dashboard)
+    return peaks
+
+
+def test_per_dashboard_concurrency():
+    peaks = _run(TilePool(), _tiles("a", 10) + _tiles("b", 10), per_dashboard=3)
+    assert peaks["a"] == 3 and peaks["b"] == 3 and peaks["all"] == 6
+
+
+def test_process_wide_cap_across_users():
+    pool = TilePool(max_in_flight=4)
+    running: Counter = Counter()
+    peaks: Counter = Counter()
+    users = [
+        gevent.spawn(_run, pool, _tiles(str(i), 5), 5, running, peaks) for i in range(3)
+    ]
+    gevent.joinall(users)
+    assert peaks["all"] == 4
+    assert pool.in_flight == 0
+
+
+def test_merge_sources_take_their_own_slots():
+    merged = DashboardTile("a", "a", "merged", "m1", [MergeSource(f"s{i}") for i in range(4)])
+    calls = []
+    peaks = _run(TilePool(), [merged] + _tiles("a", 2), per_dashboard=2)
+    TilePool().run([merged], lambda tile, index: calls.append(index), 2)
+    assert peaks["a"] == 2
+    assert calls == [0, 1, 2, 3]
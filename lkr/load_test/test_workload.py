@@ -0,0 +1,82 @@
+import lkr.main  # noqa: F401 - ensure monkey patch runs first
+
+import random
+from collections import Counter
+
+import pytest
+import typer
+
+from lkr.load_test.workload import AliasTable, Workload, WorkloadQuery, load_workload
+
+
+def test_alias_table_matches_weights():
+    weights = [70, 20, 5, 5, 0]
+    table = AliasTable(weights)
+    rng = random.Random(1)
+    counts = Counter(table.pick(rng) for _ in range(100_000))
+    assert counts[4] == 0
+    for i, weight in enumerate(weights):
+        assert abs(counts[i] / 100_000 - weight / 100) < 0.01
+
+
+def test_alias_table_rejects_bad_weights():
+    with pytest.raises(ValueError):
+        AliasTable([])
+    with pytest.raises(ValueError):
+        AliasTable([0, 0])
+
+
+def test_load_workload(tmp_path):
+    path = tmp_path / "workload.csv"
+    path.write_text("slug, weight ,result_format,cache_percent\nabc,40,csv,80\ndef,,,\n\nghi,2.5,json,\n")
+    workload = load_workload(str(path))
+    assert workload.queries == [
+        WorkloadQuery("abc", 40.0, "csv", 80.0),
+        WorkloadQuery("def", 1.0, None, None),
+        WorkloadQuery("ghi", 2.5, "json", None),
+    ]
+
+    tsv = tmp_path / "workload.tsv"
+    tsv.write_text("slug\nabc\n")
+    assert load_workload(str(tsv)).slugs == ["abc"]
+
+
+@pytest.mark.parametrize(
+    "text",
+    ["query,weight\nabc,1\n", "slug,weight\nabc,heavy\n", "slug,cache_percent\nabc,120\n", "slug,weight\nabc,0\n"],
+)
+def test_load_workload_invalid(tmp_path, text):
+    path = tmp_path / "workload.csv"
+    path.write_text(text)
+    with pytest.raises(typer.BadParameter):
+        load_workload(str(path))
+
+
+def test_workload_sample_and_canonicalize():
+    workload = Workload([WorkloadQuery("a", 100), WorkloadQuery("b", 1), WorkloadQuery("old", 1, "csv")])
+    rng = random.Random(2)
+    picked = workload.sample(3, rng)
+    assert sorted(picked) == ["a", "b", "old"]
+
+    # Sampling without replacement still follows the weights once hot queries are
+    # picked, including after falling back from the alias table
+    hot = Workload([WorkloadQuery(str(i), 10_000) for i in range(3)] + [WorkloadQuery("x", 3), WorkloadQuery("y", 1)])
+    counts = Counter(hot.sample(4, rng)[-1] for _ in range(4000))
+    assert 2.5 < counts["x"] / counts["y"] < 3.5
+
+    canonical = workload.canonicalize({"old": "a"})
+    assert [(q.slug, q.weight) for q in canonical.queries] == [("a", 101), ("b", 1)]
+
+
+def test_query_user_uses_workload_settings():
+    from locust.env import Environment
+
+    from lkr.load_test.locustfile_qid import QueryUser
+
+    user = QueryUser(Environment(user_classes=[QueryUser]))
+    user.workload = Workload([WorkloadQuery("a", 1, "csv", 100), WorkloadQuery("b", 1)])
+    user.per_query_stats = True
+    user.cache_percent = 0
+    assert (user._result_format("a"), user._should_use_cache("a")) == ("csv", True)
+    assert (user._result_format("b"), user._should_use_cache("b")) == ("json_bi", False)
+    assert user._stat_name("run_query_async", "a") == "run_query_async: a"
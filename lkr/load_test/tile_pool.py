@@ -0,0 +1,56 @@
+from typing import Callable, Dict, List, Tuple
+
+import gevent
+from gevent.lock import BoundedSemaphore
+from gevent.pool import Pool
+
+from lkr.load_test.dashboard_metadata import DashboardTile
+
+__all__ = ["TilePool"]
+
+
+class TilePool:
+    """
+    Long-lived greenlet pool that runs dashboard tile queries for every user in the
+    process. Each dashboard runs at most `per_dashboard` queries at a time, like a
+    browser loading it, and the process runs at most `max_in_flight` tile queries at
+    a time across all users, or any number when it is None. Every source query of a
+    merged results tile counts as a query of its own.
+    """
+
+    def __init__(self, max_in_flight: int | None = None):
+        self.max_in_flight = max_in_flight
+        self._pool = Pool(max_in_flight)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pool)
+
+    def run(
+        self,
+        tiles: List[DashboardTile],
+        run_query: Callable[[DashboardTile, int], None],
+        per_dashboard: int,
+    ):
+        """
+        Call run_query with every tile and the index of each of its queries, and
+        wait for all of them to finish.
+        """
+        by_dashboard: Dict[str, List[Tuple[DashboardTile, int]]] = {}
+        for tile in tiles:
+            by_dashboard.setdefault(tile.dashboard_id, []).extend(
+                (tile, index) for index in range(len(tile.query_ids))
+            )
+        running: List[gevent.Greenlet] = []
+
+        def feed(dashboard_queries: List[Tuple[DashboardTile, int]]):
+            slots = BoundedSemaphore(max(1, per_dashboard))
+            for tile, index in dashboard_queries:
+                slots.acquire()
+                # Blocks while the process is at max_in_flight
+                greenlet = self._pool.spawn(run_query, tile, index)
+                greenlet.link(lambda _: slots.release())
+                running.append(greenlet)
+
+        gevent.joinall([gevent.spawn(feed, t) for t in by_dashboard.values()])
+        gevent.joinall(running)
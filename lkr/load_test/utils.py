@@ -3,6 +3,7 @@ import base64
 import json
 import random
 import re
+import socket
 from datetime import datetime, timezone, timedelta
 from urllib.parse import urlencode, urlparse
 from typing import Dict, List, Tuple
@@ -88,6 +89,14 @@ def format_attributes(
     return formatted_attributes
 
 
+def get_free_port() -> int:
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
 def now():
     return datetime.now(timezone.utc)
 
@@ -0,0 +1,163 @@
+import csv
+import heapq
+import random
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+
+import typer
+
+__all__ = ["AliasTable", "Workload", "WorkloadQuery", "load_workload"]
+
+_rng = random.Random()
+
+
+class AliasTable:
+    """
+    Walker's alias table for picking index i with probability weights[i] / sum(weights)
+    in constant time, however many weights there are. Built once in linear time.
+    """
+
+    def __init__(self, weights: Sequence[float]):
+        n = len(weights)
+        total = sum(weights)
+        if not n or total <= 0 or any(w < 0 for w in weights):
+            raise ValueError("weights must be non-negative and add up to more than 0")
+        scaled = [w * n / total for w in weights]
+        self._prob = [1.0] * n
+        self._alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1]
+        large = [i for i, p in enumerate(scaled) if p >= 1]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self._prob[s] = scaled[s]
+            self._alias[s] = l
+            scaled[l] += scaled[s] - 1
+            (small if scaled[l] < 1 else large).append(l)
+        # Whatever is left is 1 up to rounding error
+
+    def __len__(self) -> int:
+        return len(self._prob)
+
+    def pick(self, rng: random.Random) -> int:
+        u = rng.random() * len(self._prob)
+        i = int(u)
+        return i if u - i < self._prob[i] else self._alias[i]
+
+
+@dataclass
+class WorkloadQuery:
+    slug: str
+    weight: float = 1.0
+    # None uses --result-format and --cache-percent
+    result_format: str | None = None
+    cache_percent: float | None = None
+
+
+class Workload:
+    """Queries picked in proportion to their weight."""
+
+    def __init__(self, queries: List[WorkloadQuery]):
+        self.queries = queries
+        self._table = AliasTable([q.weight for q in queries])
+        self._by_slug: Dict[str, WorkloadQuery] = {q.slug: q for q in queries}
+
+    @property
+    def slugs(self) -> List[str]:
+        return [q.slug for q in self.queries]
+
+    def get(self, slug: str) -> WorkloadQuery | None:
+        return self._by_slug.get(slug)
+
+    def pick(self, rng: random.Random | None = None) -> str:
+        return self.queries[self._table.pick(rng or _rng)].slug
+
+    def sample(self, k: int, rng: random.Random | None = None) -> List[str]:
+        """
+        k different slugs, or all with a weight above 0, picked by weight without
+        replacement: each pick is in proportion to the weights of the slugs not
+        picked yet.
+        """
+        rng = rng or _rng
+        k = min(k, sum(1 for q in self.queries if q.weight > 0))
+        picked: Dict[str, None] = {}
+        # Picks from the alias table that repeat a slug are skipped, which keeps the
+        # proportions right. A few hot queries can take many picks to get past, so
+        # after a while the rest are picked by weighted random keys instead, which
+        # draws from the same distribution in one pass over the queries
+        for _ in range(k * 20):
+            if len(picked) == k:
+                return list(picked)
+            picked[self.pick(rng)] = None
+        rest = [q for q in self.queries if q.weight > 0 and q.slug not in picked]
+        keyed = heapq.nlargest(
+            k - len(picked), rest, key=lambda q: rng.random() ** (1 / q.weight)
+        )
+        return list(picked) + [q.slug for q in keyed]
+
+    def canonicalize(self, canonical_slugs: Dict[str, str]) -> "Workload":
+        """The workload with every slug replaced by its canonical slug, merging repeats."""
+        merged: Dict[str, WorkloadQuery] = {}
+        for q in self.queries:
+            slug = canonical_slugs.get(q.slug, q.slug)
+            if slug in merged:
+                merged[slug].weight += q.weight
+            else:
+                merged[slug] = WorkloadQuery(slug, q.weight, q.result_format, q.cache_percent)
+        return Workload(list(merged.values()))
+
+
+def _number(path: str, line: int, column: str, value: str, low: float, high: float) -> float:
+    try:
+        number = float(value)
+    except ValueError:
+        number = -1
+    if not low <= number <= high:
+        raise typer.BadParameter(
+            f"Workload file {path} line {line}: {column} must be a number from {low:g} to {high:g}, got {value!r}"
+        )
+    return number
+
+
+def load_workload(path: str) -> Workload:
+    """
+    Read a CSV or TSV workload file with a header row. Only the slug column is
+    required. weight defaults to 1, and blank result_format and cache_percent
+    columns fall back to --result-format and --cache-percent.
+
+        slug,weight,result_format,cache_percent
+        abc123,40,json_bi,80
+        def456,1,csv,0
+    """
+    try:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            text = f.read()
+    except OSError as e:
+        raise typer.BadParameter(f"Could not read workload file {path}: {e}")
+    header = text.partition("\n")[0]
+    delimiter = "\t" if path.endswith(".tsv") or "\t" in header else ","
+    reader = csv.DictReader(text.splitlines(), delimiter=delimiter)
+    columns = [c.strip() for c in reader.fieldnames or []]
+    if "slug" not in columns:
+        raise typer.BadParameter(f"Workload file {path} needs a header with a slug column")
+    reader.fieldnames = columns
+    queries: List[WorkloadQuery] = []
+    for row in reader:
+        line = reader.line_num
+        row = {k: (v or "").strip() for k, v in row.items() if k}
+        if not row.get("slug"):
+            continue
+        queries.append(
+            WorkloadQuery(
+                slug=row["slug"],
+                weight=_number(path, line, "weight", row["weight"], 0, float("inf"))
+                if row.get("weight")
+                else 1.0,
+                result_format=row.get("result_format") or None,
+                cache_percent=_number(path, line, "cache_percent", row["cache_percent"], 0, 100)
+                if row.get("cache_percent")
+                else None,
+            )
+        )
+    if not queries or not sum(q.weight for q in queries):
+        raise typer.BadParameter(f"Workload file {path} has no queries with a weight above 0")
+    return Workload(queries)
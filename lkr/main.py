@@ -22,6 +22,7 @@ if "--no-gevent-patch" not in sys.argv:
     if hasattr(threading, "_get_ident"):
         setattr(threading, "_get_ident", _safe_get_ident)
 
+import math
 import os
 import pathlib
 from concurrent.futures import ThreadPoolExecutor, as_completed, wait
@@ -35,17 +36,30 @@ import looker_sdk
 import structlog
 import typer
 from dotenv import load_dotenv
-from locust import events
-from locust.env import Environment
 from looker_sdk.sdk.api40.models import User
 
+from lkr.load_test import auth, http_pool
+from lkr.load_test.arrival import ArrivalDistribution, ArrivalSchedule, parse_rate
+from lkr.load_test.attributes import compile_attributes
+from lkr.load_test.filter_variants import compile_filter_variants
+from lkr.load_test.in_flight import InFlightLimiter, InFlightScope
+from lkr.load_test.dashboard_metadata import DashboardMetadataCache
+from lkr.load_test.embed_sessions import EmbedSessionPool, IdentityPool
 from lkr.load_test.embed_dashboard_observability.main import DashboardUserObservability
 from lkr.load_test.locustfile_dashboard import DashboardUser
 from lkr.load_test.locustfile_qid import QueryUser
 from lkr.load_test.locustfile_render import RenderUser
 from lkr.load_test.locustfile_cookieless_embed_dashboard import CookielessEmbedDashboardUser
 from lkr.load_test.locustfile_dashboard_queries import DashboardQueriesUser
+from lkr.load_test.tile_pool import TilePool
+from lkr.load_test.runner import resolve_workers, run_load_test
+from lkr.load_test.query_slugs import open_slug_cache, resolve_slugs
+from lkr.load_test.query_tasks import TaskPoller
+from lkr.load_test.raw_client import RawLookerClient
+from lkr.load_test.render_matrix import render_matrix
+from lkr.load_test.shapes import get_load_shape
 from lkr.load_test.utils import get_external_group_id, get_system_activity_explore_url
+from lkr.load_test.workload import load_workload
 from lkr.utils.validate_api import validate_api_credentials
 from lkr.utils.version import get_version
 
@@ -299,13 +313,26 @@ def load_test_cookieless_embed_dashboard(
             help="First name of the embed user",
         ),
     ] = "Embed",
+    workers: Annotated[
+        int | None,
+        typer.Option(
+            help="Number of worker processes to spread users across. Defaults to the number of CPU cores, use 1 to run everything in a single process",
+            min=1,
+        ),
+    ] = None,
+    shape: Annotated[
+        str | None,
+        typer.Option(
+            help="Load shape to run instead of a fixed number of users, e.g. step:users=500,step=25,every=2m. Built-in shapes are step, ramp, spike and soak, or file:stages.csv for a stage table of duration,users,spawn_rate. capacity:p95=2000 searches for the most users that meet a latency and error rate target. Each stage is reported separately. --users and --run-time are taken from the shape",
+        ),
+    ] = None,
 ):
     """
     Run a load test on a dashboard using Cookieless Embed V2.
     """
-    from locust import events
-    from locust.env import Environment
-
+    load_shape = get_load_shape(shape, spawn_rate)
+    if load_shape:
+        users, run_time = load_shape.max_users, load_shape.run_time_minutes
     typer.echo(
         f"Running load test with {users} users, {spawn_rate} spawn rate, and {run_time} minutes"
     )
@@ -326,22 +353,15 @@ def load_test_cookieless_embed_dashboard(
             self.first_name = first_name
             super().__init__(*args, **kwargs)
 
-    env = Environment(
-        user_classes=[CookielessEmbedDashboardUserClass], events=events, stop_timeout=stop_timeout
+    run_load_test(
+        [CookielessEmbedDashboardUserClass],
+        users=users,
+        spawn_rate=spawn_rate,
+        run_time=run_time,
+        workers=resolve_workers(workers, users),
+        shape=load_shape,
+        stop_timeout=stop_timeout,
     )
-    runner = env.create_local_runner()
-
-    runner.start(user_count=users, spawn_rate=spawn_rate)
-
-    def quit_runner():
-        runner.stop()
-        if runner.greenlet:
-            runner.greenlet.kill(block=False)
-        typer.Exit(1)
-
-    if runner.spawning_greenlet:
-        runner.spawning_greenlet.spawn_later(run_time * 60, quit_runner)
-    runner.greenlet.join()
 
 @group.command(name="dashboard")
 def load_test(
@@ -405,14 +425,27 @@ def load_test(
             help="First name of the embed user",
         ),
     ] = "Embed",
+    workers: Annotated[
+        int | None,
+        typer.Option(
+            help="Number of worker processes to spread users across. Defaults to the number of CPU cores, use 1 to run everything in a single process",
+            min=1,
+        ),
+    ] = None,
+    shape: Annotated[
+        str | None,
+        typer.Option(
+            help="Load shape to run instead of a fixed number of users, e.g. step:users=500,step=25,every=2m. Built-in shapes are step, ramp, spike and soak, or file:stages.csv for a stage table of duration,users,spawn_rate. capacity:p95=2000 searches for the most users that meet a latency and error rate target. Each stage is reported separately. --users and --run-time are taken from the shape",
+        ),
+    ] = None,
 ):
     """
     Run a load test on a dashboard using standard SSO embedding.
     """
-    from locust import events
-    from locust.env import Environment
-
     
+    load_shape = get_load_shape(shape, spawn_rate)
+    if load_shape:
+        users, run_time = load_shape.max_users, load_shape.run_time_minutes
     typer.echo(
         f"Running load test with {users} users, {spawn_rate} spawn rate, and {run_time} minutes"
     )
@@ -435,22 +468,15 @@ def load_test(
             )
             self.first_name = first_name
 
-    env = Environment(
-        user_classes=[DashboardUserClass], events=events, stop_timeout=stop_timeout
+    run_load_test(
+        [DashboardUserClass],
+        users=users,
+        spawn_rate=spawn_rate,
+        run_time=run_time,
+        workers=resolve_workers(workers, users),
+        shape=load_shape,
+        stop_timeout=stop_timeout,
     )
-    runner = env.create_local_runner()
-
-    runner.start(user_count=users, spawn_rate=spawn_rate)
-
-    def quit_runner():
-        runner.stop()
-        if runner.greenlet:
-            runner.greenlet.kill(block=False)
-        typer.Exit(1)
-
-    if runner.spawning_greenlet:
-        runner.spawning_greenlet.spawn_later(run_time * 60, quit_runner)
-    runner.greenlet.join()
 
 
 @group.command(name="query")
@@ -460,7 +486,7 @@ def load_test_query(
         typer.Option(
             help="Query ID (from explore url) to run the test on. Specify multiple queries as --query query1 --query query2"
         ),
-    ],
+    ] = [],
     users: Annotated[
         int, typer.Option(help="Number of users to run the test with", min=1, max=1000)
     ] = 25,
@@ -480,8 +506,37 @@ def load_test_query(
     attribute: Annotated[
         List[str],
         typer.Option(
-            help="Looker attributes to run the test on. Specify them as attribute:value like --attribute store:value. Accepts multiple arguments --attribute store:acme --attribute team:managers. Accepts random.randint(0,1000) format"
-        ),    ] = [],
+            help="Looker attributes to run the test on. Specify them as attribute:value like --attribute store:value. Accepts multiple arguments --attribute store:acme --attribute team:managers. Values can be generated with uniform(1,1000) (or random.randint(1,1000)), zipf(1000) or zipf(1000,1.2) for a power-law skew towards 1, weighted(acme=70,globex=30) or sequence(1,500)"
+        ),
+    ] = [],
+    attribute_seed: Annotated[
+        int | None,
+        typer.Option(
+            help="Seed for the --attribute and --filter-variant generators so reruns with the same seed and --workers draw the same values",
+        ),
+    ] = None,
+    filter_variant: Annotated[
+        List[str],
+        typer.Option(
+            help="Run copies of the queries with this filter set to other values, as field:value with the same value generators as --attribute, e.g. --filter-variant \"users.state:weighted(California=40,Texas=30,Ohio=30)\". Only queries that already filter on the field are varied. Accepts multiple arguments",
+        ),
+    ] = [],
+    filter_cardinality: Annotated[
+        int,
+        typer.Option(
+            help="How many filter variants of each query to create and pick from at random with --filter-variant. Fewer variants mean more of the runs hit Looker's cache, but only runs with cache enabled can hit it, so combine this with --cache-percent above 0",
+            min=1,
+        ),
+    ] = 10,
+    attribute_file: Annotated[
+        Optional[pathlib.Path],
+        typer.Option(
+            help="CSV or TSV of user attribute values with a header row of attribute names, e.g. store_id,region. Every user session gets the attributes of one row picked at random. The file is memory mapped and indexed once, so it can hold millions of rows. --attribute values override the file's columns",
+            exists=True,
+            dir_okay=False,
+            readable=True,
+        ),
+    ] = None,
     group: Annotated[
         List[str],
         typer.Option(
@@ -527,9 +582,62 @@ def load_test_query(
     async_bail_out: Annotated[
         int,
         typer.Option(
-            help="How many iterations to wait for the async query to complete (roughly number of seconds)"
+            help="How many seconds to wait for the async query to complete"
         ),
     ] = 120,
+    shared_poller: Annotated[
+        bool,
+        typer.Option(
+            help="Poll every user's async query tasks from one shared poller per process, in a few bulk requests per round, instead of each user polling its own"
+        ),
+    ] = False,
+    poll_interval: Annotated[
+        float,
+        typer.Option(
+            help="Seconds between rounds of the shared poller",
+            min=0.01,
+        ),
+    ] = 0.25,
+    workload_file: Annotated[
+        Optional[pathlib.Path],
+        typer.Option(
+            help="CSV or TSV of queries to run instead of --query, with a header of slug and optionally weight, result_format and cache_percent. Queries are picked in proportion to their weight (1 by default), and a blank result_format or cache_percent uses --result-format or --cache-percent. Implies --per-query-stats",
+            exists=True,
+            dir_okay=False,
+        ),
+    ] = None,
+    per_query_stats: Annotated[
+        bool,
+        typer.Option(
+            help="Report run_query_async and run_query_sync per query slug, e.g. run_query_async: abc123, instead of one row for all queries",
+        ),
+    ] = False,
+    slug_concurrency: Annotated[
+        int,
+        typer.Option(
+            help="How many query slugs to look up at the same time before the test starts",
+            min=1,
+        ),
+    ] = 10,
+    slug_cache: Annotated[
+        bool,
+        typer.Option(
+            help="Keep resolved query slugs in a cache file per Looker instance, so later runs only look up new slugs"
+        ),
+    ] = True,
+    slug_cache_file: Annotated[
+        Optional[pathlib.Path],
+        typer.Option(
+            help="Query slug cache file, ~/.cache/lkr/query_slugs.json by default",
+            dir_okay=False,
+        ),
+    ] = None,
+    query_timings: Annotated[
+        bool,
+        typer.Option(
+            help="Also report Looker's own runtime, the overhead on top of it (queueing, polling and download) and the client-observed time of each completed async query, by query slug. Costs one more API call per query task"
+        ),
+    ] = False,
     first_name: Annotated[
         str,
         typer.Option(
@@ -543,6 +651,31 @@ def load_test_query(
             min=1,
         ),
     ] = 1,
+    query_concurrency: Annotated[
+        int | None,
+        typer.Option(
+            help="Without --query-async, how many of the selected queries run at the same time, like the tiles of a dashboard. Defaults to all of them",
+            min=1,
+        ),
+    ] = None,
+    result_format: Annotated[
+        str,
+        typer.Option(
+            help="Result format to request, e.g. json_bi, json, csv or txt",
+        ),
+    ] = "json_bi",
+    stream_results: Annotated[
+        bool,
+        typer.Option(
+            help="Without --query-async, read results in chunks and count bytes (and rows for csv and txt) instead of loading them into memory. Time to first byte is reported separately as run_query_sync_ttfb",
+        ),
+    ] = False,
+    raw_client: Annotated[
+        bool,
+        typer.Option(
+            help="Call the Looker API endpoints used on every iteration with a thin HTTP client that returns raw bytes and plain JSON instead of SDK models, so less load generator CPU goes to deserialization",
+        ),
+    ] = False,
     cache_percent: Annotated[
         float,
         typer.Option(
@@ -551,42 +684,141 @@ def load_test_query(
             max=100.0,
         ),
     ] = 0.0,
+    warm_sessions: Annotated[
+        int | None,
+        typer.Option(
+            help="Acquire this many embed sessions before the test starts, split across worker processes, so new users start with a ready session instead of waiting on login round trips",
+            min=1,
+        ),
+    ] = None,
+    warm_concurrency: Annotated[
+        int,
+        typer.Option(
+            help="How many embed sessions --warm-sessions acquires at the same time",
+            min=1,
+        ),
+    ] = 10,
+    identity_pool: Annotated[
+        int | None,
+        typer.Option(
+            help="Run as a fixed set of this many embed users, each with stable user attributes, instead of a new embed user for every session. Sessions check a user out and hand it back, so this sets how many distinct Looker users the test creates regardless of concurrency",
+            min=1,
+        ),
+    ] = None,
+    shared_login: Annotated[
+        bool,
+        typer.Option(
+            help="Log in with the API credentials once per process and reuse each embed user's sudo token until it expires, instead of logging in twice for every new user session",
+        ),
+    ] = True,
+    shared_connections: Annotated[
+        bool,
+        typer.Option(
+            help="Send every user's API requests over one keep-alive connection pool per process instead of a new connection pool per user session. Connection reuse and handshake times are reported when the test stops",
+        ),
+    ] = False,
+    workers: Annotated[
+        int | None,
+        typer.Option(
+            help="Number of worker processes to spread users across. Defaults to the number of CPU cores, use 1 to run everything in a single process",
+            min=1,
+        ),
+    ] = None,
+    shape: Annotated[
+        str | None,
+        typer.Option(
+            help="Load shape to run instead of a fixed number of users, e.g. step:users=500,step=25,every=2m. Built-in shapes are step, ramp, spike and soak, or file:stages.csv for a stage table of duration,users,spawn_rate. capacity:p95=2000 searches for the most users that meet a latency and error rate target. Each stage is reported separately. --users and --run-time are taken from the shape",
+        ),
+    ] = None,
+    rate: Annotated[
+        str | None,
+        typer.Option(
+            help="Start query tasks at a constant arrival rate (open loop) instead of waiting between tasks, e.g. 5/s or 300/m. Latency is measured from when each arrival was due, --users caps how many run at once and wait times are ignored",
+        ),
+    ] = None,
+    arrival: Annotated[
+        ArrivalDistribution,
+        typer.Option(
+            help="Inter-arrival times for --rate, exponential (poisson) or evenly spaced (fixed)",
+        ),
+    ] = ArrivalDistribution.poisson,
+    in_flight: Annotated[
+        int | None,
+        typer.Option(
+            help="Keep exactly this many async query tasks outstanding, replacing each one as soon as it finishes. Requires --query-async",
+            min=1,
+        ),
+    ] = None,
+    in_flight_scope: Annotated[
+        InFlightScope,
+        typer.Option(
+            help="Whether --in-flight is the total across all users (global) or the number each user keeps outstanding (user)",
+        ),
+    ] = InFlightScope.global_,
 ):
     """
     Run a load test by executing specific queries by ID.
     """
-    if not query:
-        raise typer.BadParameter("At least one --query must be provided")
+    if not query and not workload_file:
+        raise typer.BadParameter("At least one --query or a --workload-file must be provided")
+    if query and workload_file:
+        raise typer.BadParameter("--query and --workload-file cannot be used together")
     if not model:
         raise typer.BadParameter("At least one --model must be provided")
+    compiled_attributes = compile_attributes(
+        attribute or [], attribute_seed, str(attribute_file) if attribute_file else None
+    )
+    filter_variants = compile_filter_variants(filter_variant, filter_cardinality, attribute_seed)
+    workload = load_workload(str(workload_file)) if workload_file else None
+    if in_flight and not query_async:
+        raise typer.BadParameter("--in-flight requires --query-async")
+    if in_flight and rate:
+        raise typer.BadParameter("--in-flight and --rate cannot be used together")
+    if stream_results and query_async:
+        raise typer.BadParameter("--stream-results cannot be used with --query-async")
+    if query_timings and not query_async:
+        raise typer.BadParameter("--query-timings requires --query-async")
 
-    resolved_queries: List[str] = []
-    query_slug_to_id: dict[str, str] = {}
     try:
         sdk = looker_sdk.init40()
-        for q in query:
-            try:
-                q_obj = sdk.query_for_slug(q)
-                if q_obj and (q_obj.slug or q_obj.id):
-                    canonical_slug = q_obj.slug or str(q_obj.id)
-                    if canonical_slug not in resolved_queries:
-                        resolved_queries.append(canonical_slug)
-                    if q_obj.id:
-                        query_slug_to_id[canonical_slug] = str(q_obj.id)
-                else:
-                    raise typer.BadParameter(f"Query slug '{q}' could not be resolved to a valid Query ID")
-            except typer.BadParameter:
-                raise
-            except Exception as e:
-                raise typer.BadParameter(f"Failed to resolve query slug '{q}': {e}")
+        resolved = resolve_slugs(
+            sdk,
+            workload.slugs if workload else query,
+            slug_concurrency,
+            open_slug_cache(sdk, slug_cache, slug_cache_file),
+        )
     except typer.BadParameter:
         raise
     except Exception as e:
         raise typer.BadParameter(f"Failed to initialize Looker SDK for query resolution: {e}")
+    query_slug_to_id = {slug: query_id for slug, query_id in resolved.values()}
+    resolved_queries: List[str] = list(query_slug_to_id)
+    if workload:
+        workload = workload.canonicalize(
+            {slug: canonical_slug for slug, (canonical_slug, _) in resolved.items()}
+        )
+        typer.echo(f"Running a weighted mix of {len(workload.queries)} queries")
 
+    load_shape = get_load_shape(shape, spawn_rate)
+    if load_shape:
+        users, run_time = load_shape.max_users, load_shape.run_time_minutes
     typer.echo(
         f"Running load test with {users} users, {spawn_rate} spawn rate, and {run_time} minutes"
     )
+    worker_count = resolve_workers(workers, users)
+    in_flight_limiter: InFlightLimiter | None = None
+    if in_flight and in_flight_scope == InFlightScope.global_:
+        # Every worker needs at least one of the global slots
+        worker_count = min(worker_count, in_flight)
+        in_flight_limiter = InFlightLimiter(in_flight, worker_count)
+    if in_flight:
+        typer.echo(f"Keeping {in_flight} query tasks in flight ({in_flight_scope.value})")
+    arrival_schedule: ArrivalSchedule | None = None
+    if rate:
+        # Every worker process runs its own clock, so each takes an equal share of the rate
+        arrival_schedule = ArrivalSchedule(parse_rate(rate) / worker_count, arrival)
+        arrival_schedule.register_events()
+        typer.echo(f"Starting queries at {rate} ({arrival.value} arrivals)")
     explore_url = get_system_activity_explore_url(
         run_time,
         query_ids=resolved_queries,
@@ -595,50 +827,81 @@ def load_test_query(
     if explore_url:
         typer.echo(f"\nTrack query history for the load test here:\n{explore_url}\n")
 
-    from locust import between
+    from locust import between, constant
+
+    task_poller = (
+        TaskPoller(
+            (lambda: RawLookerClient(http_pool.init40())) if raw_client else http_pool.init40,
+            interval=poll_interval,
+        )
+        if shared_poller
+        else None
+    )
 
     class QueryUserClass(QueryUser):
-        wait_time = between(wait_time_min, wait_time_max)
+        wait_time = (
+            constant(0)
+            if arrival_schedule or in_flight
+            else between(wait_time_min, wait_time_max)
+        )
 
         def __init__(self, *args, **kwargs):
             super().__init__(*args, **kwargs)
-            self.attributes = attribute
+            self.attributes = compiled_attributes
             self.qid = resolved_queries
             self.query_slug_to_id = query_slug_to_id
             self.models = model
-            self.result_format = "json_bi"
+            self.result_format = result_format
             self.query_async = query_async
             self.async_bail_out = async_bail_out
+            self.task_poller = task_poller
             self.sticky_sessions = sticky_sessions
             self.group_ids = group or []
             self.external_group_id = get_external_group_id(
                 external_group_id, external_group_id_prefix
             )
             self.max_queries_per_task = max_queries_per_task
+            self.query_concurrency = query_concurrency
+            self.stream_results = stream_results
+            self.raw_client = raw_client
+            self.session_pool = session_pool
+            self.identity_pool = embed_identities
+            self.filter_variants = filter_variants
+            self.query_timings = query_timings
+            self.workload = workload
+            self.per_query_stats = per_query_stats or workload is not None
             self.first_name = first_name
             self.cache_percent = cache_percent
-
-    from locust import events
-    from locust.env import Environment
-
-    env = Environment(
-        user_classes=[QueryUserClass],
-        events=events,
+            self.arrival_schedule = arrival_schedule
+            if in_flight:
+                self.in_flight_limiter = in_flight_limiter or InFlightLimiter(in_flight)
+
+    if shared_connections:
+        # Each worker process gets its own pool, sized for its share of the users and
+        # the sync queries each of them runs side by side
+        per_user = 1
+        if not query_async:
+            per_user = min(query_concurrency or max_queries_per_task, max_queries_per_task)
+        http_pool.configure(http_pool.pool_size(users, worker_count, per_user))
+    auth.configure(shared_login)
+    # Not split across workers: every process derives the same identities
+    embed_identities = IdentityPool(identity_pool, compiled_attributes) if identity_pool else None
+    session_pool = (
+        EmbedSessionPool(math.ceil(warm_sessions / worker_count), warm_concurrency)
+        if warm_sessions
+        else None
     )
-    runner = env.create_local_runner()
-
-    # gevent.spawn(stats_printer(env.stats))
-    runner.start(user_count=users, spawn_rate=spawn_rate)
-
-    def quit_runner():
-        runner.stop()
-        if runner.greenlet:
-            runner.greenlet.kill(block=False)
-        typer.Exit(1)
 
-    if runner.spawning_greenlet:
-        runner.spawning_greenlet.spawn_later(run_time * 60, quit_runner)
-    runner.greenlet.join()
+    run_load_test(
+        [QueryUserClass],
+        users=users,
+        spawn_rate=spawn_rate,
+        run_time=run_time,
+        workers=worker_count,
+        shape=load_shape,
+        warm_up=session_pool.warm_up(QueryUserClass) if session_pool else None,
+        warm_up_timeout=session_pool.timeout if session_pool else 0,
+    )
 
 
 @group.command(name="dashboard-queries")
@@ -666,8 +929,37 @@ def load_test_dashboard_queries(
     attribute: Annotated[
         List[str],
         typer.Option(
-            help="Looker attributes to run the test on. Specify them as attribute:value like --attribute store:value. Accepts multiple arguments --attribute store:acme --attribute team:managers. Accepts random.randint(0,1000) format"
-        ),    ] = [],
+            help="Looker attributes to run the test on. Specify them as attribute:value like --attribute store:value. Accepts multiple arguments --attribute store:acme --attribute team:managers. Values can be generated with uniform(1,1000) (or random.randint(1,1000)), zipf(1000) or zipf(1000,1.2) for a power-law skew towards 1, weighted(acme=70,globex=30) or sequence(1,500)"
+        ),
+    ] = [],
+    attribute_seed: Annotated[
+        int | None,
+        typer.Option(
+            help="Seed for the --attribute and --filter-variant generators so reruns with the same seed and --workers draw the same values",
+        ),
+    ] = None,
+    filter_variant: Annotated[
+        List[str],
+        typer.Option(
+            help="Run copies of the queries with this filter set to other values, as field:value with the same value generators as --attribute, e.g. --filter-variant \"users.state:weighted(California=40,Texas=30,Ohio=30)\". Only queries that already filter on the field are varied. Accepts multiple arguments",
+        ),
+    ] = [],
+    filter_cardinality: Annotated[
+        int,
+        typer.Option(
+            help="How many filter variants of each query to create and pick from at random with --filter-variant. Fewer variants mean more of the runs hit Looker's cache, but only runs with cache enabled can hit it, so combine this with --cache-percent above 0",
+            min=1,
+        ),
+    ] = 10,
+    attribute_file: Annotated[
+        Optional[pathlib.Path],
+        typer.Option(
+            help="CSV or TSV of user attribute values with a header row of attribute names, e.g. store_id,region. Every user session gets the attributes of one row picked at random. The file is memory mapped and indexed once, so it can hold millions of rows. --attribute values override the file's columns",
+            exists=True,
+            dir_okay=False,
+            readable=True,
+        ),
+    ] = None,
     group: Annotated[
         List[str],
         typer.Option(
@@ -713,15 +1005,103 @@ def load_test_dashboard_queries(
     async_bail_out: Annotated[
         int,
         typer.Option(
-            help="How many iterations to wait for the async query to complete (roughly number of seconds)"
+            help="How many seconds to wait for the async query to complete"
         ),
     ] = 120,
+    shared_poller: Annotated[
+        bool,
+        typer.Option(
+            help="Poll every user's async query tasks from one shared poller per process, in a few bulk requests per round, instead of each user polling its own"
+        ),
+    ] = False,
+    poll_interval: Annotated[
+        float,
+        typer.Option(
+            help="Seconds between rounds of the shared poller",
+            min=0.01,
+        ),
+    ] = 0.25,
+    tile_concurrency: Annotated[
+        int,
+        typer.Option(
+            help="How many of a dashboard's tile queries to run at the same time, like the browser does when loading it",
+            min=1,
+        ),
+    ] = 20,
+    max_tile_queries: Annotated[
+        int | None,
+        typer.Option(
+            help="Most tile queries to run at the same time across all users of a worker process. Tiles wait for a free slot beyond that. Unlimited by default",
+            min=1,
+        ),
+    ] = None,
+    metadata_ttl: Annotated[
+        int,
+        typer.Option(
+            help="Seconds to reuse the dashboards' element query IDs for before fetching them again. They are fetched once per process, dashboards in parallel and with only the fields needed, and shared by every user. 0 fetches them on every iteration",
+            min=0,
+        ),
+    ] = 300,
     first_name: Annotated[
         str,
         typer.Option(
             help="First name of the embed user",
         ),
     ] = "Embed",
+    cache_percent: Annotated[
+        float,
+        typer.Option(
+            help="Percentage of tile queries to run with cache enabled (0 to 100)",
+            min=0.0,
+            max=100.0,
+        ),
+    ] = 0.0,
+    warm_sessions: Annotated[
+        int | None,
+        typer.Option(
+            help="Acquire this many embed sessions before the test starts, split across worker processes, so new users start with a ready session instead of waiting on login round trips",
+            min=1,
+        ),
+    ] = None,
+    warm_concurrency: Annotated[
+        int,
+        typer.Option(
+            help="How many embed sessions --warm-sessions acquires at the same time",
+            min=1,
+        ),
+    ] = 10,
+    identity_pool: Annotated[
+        int | None,
+        typer.Option(
+            help="Run as a fixed set of this many embed users, each with stable user attributes, instead of a new embed user for every session. Sessions check a user out and hand it back, so this sets how many distinct Looker users the test creates regardless of concurrency",
+            min=1,
+        ),
+    ] = None,
+    shared_login: Annotated[
+        bool,
+        typer.Option(
+            help="Log in with the API credentials once per process and reuse each embed user's sudo token until it expires, instead of logging in twice for every new user session",
+        ),
+    ] = True,
+    shared_connections: Annotated[
+        bool,
+        typer.Option(
+            help="Send every user's API requests over one keep-alive connection pool per process instead of a new connection pool per user session. Connection reuse and handshake times are reported when the test stops",
+        ),
+    ] = False,
+    workers: Annotated[
+        int | None,
+        typer.Option(
+            help="Number of worker processes to spread users across. Defaults to the number of CPU cores, use 1 to run everything in a single process",
+            min=1,
+        ),
+    ] = None,
+    shape: Annotated[
+        str | None,
+        typer.Option(
+            help="Load shape to run instead of a fixed number of users, e.g. step:users=500,step=25,every=2m. Built-in shapes are step, ramp, spike and soak, or file:stages.csv for a stage table of duration,users,spawn_rate. capacity:p95=2000 searches for the most users that meet a latency and error rate target. Each stage is reported separately. --users and --run-time are taken from the shape",
+        ),
+    ] = None,
 ):
     """
     Run queries from specified dashboards with custom logging.
@@ -732,7 +1112,14 @@ def load_test_dashboard_queries(
         raise typer.BadParameter("At least one --dashboard must be provided")
     if not model:
         raise typer.BadParameter("At least one --model must be provided")
+    compiled_attributes = compile_attributes(
+        attribute or [], attribute_seed, str(attribute_file) if attribute_file else None
+    )
+    filter_variants = compile_filter_variants(filter_variant, filter_cardinality, attribute_seed)
 
+    load_shape = get_load_shape(shape, spawn_rate)
+    if load_shape:
+        users, run_time = load_shape.max_users, load_shape.run_time_minutes
     typer.echo(
         f"Running load test with {users} users, {spawn_rate} spawn rate, and {run_time} minutes"
     )
@@ -742,53 +1129,86 @@ def load_test_dashboard_queries(
 
     from locust import between
 
+    task_poller = (
+        TaskPoller(http_pool.init40, interval=poll_interval) if shared_poller else None
+    )
+    dashboard_metadata = DashboardMetadataCache(dashboard, ttl=metadata_ttl)
+    tile_pool = TilePool(max_tile_queries)
+
     class DashboardQueriesUserClass(DashboardQueriesUser):
         wait_time = between(wait_time_min, wait_time_max)
 
         def __init__(self, *args, **kwargs):
             super().__init__(*args, **kwargs)
-            self.attributes = attribute
+            self.attributes = compiled_attributes
             self.dashboard_ids = dashboard
+            self.dashboard_metadata = dashboard_metadata
+            self.tile_concurrency = tile_concurrency
+            self.tile_pool = tile_pool
             self.models = model
             self.result_format = "json_bi"
             self.query_async = query_async
             self.async_bail_out = async_bail_out
+            self.task_poller = task_poller
             self.sticky_sessions = sticky_sessions
             self.group_ids = group or []
             self.external_group_id = get_external_group_id(
                 external_group_id, external_group_id_prefix
             )
+            self.session_pool = session_pool
+            self.identity_pool = embed_identities
+            self.filter_variants = filter_variants
             self.first_name = first_name
+            self.cache_percent = cache_percent
 
-    from locust import events
-    from locust.env import Environment
-
-    env = Environment(
-        user_classes=[DashboardQueriesUserClass],
-        events=events,
+    worker_count = resolve_workers(workers, users)
+    if shared_connections:
+        # Each worker process gets its own pool, sized for its share of the users and
+        # the tiles each of them runs at once, up to --max-tile-queries
+        http_pool.configure(
+            http_pool.pool_size(users, worker_count, tile_concurrency, max_tile_queries)
+        )
+    auth.configure(shared_login)
+    # Not split across workers: every process derives the same identities
+    embed_identities = IdentityPool(identity_pool, compiled_attributes) if identity_pool else None
+    session_pool = (
+        EmbedSessionPool(math.ceil(warm_sessions / worker_count), warm_concurrency)
+        if warm_sessions
+        else None
     )
-    runner = env.create_local_runner()
 
-    runner.start(user_count=users, spawn_rate=spawn_rate)
-
-    def quit_runner():
-        runner.stop()
-        if runner.greenlet:
-            runner.greenlet.kill(block=False)
-
-    if runner.spawning_greenlet:
-        runner.spawning_greenlet.spawn_later(run_time * 60, quit_runner)
-    runner.greenlet.join()
+    run_load_test(
+        [DashboardQueriesUserClass],
+        users=users,
+        spawn_rate=spawn_rate,
+        run_time=run_time,
+        workers=worker_count,
+        shape=load_shape,
+        warm_up=session_pool.warm_up(DashboardQueriesUserClass) if session_pool else None,
+        warm_up_timeout=session_pool.timeout if session_pool else 0,
+    )
 
 
 @group.command(name="render")
 def load_test_render(
     dashboard: Annotated[
-        str,
+        List[str],
         typer.Option(
-            help="Dashboard ID to render",
+            help="Dashboard ID to render. Accepts multiple arguments --dashboard 1 --dashboard 2",
         ),
-    ],
+    ] = [],
+    look: Annotated[
+        List[str],
+        typer.Option(
+            help="Look ID to render. Accepts multiple arguments --look 1 --look 2",
+        ),
+    ] = [],
+    query: Annotated[
+        List[str],
+        typer.Option(
+            help="Query ID (from explore url) to render as a visualization. Accepts multiple arguments --query query1 --query query2",
+        ),
+    ] = [],
     users: Annotated[
         int, typer.Option(help="Number of users to run the test with", min=1, max=1000)
     ] = 25,
@@ -825,14 +1245,74 @@ def load_test_render(
     attribute: Annotated[
         List[str],
         typer.Option(
-            help="Looker attributes to run the test on. Specify them as attribute:value like --attribute store:value. Excepts multiple arguments --attribute store:acme --attribute team:managers. Accepts random.randint(0,1000) format"
-        ),    ] = [],
+            help="Looker attributes to run the test on. Specify them as attribute:value like --attribute store:value. Accepts multiple arguments --attribute store:acme --attribute team:managers. Values can be generated with uniform(1,1000) (or random.randint(1,1000)), zipf(1000) or zipf(1000,1.2) for a power-law skew towards 1, weighted(acme=70,globex=30) or sequence(1,500)"
+        ),
+    ] = [],
+    attribute_seed: Annotated[
+        int | None,
+        typer.Option(
+            help="Seed for the --attribute generators so reruns with the same seed and --workers draw the same values",
+        ),
+    ] = None,
+    attribute_file: Annotated[
+        Optional[pathlib.Path],
+        typer.Option(
+            help="CSV or TSV of user attribute values with a header row of attribute names, e.g. store_id,region. Every user session gets the attributes of one row picked at random. The file is memory mapped and indexed once, so it can hold millions of rows. --attribute values override the file's columns",
+            exists=True,
+            dir_okay=False,
+            readable=True,
+        ),
+    ] = None,
     result_format: Annotated[
-        str,
+        List[str],
+        typer.Option(
+            help="Format of the rendered output (pdf, png, jpg). Accepts multiple arguments --result-format pdf --result-format png. Looks and queries only render as png or jpg",
+        ),
+    ] = ["pdf"],
+    size: Annotated[
+        List[str],
+        typer.Option(
+            help="Width and height of the render in pixels. Accepts multiple arguments --size 1920x1080 --size 1280x720",
+        ),
+    ] = ["1920x1080"],
+    paper: Annotated[
+        List[str],
+        typer.Option(
+            help="Paper size and orientation of dashboard PDFs, e.g. a4:portrait or letter:landscape. Accepts multiple arguments",
+        ),
+    ] = ["a4:portrait"],
+    dashboard_filters: Annotated[
+        List[str],
         typer.Option(
-            help="Format of the rendered output (pdf, png, jpg)",
+            help="Dashboard filter set as a URL query string, e.g. \"State=California&Date=7 days\". Each filter set adds another combination for every dashboard. Accepts multiple arguments",
         ),
-    ] = "pdf",
+    ] = [],
+    slug_concurrency: Annotated[
+        int,
+        typer.Option(
+            help="How many query slugs to look up at the same time before the test starts",
+            min=1,
+        ),
+    ] = 10,
+    slug_cache: Annotated[
+        bool,
+        typer.Option(
+            help="Keep resolved query slugs in a cache file per Looker instance, so later runs only look up new slugs"
+        ),
+    ] = True,
+    slug_cache_file: Annotated[
+        Optional[pathlib.Path],
+        typer.Option(
+            help="Query slug cache file, ~/.cache/lkr/query_slugs.json by default",
+            dir_okay=False,
+        ),
+    ] = None,
+    download_results: Annotated[
+        bool,
+        typer.Option(
+            help="Download each finished render in chunks and report its size and download time as render_download",
+        ),
+    ] = False,
     render_bail_out: Annotated[
         int,
         typer.Option(
@@ -845,25 +1325,100 @@ def load_test_render(
             help="Make each user run its render task only once.", show_default=True
         ),
     ] = False,
+    raw_client: Annotated[
+        bool,
+        typer.Option(
+            help="Call the Looker API endpoints used on every iteration with a thin HTTP client that returns raw bytes and plain JSON instead of SDK models, so less load generator CPU goes to deserialization",
+        ),
+    ] = False,
     first_name: Annotated[
         str,
         typer.Option(
             help="First name of the embed user",
         ),
     ] = "Embed",
+    warm_sessions: Annotated[
+        int | None,
+        typer.Option(
+            help="Acquire this many embed sessions before the test starts, split across worker processes, so new users start with a ready session instead of waiting on login round trips",
+            min=1,
+        ),
+    ] = None,
+    warm_concurrency: Annotated[
+        int,
+        typer.Option(
+            help="How many embed sessions --warm-sessions acquires at the same time",
+            min=1,
+        ),
+    ] = 10,
+    identity_pool: Annotated[
+        int | None,
+        typer.Option(
+            help="Run as a fixed set of this many embed users, each with stable user attributes, instead of a new embed user for every session. Sessions check a user out and hand it back, so this sets how many distinct Looker users the test creates regardless of concurrency",
+            min=1,
+        ),
+    ] = None,
+    shared_login: Annotated[
+        bool,
+        typer.Option(
+            help="Log in with the API credentials once per process and reuse each embed user's sudo token until it expires, instead of logging in twice for every new user session",
+        ),
+    ] = True,
+    shared_connections: Annotated[
+        bool,
+        typer.Option(
+            help="Send every user's API requests over one keep-alive connection pool per process instead of a new connection pool per user session. Connection reuse and handshake times are reported when the test stops",
+        ),
+    ] = False,
+    workers: Annotated[
+        int | None,
+        typer.Option(
+            help="Number of worker processes to spread users across. Defaults to the number of CPU cores, use 1 to run everything in a single process",
+            min=1,
+        ),
+    ] = None,
+    shape: Annotated[
+        str | None,
+        typer.Option(
+            help="Load shape to run instead of a fixed number of users, e.g. step:users=500,step=25,every=2m. Built-in shapes are step, ramp, spike and soak, or file:stages.csv for a stage table of duration,users,spawn_rate. capacity:p95=2000 searches for the most users that meet a latency and error rate target. Each stage is reported separately. --users and --run-time are taken from the shape",
+        ),
+    ] = None,
 ):
     """
-    Run a load test by requesting renders (PDF/PNG/JPG) of a dashboard.
+    Run a load test by requesting renders (PDF/PNG/JPG) of dashboards, looks and queries,
+    picking a random combination of source, format, size, paper and filters each time.
     """
-    if not dashboard:
-        raise typer.BadParameter("--dashboard must be provided")
+    if not dashboard and not look and not query:
+        raise typer.BadParameter("At least one --dashboard, --look or --query must be provided")
     if not model:
         raise typer.BadParameter("At least one --model must be provided")
+    compiled_attributes = compile_attributes(
+        attribute or [], attribute_seed, str(attribute_file) if attribute_file else None
+    )
+    query_ids: List[str] = []
+    if query:
+        try:
+            sdk = looker_sdk.init40()
+            resolved = resolve_slugs(
+                sdk, query, slug_concurrency, open_slug_cache(sdk, slug_cache, slug_cache_file)
+            )
+        except typer.BadParameter:
+            raise
+        except Exception as e:
+            raise typer.BadParameter(f"Failed to initialize Looker SDK for query resolution: {e}")
+        query_ids = [query_id for _, query_id in resolved.values()]
+    render_cases = render_matrix(
+        dashboard, look, query_ids, result_format, size, paper, dashboard_filters
+    )
+    typer.echo(f"Rendering {len(render_cases)} combinations of source, format, size and filters")
 
+    load_shape = get_load_shape(shape, spawn_rate)
+    if load_shape:
+        users, run_time = load_shape.max_users, load_shape.run_time_minutes
     typer.echo(
         f"Running load test with {users} users, {spawn_rate} spawn rate, and {run_time} minutes"
     )
-    explore_url = get_system_activity_explore_url(run_time, dashboard_ids=[dashboard])
+    explore_url = get_system_activity_explore_url(run_time, dashboard_ids=dashboard or None)
     if explore_url:
         typer.echo(f"\nTrack query history for the load test here:\n{explore_url}\n")
 
@@ -874,38 +1429,44 @@ def load_test_render(
 
         def __init__(self, *args, **kwargs):
             super().__init__(*args, **kwargs)
-            self.attributes = attribute
-            self.dashboard = dashboard
+            self.attributes = compiled_attributes
+            self.render_cases = render_cases
+            self.download_results = download_results
             self.models = model
-            self.result_format = result_format
             self.render_bail_out = render_bail_out
             self.run_once = run_once  # Pass the command-line flag value
+            self.raw_client = raw_client
             self.group_ids = group or []
             self.external_group_id = get_external_group_id(
                 external_group_id, external_group_id_prefix
             )
+            self.session_pool = session_pool
+            self.identity_pool = embed_identities
             self.first_name = first_name
 
-    from locust import events
-    from locust.env import Environment
-
-    env = Environment(
-        user_classes=[RenderUserClass],
-        events=events,
+    worker_count = resolve_workers(workers, users)
+    if shared_connections:
+        # Each worker process gets its own pool, sized for its share of the users
+        http_pool.configure(http_pool.pool_size(users, worker_count))
+    auth.configure(shared_login)
+    # Not split across workers: every process derives the same identities
+    embed_identities = IdentityPool(identity_pool, compiled_attributes) if identity_pool else None
+    session_pool = (
+        EmbedSessionPool(math.ceil(warm_sessions / worker_count), warm_concurrency)
+        if warm_sessions
+        else None
     )
-    runner = env.create_local_runner()
 
-    runner.start(user_count=users, spawn_rate=spawn_rate)
-
-    def quit_runner():
-        runner.stop()
-        if runner.greenlet:
-            runner.greenlet.kill(block=False)
-        typer.Exit(1)
-
-    if runner.spawning_greenlet:
-        runner.spawning_greenlet.spawn_later(run_time * 60, quit_runner)
-    runner.greenlet.join()
+    run_load_test(
+        [RenderUserClass],
+        users=users,
+        spawn_rate=spawn_rate,
+        run_time=run_time,
+        workers=worker_count,
+        shape=load_shape,
+        warm_up=session_pool.warm_up(RenderUserClass) if session_pool else None,
+        warm_up_timeout=session_pool.timeout if session_pool else 0,
+    )
 
 
 @group.command(name="embed-observability")
@@ -1007,6 +1568,19 @@ def load_test_embed_observability(
             help="First name of the embed user",
         ),
     ] = "Embed",
+    workers: Annotated[
+        int | None,
+        typer.Option(
+            help="Number of worker processes to spread users across. Defaults to the number of CPU cores, use 1 to run everything in a single process",
+            min=1,
+        ),
+    ] = None,
+    shape: Annotated[
+        str | None,
+        typer.Option(
+            help="Load shape to run instead of a fixed number of users, e.g. step:users=500,step=25,every=2m. Built-in shapes are step, ramp, spike and soak, or file:stages.csv for a stage table of duration,users,spawn_rate. capacity:p95=2000 searches for the most users that meet a latency and error rate target. Each stage is reported separately. --users and --run-time are taken from the shape",
+        ),
+    ] = None,
 ):
     """
     Open dashboards with observability metrics. The metrics are collected through Looker's JavaScript events and logged with the specified prefix. This command will:
@@ -1030,6 +1604,9 @@ def load_test_embed_observability(
 
     from lkr.load_test.embed_dashboard_observability.embed_server import run_server
 
+    load_shape = get_load_shape(shape, spawn_rate)
+    if load_shape:
+        users, run_time = load_shape.max_users, load_shape.run_time_minutes
     typer.echo(
         f"Running load test with {users} users, {spawn_rate} spawn rate, and {run_time} minutes"
     )
@@ -1038,9 +1615,6 @@ def load_test_embed_observability(
     if explore_url:
         typer.echo(f"\nTrack query history for the load test here:\n{explore_url}\n")
 
-    # Start the embed server in a separate greenlet
-    gevent.spawn(run_server, port, log_event_prefix)
-
     class EmbedDashboardUserClass(DashboardUserObservability):
         wait_time = locust.between(min_wait, max_wait)
 
@@ -1062,23 +1636,16 @@ def load_test_embed_observability(
             self.embed_user_id = embed_user_id or ""
             self.first_name = first_name
 
-    env = Environment(
-        user_classes=[EmbedDashboardUserClass],
-        events=events,
+    run_load_test(
+        [EmbedDashboardUserClass],
+        users=users,
+        spawn_rate=spawn_rate,
+        run_time=run_time,
+        workers=resolve_workers(workers, users),
+        shape=load_shape,
+        # Start the embed server in a separate greenlet, only in the master process
+        on_start=lambda: gevent.spawn(run_server, port, log_event_prefix),
     )
-    runner = env.create_local_runner()
-
-    runner.start(user_count=users, spawn_rate=spawn_rate)
-
-    def quit_runner():
-        runner.stop()
-        if runner.greenlet:
-            runner.greenlet.kill(block=False)
-        typer.Exit(1)
-
-    if runner.spawning_greenlet:
-        runner.spawning_greenlet.spawn_later(run_time * 60, quit_runner)
-    runner.greenlet.join()
 
 
 @group.command(name="delete-embed-users")